@@ -5,13 +5,16 @@ from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel, EmailStr
 from passlib.context import CryptContext
 from jose import jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.api.deps import get_db_session
+from app.api.deps import get_async_db_session, get_current_user
 from app.models.document import KnowledgeBaseMembership
-from app.services.access import bootstrap_user_kb
-from app.services.rate_limit import enforce_rate_limit
+from app.services.access import async_bootstrap_user_kb
+from app.services.password_hashing import HashingPoolBusy, hashing_pool
+from app.services.principal_cache import async_invalidate_user
+from app.services.rate_limit import async_enforce_rate_limit
 from app.models.user import User
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -42,28 +45,50 @@ def _create_token(email: str) -> str:
     return jwt.encode(payload, settings.jwt_secret, algorithm=settings.jwt_algorithm)
 
 
+async def _run_hashing(fn, *args):
+    try:
+        return await hashing_pool.run(fn, *args)
+    except HashingPoolBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication is busy. Please try again shortly.",
+            headers={"Retry-After": "1"},
+        )
+
+
 @router.post("/register")
-def register(body: RegisterBody, request: Request, db: Session = Depends(get_db_session)):
+async def register(body: RegisterBody, request: Request, db: AsyncSession = Depends(get_async_db_session)):
     ip = request.client.host if request.client else "unknown"
-    enforce_rate_limit("auth:register", key=f"ip:{ip}:email:{body.email.lower()}")
-    if db.query(User).filter(User.email == body.email).first():
+    await async_enforce_rate_limit("auth:register", key=f"ip:{ip}:email:{body.email.lower()}")
+    if (await db.execute(select(User.id).where(User.email == body.email))).first():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
-    user = User(email=body.email, password_hash=_hash(body.password))
+    user = User(email=body.email, password_hash=await _run_hashing(_hash, body.password))
     db.add(user)
-    db.flush()
-    bootstrap_user_kb(db, user)
-    db.commit()
+    await db.flush()
+    await async_bootstrap_user_kb(db, user)
+    await db.commit()
+    await async_invalidate_user(user.id)
     return {"message": "Registered"}
 
 
 @router.post("/login")
-def login(body: LoginBody, request: Request, db: Session = Depends(get_db_session)):
+async def login(body: LoginBody, request: Request, db: AsyncSession = Depends(get_async_db_session)):
     ip = request.client.host if request.client else "unknown"
-    enforce_rate_limit("auth:login", key=f"ip:{ip}:email:{body.email.lower()}")
-    user = db.query(User).filter(User.email == body.email).first()
-    if not user or not _verify(body.password, user.password_hash):
+    await async_enforce_rate_limit("auth:login", key=f"ip:{ip}:email:{body.email.lower()}")
+    user = (await db.execute(select(User).where(User.email == body.email))).scalars().first()
+    if not user or not await _run_hashing(_verify, body.password, user.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password")
-    if not db.query(KnowledgeBaseMembership).filter(KnowledgeBaseMembership.user_id == user.id).first():
-        bootstrap_user_kb(db, user)
-        db.commit()
+    membership = await db.execute(
+        select(KnowledgeBaseMembership.knowledge_base_id).where(KnowledgeBaseMembership.user_id == user.id).limit(1)
+    )
+    if membership.first() is None:
+        await async_bootstrap_user_kb(db, user)
+        await db.commit()
+        await async_invalidate_user(user.id)
     return {"access_token": _create_token(user.email), "token_type": "bearer"}
+
+
+@router.get("/hashing-stats")
+def hashing_stats(user=Depends(get_current_user)):
+    """Password hashing pool saturation for the serving worker."""
+    return hashing_pool.stats()
@@ -4,11 +4,11 @@ from typing import Annotated
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.models.base import SessionLocal
-from app.models.user import User
+from app.models.base import AsyncSessionLocal, SessionLocal
+from app.services.principal_cache import Principal, async_load_principal
 
 security = HTTPBearer(auto_error=False)
 
@@ -21,10 +21,16 @@ def get_db_session():
         db.close()
 
 
-def get_current_user(
+async def get_async_db_session():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_current_user(
     credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(security)],
-    db: Annotated[Session, Depends(get_db_session)],
-) -> User:
+    db: Annotated[AsyncSession, Depends(get_async_db_session)],
+) -> Principal:
+    """Principal for the bearer token; cached briefly per subject with its KB memberships."""
     if not credentials or credentials.credentials is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -43,7 +49,7 @@ def get_current_user(
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    user = db.query(User).filter(User.email == sub).first()
+    user = await async_load_principal(db, sub)
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
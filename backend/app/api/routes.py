@@ -1,7 +1,8 @@
 """API routes for upload, search, and chat."""
+import base64
 from datetime import datetime
 import hashlib
-import io
+import json
 import logging
 import re
 import uuid
@@ -10,16 +11,25 @@ from typing import Any
 from fastapi import File, Query, UploadFile
 from fastapi import HTTPException, status
 from fastapi.responses import HTMLResponse
-from sqlalchemy import desc
+from sqlalchemy import desc, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
-from app.models.base import SessionLocal
+from app.models.base import AsyncSessionLocal, SessionLocal
 from app.models.chat import ChatMessage, ChatRole, ChatSession
 from app.models.document import Document, DocumentStatus, KnowledgeBaseMembership, KnowledgeBaseRole
 from app.models.user import User
 from app.core.config import settings
-from app.services.access import get_default_accessible_kb_id, list_user_knowledge_bases, require_kb_access
+from app.services.access import (
+    list_user_knowledge_bases,
+    principal_default_kb_id,
+    require_kb_access,
+    require_principal_access,
+    require_principal_access_many,
+)
 from app.services.llm import generate as llm_generate
-from app.services.retrieval import hybrid_retrieve
+from app.services.principal_cache import Principal, invalidate_user
+from app.services.retrieval import async_hybrid_retrieve, federated_retrieve
 from app.services.storage import upload_file
 from app.tasks.ingestion import ingest_document
 
@@ -28,6 +38,7 @@ VALID_KB_ROLES = {
     KnowledgeBaseRole.EDITOR,
     KnowledgeBaseRole.VIEWER,
 }
+UPLOAD_READ_CHUNK_BYTES = 1024 * 1024
 SESSION_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
 TECH_QUERY_RE = re.compile(r"\b(tech stack|technology|technologies|skills?|tools?)\b", re.IGNORECASE)
 TECH_TERMS = [
@@ -78,31 +89,36 @@ def _normalize_session_id(session_id: str | None) -> str:
     return normalized
 
 
-def _get_or_create_chat_session(db, user_id: int, kb_id: int, session_id: str) -> ChatSession:
-    session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+def _check_chat_session(session: ChatSession, user_id: int, kb_id: int) -> ChatSession:
+    if session.user_id != user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    if session.knowledge_base_id != kb_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Session belongs to a different knowledge base.",
+        )
+    return session
+
+
+async def _get_or_create_chat_session(db: AsyncSession, user_id: int, kb_id: int, session_id: str) -> ChatSession:
+    session = await db.get(ChatSession, session_id)
     if session:
-        if session.user_id != user_id:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
-        if session.knowledge_base_id != kb_id:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Session belongs to a different knowledge base.",
-            )
-        return session
+        return _check_chat_session(session, user_id, kb_id)
     session = ChatSession(id=session_id, user_id=user_id, knowledge_base_id=kb_id)
     db.add(session)
-    db.flush()
+    await db.flush()
     return session
 
 
-def _history_for_prompt(db, session_id: str, max_messages: int = 10) -> str:
+async def _history_for_prompt(db: AsyncSession, session_id: str, max_messages: int = 10) -> str:
     rows = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.session_id == session_id)
-        .order_by(desc(ChatMessage.id))
-        .limit(max_messages)
-        .all()
-    )
+        await db.execute(
+            select(ChatMessage)
+            .where(ChatMessage.session_id == session_id)
+            .order_by(desc(ChatMessage.id))
+            .limit(max_messages)
+        )
+    ).scalars().all()
     if not rows:
         return ""
     ordered = list(reversed(rows))
@@ -113,61 +129,82 @@ def _history_for_prompt(db, session_id: str, max_messages: int = 10) -> str:
     return "\n".join(lines)
 
 
-def _resolve_kb_for_user(user: User, kb_id: int | None, min_role: str) -> int:
-    db = SessionLocal()
-    try:
-        resolved = kb_id if kb_id is not None else get_default_accessible_kb_id(db, user.id, min_role=min_role)
-        if resolved is None:
+def _resolve_kb_for_user(user: Principal, kb_id: int | None, min_role: str) -> int:
+    """Check KB access against the principal's cached memberships (no DB round trip)."""
+    resolved = kb_id if kb_id is not None else principal_default_kb_id(user, min_role=min_role)
+    if resolved is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No accessible knowledge base found for this user.",
+        )
+    require_principal_access(user, resolved, min_role=min_role)
+    return resolved
+
+
+def _resolve_kbs_for_user(user: Principal, kb_ids: list[int], min_role: str) -> list[int]:
+    return require_principal_access_many(user, kb_ids, min_role=min_role)
+
+
+async def _resolve_replaced_document(user: Principal, document_id: int, kb_id: int | None) -> Document:
+    async with AsyncSessionLocal() as db:
+        doc = await db.get(Document, document_id)
+        if not doc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found.")
+        if kb_id is not None and kb_id != doc.knowledge_base_id:
             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="No accessible knowledge base found for this user.",
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Document does not belong to the given knowledge base.",
             )
-        require_kb_access(db, user.id, resolved, min_role=min_role)
-        return resolved
-    finally:
-        db.close()
+        require_principal_access(user, doc.knowledge_base_id, min_role=KnowledgeBaseRole.EDITOR)
+        return doc
+
+
+async def _hash_upload(file: UploadFile) -> tuple[str, int]:
+    """SHA-256 and size of an upload, read in chunks from its spooled file.
+
+    Raises 413 once ``max_upload_bytes`` is exceeded and rewinds the file for
+    the object-store put. Bodies far beyond the limit are already refused by
+    ``UploadSizeLimitMiddleware`` before they are spooled.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(UPLOAD_READ_CHUNK_BYTES):
+        size += len(chunk)
+        if size > settings.max_upload_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File exceeds the upload limit of {settings.max_upload_bytes} bytes",
+            )
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest(), size
+
+
+def _store_upload(file: UploadFile, object_key: str, size: int) -> None:
+    upload_file(
+        object_key,
+        file.file,
+        size,
+        file.content_type or "application/octet-stream",
+        part_size=settings.upload_part_size,
+    )
 
 
 async def upload_document(
-    user: User,
+    user: Principal,
     file: UploadFile = File(...),
     kb_id: int = Query(None, description="Knowledge base ID"),
+    document_id: int | None = Query(None, description="Existing document to replace"),
 ):
-    content = await file.read()
-    kb = _resolve_kb_for_user(user, kb_id, min_role=KnowledgeBaseRole.EDITOR)
+    if document_id is not None:
+        replaced = await _resolve_replaced_document(user, document_id, kb_id)
+        kb = replaced.knowledge_base_id
+    else:
+        kb = _resolve_kb_for_user(user, kb_id, KnowledgeBaseRole.EDITOR)
+    content_hash, size = await _hash_upload(file)
     try:
         object_key = f"uploads/{uuid.uuid4().hex}/{file.filename}"
-        content_hash = hashlib.sha256(content).hexdigest()
-        db = SessionLocal()
-        try:
-            existing = (
-                db.query(Document)
-                .filter(
-                    Document.knowledge_base_id == kb,
-                    Document.content_hash == content_hash,
-                    Document.status.in_([DocumentStatus.PENDING, DocumentStatus.PROCESSING, DocumentStatus.INDEXED]),
-                )
-                .order_by(Document.id.desc())
-                .first()
-            )
-            if existing:
-                return {
-                    "filename": file.filename,
-                    "status": "queued",
-                    "document_id": existing.id,
-                    "deduplicated": True,
-                    "message": "Identical content already queued/indexed in this knowledge base.",
-                }
-
-            upload_file(object_key, io.BytesIO(content), len(content), file.content_type or "application/octet-stream")
-            doc = Document(knowledge_base_id=kb, filename=file.filename, object_key=object_key, content_hash=content_hash)
-            db.add(doc)
-            db.commit()
-            db.refresh(doc)
-            ingest_document.delay(doc.id)
-            return {"filename": file.filename, "status": "queued", "document_id": doc.id}
-        finally:
-            db.close()
+        return await run_in_threadpool(_register_upload, kb, document_id, file, size, object_key, content_hash)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -175,10 +212,86 @@ async def upload_document(
         ) from e
 
 
-async def search_documents(user: User, query: str, kb_id: int = Query(None)):
-    kb = _resolve_kb_for_user(user, kb_id, min_role=KnowledgeBaseRole.VIEWER)
+def _register_upload(
+    kb: int, document_id: int | None, file: UploadFile, size: int, object_key: str, content_hash: str
+) -> dict:
+    """Deduplicate on ``content_hash``, then store the object and enqueue ingestion."""
+    db = SessionLocal()
     try:
-        results = hybrid_retrieve(kb_id=kb, query=query, top_k=5)
+        if document_id is not None:
+            return _replace_document(db, document_id, file, size, object_key, content_hash)
+        existing = (
+            db.query(Document)
+            .filter(
+                Document.knowledge_base_id == kb,
+                Document.content_hash == content_hash,
+                Document.status.in_([DocumentStatus.PENDING, DocumentStatus.PROCESSING, DocumentStatus.INDEXED]),
+            )
+            .order_by(Document.id.desc())
+            .first()
+        )
+        if existing:
+            return {
+                "filename": file.filename,
+                "status": "queued",
+                "document_id": existing.id,
+                "deduplicated": True,
+                "message": "Identical content already queued/indexed in this knowledge base.",
+            }
+
+        _store_upload(file, object_key, size)
+        doc = Document(knowledge_base_id=kb, filename=file.filename, object_key=object_key, content_hash=content_hash)
+        db.add(doc)
+        db.commit()
+        db.refresh(doc)
+        ingest_document.delay(doc.id)
+        return {"filename": file.filename, "status": "queued", "document_id": doc.id}
+    finally:
+        db.close()
+
+
+def _replace_document(
+    db, document_id: int, file: UploadFile, size: int, object_key: str, content_hash: str
+) -> dict:
+    """Point an existing document at new content and re-ingest it incrementally."""
+    doc = db.query(Document).filter(Document.id == document_id).first()
+    if doc.content_hash == content_hash and doc.status != DocumentStatus.FAILED:
+        return {
+            "filename": file.filename,
+            "status": "queued",
+            "document_id": doc.id,
+            "deduplicated": True,
+            "message": "Document already has identical content.",
+        }
+    _store_upload(file, object_key, size)
+    doc.filename = file.filename
+    doc.object_key = object_key
+    doc.content_hash = content_hash
+    doc.status = DocumentStatus.PENDING
+    doc.error_message = None
+    db.commit()
+    ingest_document.delay(doc.id)
+    return {"filename": file.filename, "status": "queued", "document_id": doc.id, "replaced": True}
+
+
+async def search_documents(
+    user: Principal,
+    query: str,
+    kb_id: int = Query(None),
+    kb_ids: list[int] | None = Query(None),
+):
+    if kb_ids and len(set(kb_ids)) > settings.retrieval_max_federated_kbs:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.retrieval_max_federated_kbs} knowledge bases can be searched at once.",
+        )
+    try:
+        if kb_ids:
+            kbs = _resolve_kbs_for_user(user, kb_ids, KnowledgeBaseRole.VIEWER)
+            results = await federated_retrieve(kb_ids=kbs, query=query, top_k=5)
+        else:
+            kb = _resolve_kb_for_user(user, kb_id, KnowledgeBaseRole.VIEWER)
+            results = [{**r, "kb_id": kb} for r in await async_hybrid_retrieve(kb_id=kb, query=query, top_k=5)]
         return [
             {
                 "snippet": (r.get("snippet") or "")[:300],
@@ -186,9 +299,12 @@ async def search_documents(user: User, query: str, kb_id: int = Query(None)):
                 "metadata": r.get("metadata", {}),
                 "dense_score": r.get("dense_score", 0.0),
                 "sparse_score": r.get("sparse_score", 0.0),
+                "kb_id": r.get("kb_id"),
             }
             for r in results
         ]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -196,10 +312,10 @@ async def search_documents(user: User, query: str, kb_id: int = Query(None)):
         ) from e
 
 
-def _retrieve_for_chat(kb_id: int, query: str, limit: int = 5) -> list[dict[str, Any]]:
+async def _retrieve_for_chat(kb_id: int, query: str, limit: int = 5) -> list[dict[str, Any]]:
     """Return list of {snippet, metadata} for RAG context."""
     try:
-        results = hybrid_retrieve(kb_id=kb_id, query=query, top_k=limit)
+        results = await async_hybrid_retrieve(kb_id=kb_id, query=query, top_k=limit)
         return [
             {"snippet": r.get("snippet", ""), "metadata": r.get("metadata", {}), "score": r.get("score", 0.0)}
             for r in results
@@ -248,50 +364,58 @@ def _fallback_answer_from_sources(question: str, sources: list[dict[str, Any]],
     return f"LLM unavailable ({detail}). Retrieved context:\n" + "\n".join(preview_lines)
 
 
-async def chat_rag(user: User, message: str, kb_id: int | None = None, session_id: str | None = None) -> dict:
+async def _load_chat_history(user_id: int, kb_id: int, session_id: str) -> str:
+    """Validate an existing session (if any) and return its prompt history."""
+    async with AsyncSessionLocal() as db:
+        session = await db.get(ChatSession, session_id)
+        if session is None:
+            return ""
+        _check_chat_session(session, user_id, kb_id)
+        return await _history_for_prompt(db, session_id, max_messages=10)
+
+
+async def _save_chat_turn(user_id: int, kb_id: int, session_id: str, message: str, answer: str) -> None:
+    async with AsyncSessionLocal() as db:
+        session = await _get_or_create_chat_session(db, user_id=user_id, kb_id=kb_id, session_id=session_id)
+        db.add(ChatMessage(session_id=session_id, role=ChatRole.USER, content=message))
+        db.add(ChatMessage(session_id=session_id, role=ChatRole.ASSISTANT, content=answer))
+        session.updated_at = datetime.utcnow()
+        await db.commit()
+
+
+async def chat_rag(user: Principal, message: str, kb_id: int | None = None, session_id: str | None = None) -> dict:
     """RAG chat: retrieve chunks, build prompt, call LLM, return answer + sources."""
-    kb = _resolve_kb_for_user(user, kb_id, min_role=KnowledgeBaseRole.VIEWER)
+    kb = _resolve_kb_for_user(user, kb_id, KnowledgeBaseRole.VIEWER)
     session_key = _normalize_session_id(session_id)
-    db = SessionLocal()
+    history = await _load_chat_history(user.id, kb, session_key)
+
+    source_limit = max(1, settings.chat_context_max_sources)
+    sources: list[dict[str, Any]] = await _retrieve_for_chat(kb, message, limit=source_limit)
+    source_char_limit = max(120, settings.chat_context_max_chars_per_source)
+    context_blocks = "\n\n---\n\n".join(
+        f"[Source {i+1}]\n{(s['snippet'] or '')[:source_char_limit]}" for i, s in enumerate(sources)
+    )
+    if not context_blocks:
+        answer = "No relevant documents found in the selected knowledge base yet. Upload documents and try again."
+        await _save_chat_turn(user.id, kb, session_key, message, answer)
+        return {"answer": answer, "sources": [], "session_id": session_key}
+
+    system = (
+        "Answer only using the provided context blocks for factual claims. "
+        "Use conversation history only for continuity. "
+        "If context is insufficient, explicitly say so and do not fabricate facts. "
+        "Mention source numbers when possible."
+    )
+    history_block = f"Conversation history:\n{history}\n\n" if history else ""
+    user_prompt = f"{history_block}Context:\n\n{context_blocks}\n\nQuestion: {message}"
     try:
-        session = _get_or_create_chat_session(db, user_id=user.id, kb_id=kb, session_id=session_key)
-        history = _history_for_prompt(db, session_key, max_messages=10)
-
-        source_limit = max(1, settings.chat_context_max_sources)
-        sources: list[dict[str, Any]] = _retrieve_for_chat(kb, message, limit=source_limit)
-        source_char_limit = max(120, settings.chat_context_max_chars_per_source)
-        context_blocks = "\n\n---\n\n".join(
-            f"[Source {i+1}]\n{(s['snippet'] or '')[:source_char_limit]}" for i, s in enumerate(sources)
-        )
-        if not context_blocks:
-            answer = "No relevant documents found in the selected knowledge base yet. Upload documents and try again."
-            db.add(ChatMessage(session_id=session_key, role=ChatRole.USER, content=message))
-            db.add(ChatMessage(session_id=session_key, role=ChatRole.ASSISTANT, content=answer))
-            session.updated_at = datetime.utcnow()
-            db.commit()
-            return {"answer": answer, "sources": [], "session_id": session_key}
-
-        system = (
-            "Answer only using the provided context blocks for factual claims. "
-            "Use conversation history only for continuity. "
-            "If context is insufficient, explicitly say so and do not fabricate facts. "
-            "Mention source numbers when possible."
-        )
-        history_block = f"Conversation history:\n{history}\n\n" if history else ""
-        user_prompt = f"{history_block}Context:\n\n{context_blocks}\n\nQuestion: {message}"
-        try:
-            answer = await llm_generate(user_prompt, system=system)
-        except Exception as e:
-            detail = str(e).strip() or e.__class__.__name__
-            answer = _fallback_answer_from_sources(message, sources, detail)
-
-        db.add(ChatMessage(session_id=session_key, role=ChatRole.USER, content=message))
-        db.add(ChatMessage(session_id=session_key, role=ChatRole.ASSISTANT, content=answer))
-        session.updated_at = datetime.utcnow()
-        db.commit()
-        return {"answer": answer, "sources": sources, "session_id": session_key}
-    finally:
-        db.close()
+        answer = await llm_generate(user_prompt, system=system)
+    except Exception as e:
+        detail = str(e).strip() or e.__class__.__name__
+        answer = _fallback_answer_from_sources(message, sources, detail)
+
+    await _save_chat_turn(user.id, kb, session_key, message, answer)
+    return {"answer": answer, "sources": sources, "session_id": session_key}
 
 
 async def chat(message: str) -> dict:
@@ -306,7 +430,7 @@ async def root() -> HTMLResponse:
     )
 
 
-def list_knowledge_bases(user: User) -> list:
+def list_knowledge_bases(user: Principal) -> list:
     db = SessionLocal()
     try:
         return list_user_knowledge_bases(db, user.id)
@@ -314,7 +438,7 @@ def list_knowledge_bases(user: User) -> list:
         db.close()
 
 
-def get_document_status(user: User, document_id: int) -> dict | None:
+def get_document_status(user: Principal, document_id: int) -> dict | None:
     db = SessionLocal()
     try:
         doc = db.query(Document).filter(Document.id == document_id).first()
@@ -326,7 +450,32 @@ def get_document_status(user: User, document_id: int) -> dict | None:
         db.close()
 
 
-def list_chat_sessions(user: User, kb_id: int | None = None) -> list[dict]:
+SESSION_PREVIEW_CHARS = 140
+
+
+def _encode_session_cursor(updated_at: datetime, created_at: datetime, session_id: str) -> str:
+    raw = json.dumps([updated_at.isoformat(), created_at.isoformat(), session_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_session_cursor(cursor: str) -> tuple[datetime, datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, created_at, session_id = json.loads(raw)
+        return datetime.fromisoformat(updated_at), datetime.fromisoformat(created_at), str(session_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def list_chat_sessions(
+    user: Principal, kb_id: int | None = None, limit: int = 100, cursor: str | None = None
+) -> tuple[list[dict], str | None]:
+    """One page of the user's sessions, newest first, and the cursor of the next page.
+
+    Message counts and previews come from correlated subqueries in the same
+    statement, and pages are seeked by (updated_at, created_at, id), so the
+    cost does not grow with the number of sessions or messages.
+    """
     db = SessionLocal()
     try:
         kb_filter = None
@@ -334,36 +483,66 @@ def list_chat_sessions(user: User, kb_id: int | None = None) -> list[dict]:
             require_kb_access(db, user.id, kb_id, min_role=KnowledgeBaseRole.VIEWER)
             kb_filter = kb_id
 
-        q = db.query(ChatSession).filter(ChatSession.user_id == user.id)
+        message_count = (
+            select(func.count(ChatMessage.id))
+            .where(ChatMessage.session_id == ChatSession.id)
+            .correlate(ChatSession)
+            .scalar_subquery()
+        )
+        # One character past the preview length tells whether it was truncated.
+        latest_preview = (
+            select(func.substr(ChatMessage.content, 1, SESSION_PREVIEW_CHARS + 1))
+            .where(ChatMessage.session_id == ChatSession.id)
+            .order_by(desc(ChatMessage.id))
+            .limit(1)
+            .correlate(ChatSession)
+            .scalar_subquery()
+        )
+        q = select(
+            ChatSession.id,
+            ChatSession.knowledge_base_id,
+            ChatSession.created_at,
+            ChatSession.updated_at,
+            message_count.label("message_count"),
+            latest_preview.label("latest_preview"),
+        ).where(ChatSession.user_id == user.id)
         if kb_filter is not None:
-            q = q.filter(ChatSession.knowledge_base_id == kb_filter)
-        sessions = q.order_by(desc(ChatSession.updated_at), desc(ChatSession.created_at)).all()
-
-        out = []
-        for s in sessions:
-            latest = (
-                db.query(ChatMessage)
-                .filter(ChatMessage.session_id == s.id)
-                .order_by(desc(ChatMessage.id))
-                .first()
+            q = q.where(ChatSession.knowledge_base_id == kb_filter)
+        if cursor:
+            q = q.where(
+                tuple_(ChatSession.updated_at, ChatSession.created_at, ChatSession.id)
+                < tuple_(*_decode_session_cursor(cursor))
             )
-            count = db.query(ChatMessage).filter(ChatMessage.session_id == s.id).count()
+        rows = db.execute(
+            q.order_by(desc(ChatSession.updated_at), desc(ChatSession.created_at), desc(ChatSession.id)).limit(limit + 1)
+        ).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = _encode_session_cursor(last.updated_at, last.created_at, last.id)
+        out = []
+        for row in rows:
+            preview = row.latest_preview or ""
             out.append(
                 {
-                    "session_id": s.id,
-                    "kb_id": s.knowledge_base_id,
-                    "created_at": s.created_at.isoformat(),
-                    "updated_at": s.updated_at.isoformat(),
-                    "message_count": count,
-                    "last_message_preview": (latest.content[:140] + "...") if latest and len(latest.content) > 140 else (latest.content if latest else ""),
+                    "session_id": row.id,
+                    "kb_id": row.knowledge_base_id,
+                    "created_at": row.created_at.isoformat(),
+                    "updated_at": row.updated_at.isoformat(),
+                    "message_count": row.message_count,
+                    "last_message_preview": (preview[:SESSION_PREVIEW_CHARS] + "...")
+                    if len(preview) > SESSION_PREVIEW_CHARS
+                    else preview,
                 }
             )
-        return out
+        return out, next_cursor
     finally:
         db.close()
 
 
-def get_chat_session(user: User, session_id: str, limit: int = 100) -> dict:
+def get_chat_session(user: Principal, session_id: str, limit: int = 100) -> dict:
     db = SessionLocal()
     try:
         session = (
@@ -401,7 +580,7 @@ def get_chat_session(user: User, session_id: str, limit: int = 100) -> dict:
         db.close()
 
 
-def delete_chat_session(user: User, session_id: str) -> dict:
+def delete_chat_session(user: Principal, session_id: str) -> dict:
     db = SessionLocal()
     try:
         session = (
@@ -440,7 +619,7 @@ def _count_kb_owners(db, kb_id: int) -> int:
     )
 
 
-def list_kb_members(user: User, kb_id: int) -> list[dict]:
+def list_kb_members(user: Principal, kb_id: int) -> list[dict]:
     db = SessionLocal()
     try:
         require_kb_access(db, user.id, kb_id, min_role=KnowledgeBaseRole.VIEWER)
@@ -465,7 +644,7 @@ def list_kb_members(user: User, kb_id: int) -> list[dict]:
         db.close()
 
 
-def add_kb_member(user: User, kb_id: int, email: str, role: str) -> dict:
+def add_kb_member(user: Principal, kb_id: int, email: str, role: str) -> dict:
     db = SessionLocal()
     try:
         require_kb_access(db, user.id, kb_id, min_role=KnowledgeBaseRole.OWNER)
@@ -494,6 +673,7 @@ def add_kb_member(user: User, kb_id: int, email: str, role: str) -> dict:
             )
             db.add(membership)
         db.commit()
+        invalidate_user(target_user.id)
         return {
             "kb_id": kb_id,
             "user_id": target_user.id,
@@ -505,7 +685,7 @@ def add_kb_member(user: User, kb_id: int, email: str, role: str) -> dict:
         db.close()
 
 
-def update_kb_member_role(user: User, kb_id: int, member_user_id: int, role: str) -> dict:
+def update_kb_member_role(user: Principal, kb_id: int, member_user_id: int, role: str) -> dict:
     db = SessionLocal()
     try:
         require_kb_access(db, user.id, kb_id, min_role=KnowledgeBaseRole.OWNER)
@@ -529,6 +709,7 @@ def update_kb_member_role(user: User, kb_id: int, member_user_id: int, role: str
                 )
         membership.role = target_role
         db.commit()
+        invalidate_user(member_user_id)
 
         target_user = db.query(User).filter(User.id == member_user_id).first()
         return {
@@ -542,7 +723,7 @@ def update_kb_member_role(user: User, kb_id: int, member_user_id: int, role: str
         db.close()
 
 
-def remove_kb_member(user: User, kb_id: int, member_user_id: int) -> dict:
+def remove_kb_member(user: Principal, kb_id: int, member_user_id: int) -> dict:
     db = SessionLocal()
     try:
         require_kb_access(db, user.id, kb_id, min_role=KnowledgeBaseRole.OWNER)
@@ -563,6 +744,7 @@ def remove_kb_member(user: User, kb_id: int, member_user_id: int) -> dict:
             )
         db.delete(membership)
         db.commit()
+        invalidate_user(member_user_id)
         return {"message": "Member removed."}
     finally:
         db.close()
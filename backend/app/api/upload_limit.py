@@ -0,0 +1,54 @@
+"""Reject oversized upload bodies before Starlette spools them to disk."""
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+# Multipart boundaries and part headers around the file itself.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File exceeds the upload limit of {settings.max_upload_bytes} bytes",
+    )
+
+
+class UploadSizeLimitMiddleware:
+    """Caps request bodies on ``paths`` at ``MAX_UPLOAD_BYTES`` plus multipart overhead.
+
+    A declared ``Content-Length`` over the cap is answered with 413 before any
+    of the body is read. Otherwise the body is counted as it streams and the
+    upload fails with 413 as soon as the cap is passed, so an oversized
+    chunked upload costs at most the cap in I/O and temp space.
+    """
+
+    def __init__(self, app: ASGIApp, paths: tuple[str, ...]):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        limit = settings.max_upload_bytes + MULTIPART_OVERHEAD_BYTES
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > limit:
+            error = _too_large()
+            await JSONResponse({"detail": error.detail}, status_code=error.status_code)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -1,7 +1,16 @@
-"""Semantic-aware chunking with paragraph + sentence-aware splitting."""
+"""Semantic-aware chunking with paragraph + sentence-aware splitting.
+
+The chunker is a single pass over spans: paragraphs are located with one
+regex scan, split into bounded segments, and a merge generator packs segments
+into chunks while tracking only lengths. Chunk text is joined once, when the
+chunk is emitted, so runtime is linear in the size of the document. Paginated
+input (PDF pages) is consumed one page at a time.
+"""
+from bisect import bisect_right
+from collections import deque
 import re
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 
 @dataclass
@@ -12,10 +21,61 @@ class Chunk:
     end_char: int
 
 
+PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
 SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
 WORD_SPLIT_RE = re.compile(r"\s+")
 
 
+def _pack(pieces: Iterable[str], max_chunk_chars: int, start_char: int) -> Iterator[tuple[str, int, int]]:
+    """Greedily join pieces with single spaces up to ``max_chunk_chars``.
+
+    Offsets advance by each piece plus one separator, which is exact when the
+    pieces were separated by single whitespace characters.
+    """
+    group: list[str] = []
+    group_len = 0
+    group_start = start_char
+    cursor = start_char
+    for piece in pieces:
+        if group and group_len + 1 + len(piece) > max_chunk_chars:
+            yield " ".join(group), group_start, group_start + group_len
+            group = [piece]
+            group_len = len(piece)
+            group_start = cursor
+        else:
+            group_len += len(piece) + (1 if group else 0)
+            group.append(piece)
+        cursor += len(piece) + 1
+    if group:
+        yield " ".join(group), group_start, group_start + group_len
+
+
+def _wrap_words(text: str, max_chunk_chars: int, start_char: int) -> list[tuple[str, int, int]]:
+    """Word-wrap ``text`` (stripped) with single spaces, jumping a whole line per step.
+
+    Equivalent to ``_pack`` over the words: positions in the space-normalized
+    string are exactly the cumulative word offsets.
+    """
+    flat = WORD_SPLIT_RE.sub(" ", text)
+    out: list[tuple[str, int, int]] = []
+    pos = 0
+    n = len(flat)
+    while pos < n:
+        if n - pos <= max_chunk_chars:
+            end = n
+        elif flat[pos + max_chunk_chars] == " ":
+            end = pos + max_chunk_chars
+        else:
+            end = flat.rfind(" ", pos, pos + max_chunk_chars + 1)
+            if end <= pos:
+                # A single word longer than the limit stays whole.
+                end = flat.find(" ", pos)
+                end = n if end < 0 else end
+        out.append((flat[pos:end], start_char + pos, start_char + end))
+        pos = end + 1
+    return out
+
+
 def _split_long_segment(text: str, start_char: int, max_chunk_chars: int, min_chunk_chars: int) -> list[tuple[str, int, int]]:
     """Split oversized text by sentence boundaries, fallback to word wrapping."""
     clean = text.strip()
@@ -27,48 +87,14 @@ def _split_long_segment(text: str, start_char: int, max_chunk_chars: int, min_ch
     pieces = [p.strip() for p in SENTENCE_SPLIT_RE.split(clean) if p.strip()]
     if len(pieces) <= 1:
         # Word-wrap fallback when there are no sentence boundaries.
-        words = [w for w in WORD_SPLIT_RE.split(clean) if w]
-        out: list[tuple[str, int, int]] = []
-        buf = ""
-        cursor = start_char
-        for word in words:
-            candidate = f"{buf} {word}".strip()
-            if buf and len(candidate) > max_chunk_chars:
-                part = buf.strip()
-                out.append((part, cursor, cursor + len(part)))
-                cursor += len(part) + 1
-                buf = word
-            else:
-                buf = candidate
-        if buf:
-            out.append((buf, cursor, cursor + len(buf)))
-        return out
-
-    out: list[tuple[str, int, int]] = []
-    current = ""
-    current_start = start_char
-    cursor = start_char
-    for sentence in pieces:
-        candidate = f"{current} {sentence}".strip() if current else sentence
-        if current and len(candidate) > max_chunk_chars:
-            part = current.strip()
-            out.append((part, current_start, current_start + len(part)))
-            current = sentence
-            current_start = cursor
-        else:
-            current = candidate
-        cursor += len(sentence) + 1
-
-    if current.strip():
-        part = current.strip()
-        out.append((part, current_start, current_start + len(part)))
+        return _wrap_words(clean, max_chunk_chars, start_char)
 
+    out = list(_pack(pieces, max_chunk_chars, start_char))
     # Merge tiny trailing parts to avoid retrieval fragmentation.
     if len(out) > 1 and len(out[-1][0]) < min_chunk_chars:
         prev_text, prev_start, _ = out[-2]
         tail_text, _, tail_end = out[-1]
-        merged = f"{prev_text}\n{tail_text}".strip()
-        out[-2] = (merged, prev_start, tail_end)
+        out[-2] = (f"{prev_text}\n{tail_text}", prev_start, tail_end)
         out.pop()
     return out
 
@@ -84,86 +110,184 @@ def _tail_overlap(text: str, overlap_chars: int) -> str:
     return tail.strip()
 
 
-def chunk_text(
-    text: str,
+def _paragraph_spans(parts: Iterable[str], separator: str = "\n\n") -> Iterator[tuple[str, int]]:
+    """(paragraph, start) of ``separator.join(parts)`` without building the joined string.
+
+    Only an unfinished tail is buffered between parts: a separator is final
+    once non-whitespace follows it, because more text could still extend it.
+    """
+    buf = ""
+    base = 0  # offset of buf[0] in the joined text
+    first = True
+    for part in parts:
+        buf = buf + part if first else buf + separator + part
+        first = False
+        settled = len(buf.rstrip())
+        pos = 0
+        for sep in PARAGRAPH_SPLIT_RE.finditer(buf):
+            if sep.end() >= settled:
+                break
+            yield buf[pos : sep.start()], base + pos
+            pos = sep.end()
+        buf = buf[pos:]
+        base += pos
+    pos = 0
+    for sep in PARAGRAPH_SPLIT_RE.finditer(buf):
+        yield buf[pos : sep.start()], base + pos
+        pos = sep.end()
+    yield buf[pos:], base + pos
+
+
+def iter_segments(
+    parts: Iterable[str], max_chunk_chars: int, min_chunk_chars: int
+) -> Iterator[tuple[str, int, int]]:
+    """Bounded (text, start, end) segments of every non-blank paragraph of the blank-line-joined parts."""
+    for para, start in _paragraph_spans(parts):
+        if para.strip():
+            yield from _split_long_segment(
+                para, start, max_chunk_chars=max_chunk_chars, min_chunk_chars=min_chunk_chars
+            )
+
+
+def merge_segments(
+    segments: Iterable[tuple[str, int, int]],
     max_chunk_chars: int = 600,
     overlap_chars: int = 80,
     min_chunk_chars: int = 180,
     metadata_base: dict[str, Any] | None = None,
-) -> list[Chunk]:
-    """Split text into semantically coherent chunks with bounded size and overlap."""
-    source_text = text or ""
+) -> Iterator[Chunk]:
+    """Pack segments into chunks separated by blank lines, carrying a word-aligned overlap."""
     meta = dict(metadata_base or {})
-    chunks: list[Chunk] = []
-
-    # Paragraph-level segmentation first.
-    paragraphs = [p for p in re.split(r"\n\s*\n", source_text) if p.strip()]
-    if not paragraphs:
-        return []
-
-    segments: list[tuple[str, int, int]] = []
-    cursor = 0
-    for para in paragraphs:
-        idx = source_text.find(para, cursor)
-        if idx < 0:
-            idx = cursor
-        cursor = idx + len(para)
-        segments.extend(_split_long_segment(para, idx, max_chunk_chars=max_chunk_chars, min_chunk_chars=min_chunk_chars))
-
-    current_text = ""
+    parts: list[str] = []
+    length = 0  # == len("\n\n".join(parts))
     current_start = 0
     current_end = 0
     paragraph_count = 0
-
-    def emit_chunk() -> None:
-        nonlocal current_text, current_start, current_end, paragraph_count
-        body = current_text.strip()
-        if not body:
-            return
-        chunk_meta = {
-            **meta,
-            "paragraph_count": paragraph_count,
-            "char_length": len(body),
-        }
-        chunks.append(
-            Chunk(
-                text=body,
-                metadata=chunk_meta,
-                start_char=current_start,
-                end_char=current_end,
-            )
-        )
-        overlap = _tail_overlap(body, overlap_chars=overlap_chars)
-        current_text = overlap
-        if overlap:
-            current_start = max(current_end - len(overlap), 0)
-        else:
-            current_start = current_end
-        paragraph_count = 0
+    index = 0
 
     for seg_text, seg_start, seg_end in segments:
-        if not current_text:
-            current_text = seg_text
+        if not parts:
+            parts = [seg_text]
+            length = len(seg_text)
             current_start = seg_start
             current_end = seg_end
             paragraph_count = 1
             continue
 
-        candidate = f"{current_text}\n\n{seg_text}".strip()
-        if len(candidate) > max_chunk_chars and len(current_text) >= min_chunk_chars:
-            emit_chunk()
-            if current_text:
-                candidate = f"{current_text}\n\n{seg_text}".strip()
-            else:
-                candidate = seg_text
-        current_text = candidate
+        if length + 2 + len(seg_text) > max_chunk_chars and length >= min_chunk_chars:
+            body = "\n\n".join(parts)
+            yield Chunk(
+                text=body,
+                metadata={**meta, "paragraph_count": paragraph_count, "char_length": len(body), "chunk_index": index},
+                start_char=current_start,
+                end_char=current_end,
+            )
+            index += 1
+            overlap = _tail_overlap(body, overlap_chars=overlap_chars)
+            parts = [overlap] if overlap else []
+            length = len(overlap)
+            current_start = max(current_end - len(overlap), 0) if overlap else current_end
+            paragraph_count = 0
+
+        length += len(seg_text) + (2 if parts else 0)
+        parts.append(seg_text)
         current_end = max(current_end, seg_end)
         paragraph_count += 1
 
-    emit_chunk()
+    if parts:
+        body = "\n\n".join(parts)
+        yield Chunk(
+            text=body,
+            metadata={**meta, "paragraph_count": paragraph_count, "char_length": len(body), "chunk_index": index},
+            start_char=current_start,
+            end_char=current_end,
+        )
+
+
+def iter_chunks(
+    text: str,
+    max_chunk_chars: int = 600,
+    overlap_chars: int = 80,
+    min_chunk_chars: int = 180,
+    metadata_base: dict[str, Any] | None = None,
+) -> Iterator[Chunk]:
+    """Yield chunks one at a time with ``chunk_index`` set; ``chunk_count`` is left to the consumer."""
+    return merge_segments(
+        iter_segments([text or ""], max_chunk_chars=max_chunk_chars, min_chunk_chars=min_chunk_chars),
+        max_chunk_chars=max_chunk_chars,
+        overlap_chars=overlap_chars,
+        min_chunk_chars=min_chunk_chars,
+        metadata_base=metadata_base,
+    )
+
+
+def iter_page_chunks(
+    pages: Iterable[str],
+    max_chunk_chars: int = 600,
+    overlap_chars: int = 80,
+    min_chunk_chars: int = 180,
+    metadata_base: dict[str, Any] | None = None,
+) -> Iterator[Chunk]:
+    """Chunk pages as they are produced, adding 1-based ``page_start``/``page_end`` metadata.
+
+    Chunks and offsets are the same as for the pages joined by blank lines,
+    but only the current page and an unfinished paragraph are held in memory.
+    ``page_start`` is the page of the chunk's first character: without overlap
+    ``start_char`` is the end of the previous chunk, which can sit in the
+    separator before the page the chunk's text actually starts on.
+    """
+    page_starts: list[int] = []
+    spans: deque[tuple[int, int]] = deque()
+
+    def tracked() -> Iterator[str]:
+        offset = 0
+        for page in pages:
+            page_starts.append(offset)
+            yield page
+            offset += len(page) + 2
+
+    def recorded(segments: Iterator[tuple[str, int, int]]) -> Iterator[tuple[str, int, int]]:
+        for segment in segments:
+            spans.append((segment[1], segment[2]))
+            yield segment
+
+    chunks = merge_segments(
+        recorded(iter_segments(tracked(), max_chunk_chars=max_chunk_chars, min_chunk_chars=min_chunk_chars)),
+        max_chunk_chars=max_chunk_chars,
+        overlap_chars=overlap_chars,
+        min_chunk_chars=min_chunk_chars,
+        metadata_base=metadata_base,
+    )
+    for chunk in chunks:
+        # Segments that ended before this chunk are never needed again.
+        while spans and spans[0][1] <= chunk.start_char:
+            spans.popleft()
+        first_char = max(chunk.start_char, spans[0][0]) if spans else chunk.start_char
+        chunk.metadata["page_start"] = max(1, bisect_right(page_starts, first_char))
+        chunk.metadata["page_end"] = max(
+            chunk.metadata["page_start"], bisect_right(page_starts, max(chunk.start_char, chunk.end_char - 1))
+        )
+        yield chunk
+
 
+def chunk_text(
+    text: str,
+    max_chunk_chars: int = 600,
+    overlap_chars: int = 80,
+    min_chunk_chars: int = 180,
+    metadata_base: dict[str, Any] | None = None,
+) -> list[Chunk]:
+    """Split text into semantically coherent chunks with bounded size and overlap."""
+    chunks = list(
+        iter_chunks(
+            text,
+            max_chunk_chars=max_chunk_chars,
+            overlap_chars=overlap_chars,
+            min_chunk_chars=min_chunk_chars,
+            metadata_base=metadata_base,
+        )
+    )
     total = len(chunks)
-    for i, chunk in enumerate(chunks):
-        chunk.metadata["chunk_index"] = i
+    for chunk in chunks:
         chunk.metadata["chunk_count"] = total
     return chunks
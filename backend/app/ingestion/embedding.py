@@ -1,37 +1,178 @@
-"""Embedding service: sentence-transformers or stub."""
-_model = None
+"""Embedding service with pluggable backends, optionally behind the shared embedding worker.
 
+Backends (``EMBEDDING_BACKEND``):
+- ``sentence-transformers``: PyTorch ``SentenceTransformer``.
+- ``onnx``: ONNX Runtime on CPU from a local exported model directory
+  (``model.onnx`` or the int8 ``model_quantized.onnx`` plus ``tokenizer.json``).
+- ``stub``: deterministic sha256 pseudo-vectors for tests and dependency-free setups.
+- ``auto`` (default): sentence-transformers when installed, otherwise the stub.
+"""
+from __future__ import annotations
 
-def _get_model():
-    global _model
-    if _model is not None:
-        return _model
-    try:
+from abc import ABC, abstractmethod
+import hashlib
+from pathlib import Path
+
+from app.core.config import settings
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+STUB_MODEL_ID = "sha256-stub"
+STUB_DIM = 384
+
+_backend: EmbeddingBackend | None = None
+
+
+class EmbeddingServiceUnavailable(RuntimeError):
+    """The embedding worker did not answer and this process' backend is a different model."""
+
+
+class EmbeddingBackend(ABC):
+    """Turns texts into vectors; ``model_id`` must change whenever the vectors would."""
+
+    model_id: str
+    dim: int
+
+    @abstractmethod
+    def encode(self, texts: list[str]) -> list[list[float]]:
+        ...
+
+
+class StubBackend(EmbeddingBackend):
+    model_id = STUB_MODEL_ID
+    dim = STUB_DIM
+
+    def encode(self, texts: list[str]) -> list[list[float]]:
+        out = []
+        for t in texts:
+            h = hashlib.sha256(t.encode()).digest()
+            out.append([(int(h[i % 32]) - 128) / 128.0 for i in range(self.dim)])
+        return out
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME):
         from sentence_transformers import SentenceTransformer
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
-        return _model
-    except Exception:
+
+        self._model = SentenceTransformer(model_name)
+        self.model_id = model_name
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: list[str]) -> list[list[float]]:
+        return self._model.encode(texts, convert_to_numpy=True).tolist()
+
+
+class OnnxBackend(EmbeddingBackend):
+    """Mean-pooled, L2-normalized sentence embeddings from an exported transformer (same output as ST)."""
+
+    def __init__(self, model_dir: str, quantized: bool = False, max_length: int = 256):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        path = Path(model_dir)
+        model_file = path / ("model_quantized.onnx" if quantized else "model.onnx")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(str(model_file), options, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = Tokenizer.from_file(str(path / "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=max_length)
+        self._tokenizer.enable_padding()
+        self.model_id = f"onnx:{path.name}{':int8' if quantized else ''}"
+        self.dim = int(self._session.get_outputs()[0].shape[-1])
+
+    def encode(self, texts: list[str]) -> list[list[float]]:
+        import numpy as np
+
+        if not texts:
+            return []
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        attention = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention}
+        if "token_type_ids" in self._inputs:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self._session.run(None, feeds)[0]
+        mask = attention[:, :, None].astype(hidden.dtype)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.tolist()
+
+
+def create_backend(name: str) -> EmbeddingBackend:
+    """Instantiate a backend by name; ``auto`` degrades to the stub when nothing else loads."""
+    name = (name or "auto").strip().lower()
+    if name == "stub":
+        return StubBackend()
+    if name == "onnx":
+        if not settings.embedding_onnx_model_dir:
+            raise ValueError("EMBEDDING_ONNX_MODEL_DIR is required for the onnx embedding backend")
+        return OnnxBackend(settings.embedding_onnx_model_dir, quantized=settings.embedding_onnx_quantized)
+    if name == "sentence-transformers":
+        return SentenceTransformerBackend()
+    if name == "auto":
+        try:
+            return SentenceTransformerBackend()
+        except Exception:
+            return StubBackend()
+    raise ValueError(f"Unknown embedding backend: {name!r}")
+
+
+def get_backend() -> EmbeddingBackend:
+    """The process-wide backend. An explicitly configured backend that fails to load raises:
+    silently switching to the stub would index and query meaningless vectors."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend(settings.embedding_backend)
+    return _backend
+
+
+def _service_info() -> dict | None:
+    if not settings.embedding_service_enabled:
         return None
+    from app.services.embedding_worker import service_info
+
+    return service_info()
+
+
+def get_embedding_dim(local: bool = False) -> int:
+    info = None if local else _service_info()
+    if info is not None:
+        return int(info["dim"])
+    return get_backend().dim
+
+
+def embedding_model_id(local: bool = False) -> str:
+    """Identifier of the vectors ``embed_texts`` is expected to produce, for cache lookups."""
+    info = None if local else _service_info()
+    if info is not None:
+        return info["model_id"]
+    return get_backend().model_id
+
+
+def embed_texts(texts: list[str], timeout: float | None = None) -> tuple[list[list[float]], str]:
+    """Return a vector for each text and the id of the model that produced them.
+
+    With ``EMBEDDING_SERVICE_ENABLED`` the texts are batched with other callers'
+    by the embedding worker; if it is unavailable, or does not answer within
+    ``timeout`` (default ``EMBEDDING_SERVICE_TIMEOUT_SECONDS``), they are
+    embedded in-process. The fallback raises :class:`EmbeddingServiceUnavailable`
+    when the worker last seen runs a different model: mixing its vectors with
+    this process' in one collection or cache would corrupt both.
+    """
+    if settings.embedding_service_enabled and texts:
+        from app.services.embedding_worker import announced_model_id, remote_embed
+
+        result = remote_embed(texts, timeout=timeout)
+        if result is not None:
+            return result
+        worker_model_id = announced_model_id()
+        if worker_model_id is not None and get_backend().model_id != worker_model_id:
+            raise EmbeddingServiceUnavailable(
+                f"Embedding worker ({worker_model_id}) unavailable and the local backend is {get_backend().model_id}"
+            )
+    return embed_texts_local(texts), get_backend().model_id
 
 
-def get_embedding_dim() -> int:
-    m = _get_model()
-    if m is not None:
-        return m.get_sentence_embedding_dimension()
-    return 384
-
-
-def embed_texts(texts: list[str]) -> list[list[float]]:
-    """Return list of vectors for each text."""
-    m = _get_model()
-    if m is not None:
-        return m.encode(texts, convert_to_numpy=True).tolist()
-    # Stub: deterministic pseudo-vectors for testing
-    import hashlib
-    dim = 384
-    out = []
-    for t in texts:
-        h = hashlib.sha256(t.encode()).digest()
-        vec = [(int(h[i % 32]) - 128) / 128.0 for i in range(dim)]
-        out.append(vec)
-    return out
+def embed_texts_local(texts: list[str]) -> list[list[float]]:
+    """Embed with the backend loaded in this process."""
+    return get_backend().encode(texts)
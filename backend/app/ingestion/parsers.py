@@ -1,45 +1,150 @@
-"""Document parsers by type. Return plain text and optional metadata (e.g. page)."""
-import re
-from typing import Any
+"""Document parsers by type. Return plain text and optional metadata (e.g. page).
+
+Parsers take the document as bytes or as a path to a file on disk (a spooled
+object), which is opened directly instead of being read into memory.
+"""
+import io
+import itertools
+import logging
+import mmap
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Iterable, Iterator, Union
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Source = Union[bytes, bytearray, memoryview, os.PathLike]
+
+# PDF (bytes or path) of the document being extracted, set once per pool worker.
+_worker_pdf: Source | None = None
+
+
+def _open_pdf(source: Source):
+    import fitz
+
+    if isinstance(source, os.PathLike):
+        return fitz.open(os.fspath(source), filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _pdf_pages(doc, start: int = 0) -> Iterator[str]:
+    try:
+        for i in range(start, doc.page_count):
+            yield doc.load_page(i).get_text()
+    finally:
+        doc.close()
+
+
+def _init_pdf_worker(source: Source) -> None:
+    global _worker_pdf
+    _worker_pdf = source
+
+
+def _extract_page_range(start: int, stop: int) -> list[str]:
+    """Text of pages ``[start, stop)`` of the worker's PDF."""
+    doc = _open_pdf(_worker_pdf)
+    try:
+        return [doc.load_page(i).get_text() for i in range(start, stop)]
+    finally:
+        doc.close()
+
+
+def _parallel_pdf_pages(source: Source, page_count: int) -> Iterator[str]:
+    """Extract page ranges on a process pool and yield the pages in order.
+
+    At most two ranges per worker are in flight, so finished pages waiting
+    for an earlier range stay bounded. If the pool cannot be used extraction
+    continues serially from the next page not yet yielded. Workers open a
+    spooled file by path; in-memory PDFs are sent to each worker once.
+    """
+    step = max(1, settings.pdf_parallel_range_pages)
+    workers = settings.pdf_parallel_workers or os.cpu_count() or 1
+    ranges = iter([(start, min(start + step, page_count)) for start in range(0, page_count, step)])
+    next_page = 0
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_pdf_worker,
+            initargs=(source,),
+        ) as pool:
+            pending = deque(pool.submit(_extract_page_range, *r) for r in itertools.islice(ranges, 2 * workers))
+            while pending:
+                pages = pending.popleft().result()
+                for r in itertools.islice(ranges, 1):
+                    pending.append(pool.submit(_extract_page_range, *r))
+                for text in pages:
+                    next_page += 1
+                    yield text
+        return
+    except (AssertionError, OSError, BrokenProcessPool) as exc:
+        logger.warning("Parallel PDF extraction unavailable (%s); continuing serially at page %d", exc, next_page + 1)
+    yield from _pdf_pages(_open_pdf(source), start=next_page)
+
 
 # Lazy imports for optional deps
-def _parse_pdf(content: bytes) -> tuple[str, dict[str, Any]]:
+def _parse_pdf_pages(source: Source) -> tuple[Iterable[str], dict[str, Any]]:
+    """Page texts as a lazy iterator; the document is closed when it is exhausted.
+
+    PDFs with at least ``PDF_PARALLEL_MIN_PAGES`` pages are extracted in
+    parallel page ranges; smaller ones are read serially in this process, as
+    is every PDF in a daemonic process (such as a Celery prefork child), which
+    may not start the pool.
+    """
     try:
-        import fitz  # PyMuPDF
+        import fitz  # noqa: F401 - PyMuPDF
     except ImportError:
-        return _fallback_text(content), {}
-    doc = fitz.open(stream=content, filetype="pdf")
-    parts = []
-    meta = {"pages": doc.page_count}
-    for i in range(doc.page_count):
-        page = doc.load_page(i)
-        parts.append(page.get_text())
-    doc.close()
-    return "\n\n".join(parts), meta
-
-
-def _parse_txt(content: bytes) -> tuple[str, dict[str, Any]]:
-    text = content.decode("utf-8", errors="replace")
+        return [_fallback_text(source)], {}
+    doc = _open_pdf(source)
+    page_count = doc.page_count
+    if (
+        settings.pdf_parallel_min_pages > 0
+        and page_count >= settings.pdf_parallel_min_pages
+        and not multiprocessing.current_process().daemon
+    ):
+        doc.close()
+        return _parallel_pdf_pages(source, page_count), {"pages": page_count}
+    return _pdf_pages(doc), {"pages": page_count}
+
+
+def _parse_pdf(source: Source) -> tuple[str, dict[str, Any]]:
+    pages, meta = _parse_pdf_pages(source)
+    return "\n\n".join(pages), meta
+
+
+def _parse_txt(source: Source) -> tuple[str, dict[str, Any]]:
+    text = _fallback_text(source)
     return text, {}
 
 
-def _parse_md(content: bytes) -> tuple[str, dict[str, Any]]:
-    return _parse_txt(content)
+def _parse_md(source: Source) -> tuple[str, dict[str, Any]]:
+    return _parse_txt(source)
 
 
-def _parse_docx(content: bytes) -> tuple[str, dict[str, Any]]:
+def _parse_docx(source: Source) -> tuple[str, dict[str, Any]]:
     try:
         from docx import Document as DocxDocument
-        import io
-        doc = DocxDocument(io.BytesIO(content))
+        doc = DocxDocument(os.fspath(source) if isinstance(source, os.PathLike) else io.BytesIO(source))
         parts = [p.text for p in doc.paragraphs]
         return "\n\n".join(parts), {}
     except ImportError:
-        return _fallback_text(content), {}
+        return _fallback_text(source), {}
 
 
-def _fallback_text(content: bytes) -> str:
-    return content.decode("utf-8", errors="replace")
+def _fallback_text(source: Source) -> str:
+    """UTF-8 text of the document; files are decoded straight from a memory map."""
+    if not isinstance(source, os.PathLike):
+        return str(source, "utf-8", errors="replace")
+    with open(source, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return str(mapped, "utf-8", errors="replace")
 
 
 MIME_PARSERS = {
@@ -57,12 +162,37 @@ EXTENSION_MAP = {
 }
 
 
-def parse_document(content: bytes, filename: str, mime_type: str | None = None) -> tuple[str, dict[str, Any]]:
-    """Parse document content. Returns (text, metadata)."""
+PAGE_PARSERS = {
+    "application/pdf": _parse_pdf_pages,
+}
+
+
+def _resolve_mime(filename: str, mime_type: str | None) -> str | None:
     if mime_type and mime_type in MIME_PARSERS:
-        return MIME_PARSERS[mime_type](content)
+        return mime_type
     ext = "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
     mime = EXTENSION_MAP.get(ext)
-    if mime and mime in MIME_PARSERS:
-        return MIME_PARSERS[mime](content)
-    return _fallback_text(content), {}
+    return mime if mime in MIME_PARSERS else None
+
+
+def parse_document(source: Source, filename: str, mime_type: str | None = None) -> tuple[str, dict[str, Any]]:
+    """Parse document content (bytes or a file path). Returns (text, metadata)."""
+    mime = _resolve_mime(filename, mime_type)
+    if mime:
+        return MIME_PARSERS[mime](source)
+    return _fallback_text(source), {}
+
+
+def parse_document_pages(
+    source: Source, filename: str, mime_type: str | None = None
+) -> tuple[Iterable[str], dict[str, Any]]:
+    """Parse document content into page texts, produced lazily for paginated formats.
+
+    Metadata has ``pages`` when the parts are real pages; other formats come
+    back as a single part. Joining the parts with blank lines gives ``parse_document``'s text.
+    """
+    mime = _resolve_mime(filename, mime_type)
+    if mime in PAGE_PARSERS:
+        return PAGE_PARSERS[mime](source)
+    text, meta = parse_document(source, filename, mime_type)
+    return [text], meta
@@ -2,14 +2,17 @@
 from contextlib import asynccontextmanager
 from typing import Optional
 
-from fastapi import Depends, FastAPI, File, HTTPException, Query, Request, UploadFile
+from fastapi import Depends, FastAPI, File, HTTPException, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
 
 from app.api import auth, deps, routes
+from app.api.upload_limit import UploadSizeLimitMiddleware
 from app.core.config import validate_security_settings
+from app.models.base import async_engine
 from app.models.init_db import init_db
-from app.services.rate_limit import enforce_rate_limit
+from app.services.rate_limit import async_enforce_rate_limit
+from app.services.retrieval_cache import result_cache
 
 
 class ChatRequest(BaseModel):
@@ -32,6 +35,7 @@ async def lifespan(app: FastAPI):
     validate_security_settings()
     init_db()
     yield
+    await async_engine.dispose()
 
 
 app = FastAPI(
@@ -41,12 +45,15 @@ app = FastAPI(
     version="0.1.0",
 )
 
+# Added first so it sits inside CORS and its 413s carry CORS headers.
+app.add_middleware(UploadSizeLimitMiddleware, paths=("/upload/",))
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://frontend:3000"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(auth.router)
@@ -62,11 +69,12 @@ async def upload_document(
     request: Request,
     file: UploadFile = File(...),
     kb_id: int = Query(None),
+    document_id: int = Query(None),
     user=Depends(deps.get_current_user),
 ):
     ip = request.client.host if request and request.client else "unknown"
-    enforce_rate_limit("upload", key=f"user:{user.id}:ip:{ip}")
-    return await routes.upload_document(user=user, file=file, kb_id=kb_id)
+    await async_enforce_rate_limit("upload", key=f"user:{user.id}:ip:{ip}")
+    return await routes.upload_document(user=user, file=file, kb_id=kb_id, document_id=document_id)
 
 
 @app.get("/search/")
@@ -74,11 +82,17 @@ async def search_documents(
     request: Request,
     query: str,
     kb_id: int = Query(None),
+    kb_ids: list[int] = Query(None),
     user=Depends(deps.get_current_user),
 ):
     ip = request.client.host if request and request.client else "unknown"
-    enforce_rate_limit("search", key=f"user:{user.id}:ip:{ip}")
-    return await routes.search_documents(user=user, query=query, kb_id=kb_id)
+    await async_enforce_rate_limit("search", key=f"user:{user.id}:ip:{ip}")
+    return await routes.search_documents(user=user, query=query, kb_id=kb_id, kb_ids=kb_ids)
+
+
+@app.get("/search/cache-stats")
+def search_cache_stats(user=Depends(deps.get_current_user)):
+    return result_cache.stats()
 
 
 @app.post("/chat/")
@@ -88,7 +102,7 @@ async def chat_endpoint(
     user=Depends(deps.get_current_user),
 ):
     ip = request.client.host if request and request.client else "unknown"
-    enforce_rate_limit("chat", key=f"user:{user.id}:ip:{ip}")
+    await async_enforce_rate_limit("chat", key=f"user:{user.id}:ip:{ip}")
     return await routes.chat_rag(
         user=user,
         message=body.message,
@@ -136,8 +150,17 @@ def remove_kb_member(kb_id: int, member_user_id: int, user=Depends(deps.get_curr
 
 
 @app.get("/chat/sessions", response_model=list)
-def list_chat_sessions(kb_id: Optional[int] = Query(None), user=Depends(deps.get_current_user)):
-    return routes.list_chat_sessions(user=user, kb_id=kb_id)
+def list_chat_sessions(
+    response: Response,
+    kb_id: Optional[int] = Query(None),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
+    user=Depends(deps.get_current_user),
+):
+    sessions, next_cursor = routes.list_chat_sessions(user=user, kb_id=kb_id, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return sessions
 
 
 @app.get("/chat/sessions/{session_id}", response_model=dict)
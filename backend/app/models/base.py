@@ -1,5 +1,7 @@
-"""SQLAlchemy declarative base and session."""
+"""SQLAlchemy declarative base and sessions (sync for tasks and sync routes, asyncpg for async handlers)."""
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 
 from app.core.config import settings
@@ -11,6 +13,22 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def async_database_url(url: str) -> str:
+    """The same database with the asyncpg driver (``postgresql://`` / ``+psycopg2`` -> ``+asyncpg``)."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+
+async_engine = create_async_engine(
+    settings.async_database_url or async_database_url(settings.database_url),
+    pool_pre_ping=True,
+)
+# Objects stay usable after commit; async sessions cannot lazy-load expired attributes.
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+
+
 class Base(DeclarativeBase):
     """Declarative base for models."""
     pass
@@ -48,6 +48,19 @@ class Document(Base):
     knowledge_base: Mapped["KnowledgeBase"] = relationship("KnowledgeBase", back_populates="documents")
 
 
+class DocumentChunk(Base):
+    """Manifest entry for one indexed chunk; ``point_id`` is derived from the chunk content."""
+
+    __tablename__ = "document_chunks"
+
+    document_id: Mapped[int] = mapped_column(ForeignKey("documents.id"), primary_key=True)
+    point_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    chunk_index: Mapped[int] = mapped_column(Integer, nullable=False)
+    page_start: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    page_end: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+
 class KnowledgeBaseMembership(Base):
     __tablename__ = "knowledge_base_memberships"
     __table_args__ = (UniqueConstraint("knowledge_base_id", "user_id", name="uq_kb_user"),)
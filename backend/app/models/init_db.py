@@ -1,13 +1,24 @@
 """Create tables and default knowledge base."""
 from app.models.base import Base, engine, SessionLocal
 from app.models.chat import ChatMessage, ChatSession
-from app.models.document import Document, KnowledgeBase, KnowledgeBaseMembership
+from app.models.document import Document, DocumentChunk, KnowledgeBase, KnowledgeBaseMembership
+from app.models.embedding_cache import EmbeddingCacheEntry
+from app.models.sparse_index import (
+    SparseIndexDocument,
+    SparseIndexEmptyDocument,
+    SparseIndexPosting,
+    SparseIndexStats,
+    SparseIndexTerm,
+)
 from app.models.user import User  # noqa: F401 - register model for create_all
 
 
 def init_db():
     try:
         Base.metadata.create_all(bind=engine)
+        # create_all skips indexes added to tables that already exist.
+        for index in ChatSession.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
         db = SessionLocal()
         try:
             if db.query(KnowledgeBase).first() is None:
@@ -0,0 +1,61 @@
+"""Per knowledge base inverted index used for BM25 sparse retrieval."""
+from sqlalchemy import BigInteger, Boolean, ForeignKey, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class SparseIndexStats(Base):
+    """Corpus-level statistics (document count and total token length) per KB.
+
+    ``complete`` is set once every indexed document of the KB is known to be in
+    the index; until then sparse search falls back to scrolling the collection.
+    """
+
+    __tablename__ = "sparse_index_stats"
+
+    knowledge_base_id: Mapped[int] = mapped_column(ForeignKey("knowledge_bases.id"), primary_key=True)
+    doc_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total_length: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    complete: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+
+
+class SparseIndexTerm(Base):
+    """Document frequency of a term within a KB."""
+
+    __tablename__ = "sparse_index_terms"
+
+    knowledge_base_id: Mapped[int] = mapped_column(ForeignKey("knowledge_bases.id"), primary_key=True)
+    term: Mapped[str] = mapped_column(String(64), primary_key=True)
+    doc_freq: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class SparseIndexDocument(Base):
+    """Indexed chunk (one Qdrant point) and its token length."""
+
+    __tablename__ = "sparse_index_documents"
+
+    knowledge_base_id: Mapped[int] = mapped_column(ForeignKey("knowledge_bases.id"), primary_key=True)
+    point_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    document_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    length: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class SparseIndexEmptyDocument(Base):
+    """Indexed document that produced no chunks; it counts as covered by the index."""
+
+    __tablename__ = "sparse_index_empty_documents"
+
+    knowledge_base_id: Mapped[int] = mapped_column(ForeignKey("knowledge_bases.id"), primary_key=True)
+    document_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+class SparseIndexPosting(Base):
+    """Term frequency of a term inside one indexed chunk."""
+
+    __tablename__ = "sparse_index_postings"
+
+    knowledge_base_id: Mapped[int] = mapped_column(ForeignKey("knowledge_bases.id"), primary_key=True)
+    term: Mapped[str] = mapped_column(String(64), primary_key=True)
+    point_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    term_freq: Mapped[int] = mapped_column(Integer, nullable=False)
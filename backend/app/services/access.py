@@ -2,10 +2,13 @@
 from __future__ import annotations
 
 from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.models.document import KnowledgeBase, KnowledgeBaseMembership, KnowledgeBaseRole
 from app.models.user import User
+from app.services.principal_cache import Principal
 
 ROLE_RANK = {
     KnowledgeBaseRole.VIEWER: 1,
@@ -18,6 +21,28 @@ def _role_at_least(role: str, min_role: str) -> bool:
     return ROLE_RANK.get(role, 0) >= ROLE_RANK.get(min_role, 0)
 
 
+def _check_membership(
+    m: KnowledgeBaseMembership | None, kb_id: int, min_role: str
+) -> KnowledgeBaseMembership:
+    if not m or not _role_at_least(m.role, min_role):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Insufficient permissions for knowledge base {kb_id}",
+        )
+    return m
+
+
+def _check_memberships(rows, wanted: list[int], min_role: str) -> list[int]:
+    allowed = {kb_id for kb_id, role in rows if _role_at_least(role, min_role)}
+    denied = [kb_id for kb_id in wanted if kb_id not in allowed]
+    if denied:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Insufficient permissions for knowledge base(s) {', '.join(str(k) for k in denied)}",
+        )
+    return wanted
+
+
 def get_default_accessible_kb_id(db: Session, user_id: int, min_role: str = KnowledgeBaseRole.VIEWER) -> int | None:
     memberships = (
         db.query(KnowledgeBaseMembership)
@@ -40,12 +65,34 @@ def require_kb_access(db: Session, user_id: int, kb_id: int, min_role: str = Kno
         )
         .first()
     )
-    if not m or not _role_at_least(m.role, min_role):
+    return _check_membership(m, kb_id, min_role)
+
+
+def principal_default_kb_id(principal: Principal, min_role: str = KnowledgeBaseRole.VIEWER) -> int | None:
+    """:func:`get_default_accessible_kb_id` over the principal's cached memberships."""
+    for kb_id, role in principal.memberships:
+        if _role_at_least(role, min_role):
+            return kb_id
+    return None
+
+
+def require_principal_access(principal: Principal, kb_id: int, min_role: str = KnowledgeBaseRole.VIEWER) -> str:
+    """:func:`require_kb_access` over the principal's cached memberships; returns the role."""
+    role = principal.role_in(kb_id)
+    if role is None or not _role_at_least(role, min_role):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Insufficient permissions for knowledge base {kb_id}",
         )
-    return m
+    return role
+
+
+def require_principal_access_many(
+    principal: Principal, kb_ids: list[int], min_role: str = KnowledgeBaseRole.VIEWER
+) -> list[int]:
+    """:func:`require_principal_access` for several KBs; returns the de-duplicated IDs in request order."""
+    wanted = list(dict.fromkeys(kb_ids))
+    return _check_memberships(principal.memberships, wanted, min_role)
 
 
 def list_user_knowledge_bases(db: Session, user_id: int) -> list[dict]:
@@ -67,16 +114,21 @@ def list_user_knowledge_bases(db: Session, user_id: int) -> list[dict]:
     ]
 
 
-def bootstrap_user_kb(db: Session, user: User) -> KnowledgeBase:
-    """Create a personal KB and owner membership for a new user."""
-    base_name = user.email.split("@", 1)[0].strip() or "User"
+def _personal_kb_name(email: str, existing_names: set[str]) -> str:
+    base_name = email.split("@", 1)[0].strip() or "User"
     kb_name = f"{base_name.title()} KB"
     suffix = 1
-    existing_names = {name for (name,) in db.query(KnowledgeBase.name).all()}
     final_name = kb_name
     while final_name in existing_names:
         suffix += 1
         final_name = f"{kb_name} {suffix}"
+    return final_name
+
+
+def bootstrap_user_kb(db: Session, user: User) -> KnowledgeBase:
+    """Create a personal KB and owner membership for a new user."""
+    existing_names = {name for (name,) in db.query(KnowledgeBase.name).all()}
+    final_name = _personal_kb_name(user.email, existing_names)
 
     kb = KnowledgeBase(name=final_name, description=f"Personal knowledge base for {user.email}")
     db.add(kb)
@@ -90,3 +142,21 @@ def bootstrap_user_kb(db: Session, user: User) -> KnowledgeBase:
     )
     return kb
 
+
+async def async_bootstrap_user_kb(db: AsyncSession, user: User) -> KnowledgeBase:
+    """Async :func:`bootstrap_user_kb`. Caller commits, then invalidates the user's cached principal."""
+    existing_names = set((await db.execute(select(KnowledgeBase.name))).scalars())
+    kb = KnowledgeBase(
+        name=_personal_kb_name(user.email, existing_names),
+        description=f"Personal knowledge base for {user.email}",
+    )
+    db.add(kb)
+    await db.flush()
+    db.add(
+        KnowledgeBaseMembership(
+            knowledge_base_id=kb.id,
+            user_id=user.id,
+            role=KnowledgeBaseRole.OWNER,
+        )
+    )
+    return kb
@@ -0,0 +1,111 @@
+"""Shared BM25 tokenization, term weighting and a vectorized scoring engine."""
+from __future__ import annotations
+
+from collections import Counter
+import math
+import re
+from typing import Iterable
+import zlib
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[A-Za-z0-9_]+")
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    return [t.lower() for t in TOKEN_RE.findall(text)]
+
+
+def idf(n_docs: int, doc_freq: int) -> float:
+    # BM25 idf variant with +1 for numerical stability.
+    return math.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+def term_score(term_idf: float, freq: int, doc_len: int, avg_len: float) -> float:
+    """Saturated BM25 contribution of one query term to one document."""
+    denom = freq + K1 * (1 - B + B * (doc_len / max(1e-9, avg_len)))
+    return term_idf * ((freq * (K1 + 1)) / max(1e-9, denom))
+
+
+def term_scores(term_idf: np.ndarray, freq: np.ndarray, doc_len: np.ndarray, avg_len: float) -> np.ndarray:
+    """Vectorized :func:`term_score` over aligned posting arrays (same float ops, same results)."""
+    denom = freq + K1 * (1 - B + B * (doc_len / max(1e-9, avg_len)))
+    return term_idf * ((freq * (K1 + 1)) / np.maximum(1e-9, denom))
+
+
+def term_id(term: str) -> int:
+    """Stable uint32 id of a term for sparse vector indices."""
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def _merge_by_id(weights: dict[str, float]) -> tuple[list[int], list[float]]:
+    merged: dict[int, float] = {}
+    for term, weight in weights.items():
+        tid = term_id(term)
+        merged[tid] = merged.get(tid, 0.0) + weight
+    indices = sorted(merged)
+    return indices, [merged[i] for i in indices]
+
+
+def document_sparse_vector(tokens: list[str], avg_len: float) -> tuple[list[int], list[float]]:
+    """BM25 tf-saturated term weights of a chunk; idf is applied by the vector store."""
+    doc_len = max(1, len(tokens))
+    return _merge_by_id(
+        {term: term_score(1.0, freq, doc_len, avg_len) for term, freq in Counter(tokens).items()}
+    )
+
+
+def query_sparse_vector(q_terms: list[str]) -> tuple[list[int], list[float]]:
+    """Query term weights; repeated terms count once per occurrence, as in :class:`TermMatrix`."""
+    return _merge_by_id({term: float(n) for term, n in Counter(q_terms).items()})
+
+
+class TermMatrix:
+    """Term frequencies of a candidate set, stored column-wise as one posting run per term.
+
+    ``vocabulary`` restricts the stored columns (e.g. to the query terms) while
+    document lengths and frequencies still reflect the full token streams.
+    """
+
+    def __init__(self, tokenized_docs: list[list[str]], vocabulary: Iterable[str] | None = None):
+        keep = set(vocabulary) if vocabulary is not None else None
+        self.n_docs = len(tokenized_docs)
+        raw_lengths = [len(tokens) for tokens in tokenized_docs]
+        self.avg_len = sum(raw_lengths) / max(1, self.n_docs)
+        self.doc_len = np.maximum(1, np.asarray(raw_lengths, dtype=np.float64))
+
+        self.vocab: dict[str, int] = {}
+        cols: list[int] = []
+        rows: list[int] = []
+        freqs: list[int] = []
+        for doc_idx, tokens in enumerate(tokenized_docs):
+            counts = Counter(tokens if keep is None else (t for t in tokens if t in keep))
+            for term, freq in counts.items():
+                cols.append(self.vocab.setdefault(term, len(self.vocab)))
+                rows.append(doc_idx)
+                freqs.append(freq)
+
+        col_arr = np.asarray(cols, dtype=np.int64)
+        order = np.argsort(col_arr, kind="stable")
+        self.doc_idx = np.asarray(rows, dtype=np.int64)[order]
+        self.freq = np.asarray(freqs, dtype=np.float64)[order]
+        self.doc_freq = np.bincount(col_arr, minlength=len(self.vocab))
+        self.term_ptr = np.concatenate(([0], np.cumsum(self.doc_freq)))
+        self.idf = np.asarray([idf(self.n_docs, int(df)) for df in self.doc_freq], dtype=np.float64)
+
+    def score(self, q_terms: list[str]) -> np.ndarray:
+        """BM25 score of every document for the query, in one batched pass.
+
+        Postings are concatenated in query-term order so each document accumulates
+        its contributions in the same order as the scalar loop.
+        """
+        cols = [self.vocab[t] for t in q_terms if t in self.vocab]
+        if not cols:
+            return np.zeros(self.n_docs, dtype=np.float64)
+        idx = np.concatenate([self.doc_idx[self.term_ptr[c] : self.term_ptr[c + 1]] for c in cols])
+        freq = np.concatenate([self.freq[self.term_ptr[c] : self.term_ptr[c + 1]] for c in cols])
+        weights = np.repeat(self.idf[cols], self.doc_freq[cols])
+        contrib = term_scores(weights, freq, self.doc_len[idx], self.avg_len)
+        return np.bincount(idx, weights=contrib, minlength=self.n_docs)
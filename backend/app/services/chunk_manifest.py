@@ -0,0 +1,100 @@
+"""Deterministic chunk point IDs and the per-document chunk manifest.
+
+A chunk's Qdrant point ID is derived from (KB, document, content hash,
+occurrence), so re-ingesting a document maps unchanged chunks onto the same
+points and only new or edited chunks need to be embedded.
+"""
+from __future__ import annotations
+
+from collections import Counter
+import hashlib
+from typing import Iterable, Iterator, Optional
+import uuid
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.ingestion.chunking import Chunk
+from app.models.document import DocumentChunk
+
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1d3c2e-8a4b-5e7f-9c0d-1a2b3c4d5e6f")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_point_id(kb_id: int, document_id: int, digest: str, occurrence: int = 0) -> str:
+    """Stable point ID; ``occurrence`` separates identical chunks repeated within a document."""
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{kb_id}:{document_id}:{digest}:{occurrence}"))
+
+
+def assign_ids(kb_id: int, document_id: int, chunks: Iterable[Chunk]) -> Iterator[tuple[str, str, Chunk]]:
+    """Yield (point_id, content_hash, chunk) in chunk order."""
+    seen: Counter = Counter()
+    for chunk in chunks:
+        digest = content_hash(chunk.text)
+        yield chunk_point_id(kb_id, document_id, digest, seen[digest]), digest, chunk
+        seen[digest] += 1
+
+
+Position = tuple[int, Optional[int], Optional[int]]
+
+
+def position(chunk: Chunk) -> Position:
+    """(chunk_index, page_start, page_end) of a chunk; pages are None outside paged documents."""
+    return chunk.metadata["chunk_index"], chunk.metadata.get("page_start"), chunk.metadata.get("page_end")
+
+
+def load(db: Session, document_id: int) -> dict[str, tuple[str, Position]]:
+    """point_id -> (content_hash, position) of the chunks currently indexed for a document."""
+    rows = db.execute(
+        select(
+            DocumentChunk.point_id,
+            DocumentChunk.content_hash,
+            DocumentChunk.chunk_index,
+            DocumentChunk.page_start,
+            DocumentChunk.page_end,
+        ).where(DocumentChunk.document_id == document_id)
+    ).all()
+    return {point_id: (digest, (index, start, end)) for point_id, digest, index, start, end in rows}
+
+
+def record(db: Session, document_id: int, entries: Iterable[tuple[str, str, Position]]) -> None:
+    """Upsert (point_id, content_hash, position) manifest rows. Caller commits."""
+    rows = [
+        {
+            "document_id": document_id,
+            "point_id": point_id,
+            "content_hash": digest,
+            "chunk_index": index,
+            "page_start": page_start,
+            "page_end": page_end,
+        }
+        for point_id, digest, (index, page_start, page_end) in entries
+    ]
+    if not rows:
+        return
+    stmt = pg_insert(DocumentChunk)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[DocumentChunk.document_id, DocumentChunk.point_id],
+            set_={
+                "content_hash": stmt.excluded.content_hash,
+                "chunk_index": stmt.excluded.chunk_index,
+                "page_start": stmt.excluded.page_start,
+                "page_end": stmt.excluded.page_end,
+            },
+        ),
+        rows,
+    )
+
+
+def remove(db: Session, document_id: int, point_ids: Iterable[str]) -> None:
+    """Drop manifest rows. Caller commits."""
+    ids = list(point_ids)
+    if ids:
+        db.execute(
+            delete(DocumentChunk).where(DocumentChunk.document_id == document_id, DocumentChunk.point_id.in_(ids))
+        )
@@ -0,0 +1,169 @@
+"""Persistent content-addressed cache for chunk embeddings.
+
+Entries are keyed by (model id, embedding version, sha256 of the chunk text),
+so boilerplate repeated across uploads is embedded once. Vectors are stored
+as little-endian float32 blobs; the least recently used rows are evicted once
+the table grows past ``EMBEDDING_CACHE_MAX_ENTRIES``.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+import logging
+from typing import Sequence
+
+import numpy as np
+from sqlalchemy import delete, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.ingestion.embedding import embed_texts, embedding_model_id
+from app.models.base import SessionLocal
+from app.models.embedding_cache import EmbeddingCacheEntry
+from app.services.chunk_manifest import content_hash
+from app.services.qdrant_client import DEFAULT_EMBEDDING_VERSION
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EmbeddingCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hit_rate, 4)}
+
+
+def _key_filter(model_id: str, version: str):
+    return (EmbeddingCacheEntry.model_id == model_id) & (EmbeddingCacheEntry.embedding_version == version)
+
+
+def get_many(db: Session, model_id: str, version: str, hashes: Sequence[str]) -> dict[str, list[float]]:
+    """Cached vectors for the given text hashes; touches their last-used time. Caller commits."""
+    wanted = sorted(set(hashes))
+    if not wanted:
+        return {}
+    rows = db.execute(
+        select(EmbeddingCacheEntry.text_hash, EmbeddingCacheEntry.vector).where(
+            _key_filter(model_id, version), EmbeddingCacheEntry.text_hash.in_(wanted)
+        )
+    ).all()
+    if rows:
+        db.execute(
+            update(EmbeddingCacheEntry)
+            .where(_key_filter(model_id, version), EmbeddingCacheEntry.text_hash.in_([h for h, _ in rows]))
+            .values(last_used_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+    return {h: np.frombuffer(blob, dtype="<f4").tolist() for h, blob in rows}
+
+
+def put_many(db: Session, model_id: str, version: str, vectors: dict[str, Sequence[float]]) -> None:
+    """Store vectors by text hash; existing entries are kept. Caller commits."""
+    if not vectors:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {
+            "model_id": model_id,
+            "embedding_version": version,
+            "text_hash": h,
+            "vector": np.asarray(vec, dtype="<f4").tobytes(),
+            "last_used_at": now,
+        }
+        for h, vec in sorted(vectors.items())
+    ]
+    db.execute(pg_insert(EmbeddingCacheEntry).on_conflict_do_nothing(), rows)
+
+
+def evict(db: Session, max_entries: int) -> int:
+    """Delete least recently used entries beyond ``max_entries``. Caller commits."""
+    total = db.execute(select(func.count()).select_from(EmbeddingCacheEntry)).scalar_one()
+    excess = total - max_entries
+    if max_entries <= 0 or excess <= 0:
+        return 0
+    pk = (EmbeddingCacheEntry.model_id, EmbeddingCacheEntry.embedding_version, EmbeddingCacheEntry.text_hash)
+    oldest = select(*pk).order_by(EmbeddingCacheEntry.last_used_at.asc()).limit(excess)
+    db.execute(delete(EmbeddingCacheEntry).where(tuple_(*pk).in_(oldest)))
+    return excess
+
+
+def embed_cached(
+    texts: list[str],
+    hashes: Sequence[str] | None = None,
+    stats: EmbeddingCacheStats | None = None,
+) -> list[list[float]]:
+    """``embed_texts`` that only runs the model for texts not in the cache.
+
+    The cache is best effort: if the database is unavailable every text is embedded.
+    Hits are looked up under the model expected to answer; fresh vectors are stored
+    under the model that actually produced them.
+    """
+    if not settings.embedding_cache_enabled or not texts:
+        return embed_texts(texts)[0]
+    hashes = list(hashes) if hashes is not None else [content_hash(t) for t in texts]
+    model_id = embedding_model_id()
+    try:
+        db = SessionLocal()
+    except Exception:
+        logger.debug("Embedding cache unavailable", exc_info=True)
+        return embed_texts(texts)[0]
+    try:
+        try:
+            cached = get_many(db, model_id, DEFAULT_EMBEDDING_VERSION, hashes)
+            db.commit()
+        except Exception:
+            logger.debug("Embedding cache read failed", exc_info=True)
+            db.rollback()
+            cached = {}
+
+        missing: dict[str, str] = {}
+        for h, text in zip(hashes, texts):
+            if h not in cached:
+                missing.setdefault(h, text)
+        if stats is not None:
+            stats.misses += sum(1 for h in hashes if h not in cached)
+            stats.hits += sum(1 for h in hashes if h in cached)
+
+        if missing:
+            vectors, produced_by = embed_texts(list(missing.values()))
+            if produced_by != model_id and cached:
+                # The hits belong to another model than the one that answered: re-embed them all with one call.
+                missing = dict(zip(hashes, texts))
+                vectors, produced_by = embed_texts(list(missing.values()))
+                cached = {}
+            fresh = dict(zip(missing, vectors))
+            try:
+                put_many(db, produced_by, DEFAULT_EMBEDDING_VERSION, fresh)
+                db.commit()
+            except Exception:
+                logger.debug("Embedding cache write failed", exc_info=True)
+                db.rollback()
+            cached.update(fresh)
+        return [list(cached[h]) for h in hashes]
+    finally:
+        db.close()
+
+
+def enforce_limit() -> int:
+    """Apply the configured size bound; returns the number of evicted entries."""
+    if not settings.embedding_cache_enabled or settings.embedding_cache_max_entries <= 0:
+        return 0
+    db = SessionLocal()
+    try:
+        evicted = evict(db, settings.embedding_cache_max_entries)
+        db.commit()
+        return evicted
+    except Exception:
+        logger.debug("Embedding cache eviction failed", exc_info=True)
+        db.rollback()
+        return 0
+    finally:
+        db.close()
@@ -0,0 +1,194 @@
+"""Shared embedding service with dynamic cross-request batching.
+
+Clients (ingestion tasks and API query embedding) push requests onto a Redis
+list. A single worker process per host holds the model, drains the list into
+batches of up to ``EMBEDDING_SERVICE_MAX_BATCH`` texts (waiting at most
+``EMBEDDING_SERVICE_MAX_LATENCY_MS`` after the first request) and answers
+each request on its own reply key with its model id, a NUL byte and the
+vectors as a float32 ``<f4`` blob.
+
+The worker refreshes its model info in Redis with a TTL as a heartbeat.
+Clients skip the worker while no heartbeat is visible, and a request that
+fails or times out opens a circuit breaker for
+``EMBEDDING_SERVICE_BREAKER_SECONDS`` so later callers embed locally at once
+instead of each waiting out the timeout.
+
+Run with ``python -m app.services.embedding_worker``.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import time
+from typing import Callable
+import uuid
+
+import numpy as np
+import redis
+
+from app.core.config import settings
+
+REQUEST_KEY = "ragnetic:embed:requests"
+REPLY_PREFIX = "ragnetic:embed:reply"
+INFO_KEY = "ragnetic:embed:info"
+REPLY_TTL_SECONDS = 60
+# The worker re-publishes its info well within the TTL; clients cache the lookup (hit or miss) briefly.
+INFO_TTL_SECONDS = 30
+INFO_REFRESH_SECONDS = 5.0
+
+logger = logging.getLogger(__name__)
+_client: redis.Redis | None = None
+_info: dict | None = None
+_info_checked_at: float | None = None
+# Model of the last worker seen; a local fallback must produce the same vectors.
+_announced_model_id: str | None = None
+_breaker_open_until = 0.0
+
+
+def _get_client() -> redis.Redis:
+    # Dedicated connection: blocking pops outlive the short timeout of the shared cache client.
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.embedding_service_timeout_seconds + 5,
+            socket_connect_timeout=settings.redis_socket_timeout_seconds,
+        )
+    return _client
+
+
+def _reply_key(request_id: str) -> str:
+    return f"{REPLY_PREFIX}:{request_id}"
+
+
+def service_info() -> dict | None:
+    """Model id and dimension announced by a live worker, or None when no heartbeat is visible."""
+    global _info, _info_checked_at, _announced_model_id
+    now = time.monotonic()
+    if _info_checked_at is not None and now - _info_checked_at < INFO_REFRESH_SECONDS:
+        return _info
+    _info_checked_at = now
+    try:
+        raw = _get_client().get(INFO_KEY)
+    except Exception:
+        logger.debug("Embedding service info unavailable", exc_info=True)
+        raw = None
+    _info = json.loads(raw) if raw else None
+    if _info is not None:
+        _announced_model_id = _info["model_id"]
+    return _info
+
+
+def announced_model_id() -> str | None:
+    """Model id of the last worker whose heartbeat this process saw, if any."""
+    return _announced_model_id
+
+
+def _open_breaker(reason: str, *args) -> None:
+    global _breaker_open_until
+    _breaker_open_until = time.monotonic() + settings.embedding_service_breaker_seconds
+    logger.warning(reason + "; embedding locally for %.0fs", *args, settings.embedding_service_breaker_seconds)
+
+
+def remote_embed(texts: list[str], timeout: float | None = None) -> tuple[list[list[float]], str] | None:
+    """Vectors and the id of the model that produced them, via the worker; None tells the caller to embed locally."""
+    if not texts:
+        return None
+    if time.monotonic() < _breaker_open_until or service_info() is None:
+        return None
+    timeout = timeout if timeout is not None else settings.embedding_service_timeout_seconds
+    request_id = uuid.uuid4().hex
+    message = {"id": request_id, "texts": texts, "deadline": time.time() + timeout}
+    try:
+        client = _get_client()
+        client.rpush(REQUEST_KEY, json.dumps(message))
+        reply = client.blpop([_reply_key(request_id)], timeout=timeout)
+    except Exception:
+        logger.debug("Embedding request %s failed", request_id, exc_info=True)
+        _open_breaker("Embedding service unavailable")
+        return None
+    if reply is None or not reply[1]:
+        _open_breaker("Embedding service did not answer request %s within %.2fs", request_id, timeout)
+        return None
+    model_id, _, blob = reply[1].partition(b"\0")
+    return np.frombuffer(blob, dtype="<f4").reshape(len(texts), -1).tolist(), model_id.decode()
+
+
+def collect_batch(client, max_texts: int, max_latency: float, idle_timeout: float = 1.0) -> list[dict]:
+    """Block for the first request, then keep draining until the batch is full or the deadline passes."""
+    first = client.blpop([REQUEST_KEY], timeout=idle_timeout)
+    if first is None:
+        return []
+    batch = [json.loads(first[1])]
+    size = len(batch[0]["texts"])
+    deadline = time.monotonic() + max_latency
+    while size < max_texts:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        item = client.blpop([REQUEST_KEY], timeout=remaining)
+        if item is None:
+            break
+        request = json.loads(item[1])
+        batch.append(request)
+        size += len(request["texts"])
+    return batch
+
+
+def process_batch(
+    requests: list[dict], embed: Callable[[list[str]], list[list[float]]], model_id: str
+) -> list[tuple[str, bytes]]:
+    """Embed every live request in one model call; returns (reply_key, payload) pairs."""
+    now = time.time()
+    live = [r for r in requests if r.get("deadline", now) >= now]
+    if not live:
+        return []
+    texts = [t for r in live for t in r["texts"]]
+    try:
+        vectors = np.asarray(embed(texts), dtype="<f4")
+    except Exception:
+        logger.exception("Embedding batch of %d texts failed", len(texts))
+        # An empty reply makes each client fall back to local embedding immediately.
+        return [(_reply_key(r["id"]), b"") for r in live]
+    header = model_id.encode() + b"\0"
+    replies = []
+    offset = 0
+    for r in live:
+        n = len(r["texts"])
+        replies.append((_reply_key(r["id"]), header + vectors[offset : offset + n].tobytes()))
+        offset += n
+    return replies
+
+
+def run_worker() -> None:
+    from app.ingestion.embedding import embed_texts_local, embedding_model_id, get_embedding_dim
+
+    client = _get_client()
+    model_id = embedding_model_id(local=True)
+    info = json.dumps({"model_id": model_id, "dim": get_embedding_dim(local=True)})
+    max_texts = max(1, settings.embedding_service_max_batch)
+    max_latency = max(0.0, settings.embedding_service_max_latency_ms / 1000)
+    logger.info("Embedding worker ready (max_batch=%d, max_latency=%.3fs)", max_texts, max_latency)
+    published_at = None
+    while True:
+        try:
+            if published_at is None or time.monotonic() - published_at >= INFO_TTL_SECONDS / 3:
+                client.set(INFO_KEY, info, ex=INFO_TTL_SECONDS)
+                published_at = time.monotonic()
+            requests = collect_batch(client, max_texts, max_latency)
+            if not requests:
+                continue
+            replies = process_batch(requests, embed_texts_local, model_id)
+            pipe = client.pipeline(transaction=False)
+            for key, payload in replies:
+                pipe.rpush(key, payload)
+                pipe.expire(key, REPLY_TTL_SECONDS)
+            pipe.execute()
+        except redis.RedisError:
+            logger.exception("Redis error in embedding worker; retrying")
+            time.sleep(1.0)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_worker()
@@ -0,0 +1,97 @@
+"""Bounded executor for password hashing.
+
+bcrypt is deliberately slow and CPU bound. Running it on the shared API
+threadpool lets a burst of logins starve every other endpoint, so hashing
+gets its own small pool (bcrypt releases the GIL, so threads run in
+parallel). Requests beyond the pool plus ``PASSWORD_HASH_MAX_QUEUE`` waiting
+jobs are rejected immediately with :class:`HashingPoolBusy` instead of queueing
+without bound.
+"""
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+import time
+from typing import Any, Callable, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class HashingPoolBusy(RuntimeError):
+    """Raised when the hashing pool and its queue are full."""
+
+
+class HashingPool:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.running = 0
+        self.started = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            return self._executor
+
+    def _timed(self, fn: Callable[..., T], queued_at: float, args: tuple) -> T:
+        wait = time.monotonic() - queued_at
+        with self._lock:
+            self.running += 1
+            self.started += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run ``fn(*args)`` on the pool, or raise :class:`HashingPoolBusy` when it is saturated."""
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HashingPoolBusy("Password hashing pool is saturated")
+            self.in_flight += 1
+        try:
+            future = self._get_executor().submit(self._timed, fn, time.monotonic(), args)
+        except BaseException:
+            with self._lock:
+                self.in_flight -= 1
+            raise
+        # Release the slot when the job finishes, not when the caller stops
+        # waiting: a cancelled request leaves its hash queued or running.
+        future.add_done_callback(self._finished)
+        return await asyncio.wrap_future(future)
+
+    def _finished(self, future: Future) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "queued": max(0, self.in_flight - self.running),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": (self.total_wait / self.started * 1000) if self.started else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+hashing_pool = HashingPool(workers=settings.password_hash_workers, max_queue=settings.password_hash_max_queue)
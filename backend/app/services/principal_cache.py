@@ -0,0 +1,176 @@
+"""Short-TTL in-process cache of authenticated principals and their KB memberships.
+
+Entries are keyed on the token subject (the user's email) and remember the
+user's invalidation version, a Redis counter that membership changes bump
+after they commit. Every cache hit re-reads that counter (one GET instead of
+two queries), so a role revoked in one API process stops working in all of
+them on the next request. While Redis is unreachable entries are served
+unchecked and the TTL bounds how long a revoked role can still be used.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading
+import time
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.document import KnowledgeBaseMembership
+from app.models.user import User
+from app.services.redis_client import RedisBreaker, get_async_redis, get_redis
+
+VERSION_KEY = "ragnetic:principal:{user_id}:version"
+_breaker = RedisBreaker("principal invalidation")
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Authenticated user with (kb_id, role) memberships, oldest first."""
+
+    id: int
+    email: str
+    memberships: tuple[tuple[int, str], ...] = ()
+
+    def role_in(self, kb_id: int) -> str | None:
+        for member_kb, role in self.memberships:
+            if member_kb == kb_id:
+                return role
+        return None
+
+
+class PrincipalCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, Principal, int | None]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so a load that raced one is not cached.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, subject: str) -> tuple[Principal, int | None] | None:
+        """Cached ``(principal, version)`` for ``subject``, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[subject]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, subject: str, principal: Principal, generation: int, version: int | None = None) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[subject] = (time.monotonic() + self.ttl_seconds, principal, version)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            for subject in [s for s, (_, p, _) in self._entries.items() if p.id == user_id]:
+                del self._entries[subject]
+
+    def discard(self, subject: str) -> None:
+        with self._lock:
+            self._entries.pop(subject, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+principal_cache = PrincipalCache(
+    max_entries=settings.principal_cache_max_entries,
+    ttl_seconds=settings.principal_cache_ttl_seconds,
+)
+
+
+async def _async_version(user_id: int) -> int | None:
+    """Current invalidation version of ``user_id``, or None when Redis is unavailable."""
+    if _breaker.open:
+        return None
+    try:
+        return int(await get_async_redis().get(VERSION_KEY.format(user_id=user_id)) or 0)
+    except Exception:
+        _breaker.trip()
+        return None
+
+
+def invalidate_user(user_id: int) -> None:
+    """Drop ``user_id``'s principal here and in every other API process. Call after committing."""
+    principal_cache.invalidate_user(user_id)
+    if _breaker.open:
+        return
+    try:
+        get_redis().incr(VERSION_KEY.format(user_id=user_id))
+    except Exception:
+        _breaker.trip()
+
+
+async def async_invalidate_user(user_id: int) -> None:
+    """:func:`invalidate_user` without blocking the event loop on Redis."""
+    principal_cache.invalidate_user(user_id)
+    if _breaker.open:
+        return
+    try:
+        await get_async_redis().incr(VERSION_KEY.format(user_id=user_id))
+    except Exception:
+        _breaker.trip()
+
+
+async def async_load_principal(db: AsyncSession, subject: str) -> Principal | None:
+    """Principal for a token subject, from the cache or loaded with its memberships (two queries)."""
+    cached = principal_cache.get(subject)
+    if cached is not None:
+        principal, version = cached
+        current = await _async_version(principal.id)
+        if current is None or current == version:
+            return principal
+        principal_cache.discard(subject)
+    generation = principal_cache.generation
+    user = (await db.execute(select(User.id, User.email).where(User.email == subject))).first()
+    if user is None:
+        return None
+    # Read before the memberships so a change committed in between bumps past it.
+    version = await _async_version(user.id)
+    rows = await db.execute(
+        select(KnowledgeBaseMembership.knowledge_base_id, KnowledgeBaseMembership.role)
+        .where(KnowledgeBaseMembership.user_id == user.id)
+        .order_by(KnowledgeBaseMembership.created_at.asc())
+    )
+    principal = Principal(id=user.id, email=user.email, memberships=tuple((kb_id, role) for kb_id, role in rows))
+    principal_cache.put(subject, principal, generation, version)
+    return principal
@@ -1,13 +1,48 @@
 """Qdrant client and collection helpers."""
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, PointStruct, VectorParams
+import time
+
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    Fusion,
+    FusionQuery,
+    MatchValue,
+    Modifier,
+    PointIdsList,
+    PointStruct,
+    Prefetch,
+    QuantizationSearchParams,
+    QueryRequest,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    SetPayload,
+    SetPayloadOperation,
+    SparseVector,
+    SparseVectorParams,
+    VectorParams,
+)
 
 from app.core.config import settings
 from app.ingestion.embedding import get_embedding_dim
 
 _client: QdrantClient | None = None
+_async_client: AsyncQdrantClient | None = None
+# Collections are never dropped by the app, so a positive lookup can be remembered per process.
+_known_collections: set[str] = set()
+# Sparse support is re-checked now and then: a collection may be recreated with or without it.
+_sparse_support: dict[str, tuple[float, bool]] = {}
+SPARSE_SUPPORT_TTL_SECONDS = 60.0
 COLLECTION_PREFIX = "ragnetic"
 DEFAULT_EMBEDDING_VERSION = "v1"
+SPARSE_VECTOR_NAME = "bm25"
+QUANTIZATION_MODES = ("none", "scalar", "binary")
 
 
 def get_qdrant() -> QdrantClient:
@@ -17,38 +52,328 @@ def get_qdrant() -> QdrantClient:
     return _client
 
 
+def get_async_qdrant() -> AsyncQdrantClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncQdrantClient(url=settings.qdrant_url)
+    return _async_client
+
+
 def collection_name(kb_id: int, embedding_version: str = DEFAULT_EMBEDDING_VERSION) -> str:
     return f"{COLLECTION_PREFIX}_kb{kb_id}_{embedding_version}"
 
 
+def quantization_mode(kb_id: int) -> str:
+    """Quantization used when creating the KB collection; existing collections keep theirs."""
+    mode = settings.qdrant_quantization_kb_overrides.get(kb_id, settings.qdrant_quantization)
+    mode = (mode or "none").strip().lower()
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown Qdrant quantization mode: {mode!r}")
+    return mode
+
+
+def _quantization_config(mode: str):
+    # Quantized vectors stay in RAM; full-precision originals go to disk and are only read to rescore.
+    if mode == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if mode == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def _vectors_config(mode: str = "none") -> VectorParams:
+    return VectorParams(size=get_embedding_dim(), distance=Distance.COSINE, on_disk=mode != "none")
+
+
+def _quantization_enabled() -> bool:
+    modes = [settings.qdrant_quantization, *settings.qdrant_quantization_kb_overrides.values()]
+    return any((m or "none").strip().lower() != "none" for m in modes)
+
+
+def _search_params() -> SearchParams | None:
+    """Oversample on the quantized index and rescore with the originals (ignored by unquantized collections)."""
+    if not _quantization_enabled():
+        return None
+    return SearchParams(
+        quantization=QuantizationSearchParams(
+            rescore=settings.qdrant_quantization_rescore,
+            oversampling=settings.qdrant_quantization_oversampling,
+        )
+    )
+
+
+def _sparse_vectors_config() -> dict[str, SparseVectorParams] | None:
+    if not settings.retrieval_server_side_hybrid:
+        return None
+    # IDF is computed by Qdrant over the collection; chunks only carry saturated tf weights.
+    return {SPARSE_VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)}
+
+
 def ensure_collection(kb_id: int, embedding_version: str = DEFAULT_EMBEDDING_VERSION) -> str:
     name = collection_name(kb_id, embedding_version)
-    dim = get_embedding_dim()
+    if name in _known_collections:
+        return name
     client = get_qdrant()
     collections = client.get_collections().collections
     if not any(c.name == name for c in collections):
+        mode = quantization_mode(kb_id)
         client.create_collection(
             collection_name=name,
-            vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+            vectors_config=_vectors_config(mode),
+            sparse_vectors_config=_sparse_vectors_config(),
+            quantization_config=_quantization_config(mode),
+        )
+        _sparse_support.pop(name, None)
+    _known_collections.add(name)
+    return name
+
+
+async def async_ensure_collection(kb_id: int, embedding_version: str = DEFAULT_EMBEDDING_VERSION) -> str:
+    name = collection_name(kb_id, embedding_version)
+    if name in _known_collections:
+        return name
+    client = get_async_qdrant()
+    collections = (await client.get_collections()).collections
+    if not any(c.name == name for c in collections):
+        mode = quantization_mode(kb_id)
+        await client.create_collection(
+            collection_name=name,
+            vectors_config=_vectors_config(mode),
+            sparse_vectors_config=_sparse_vectors_config(),
+            quantization_config=_quantization_config(mode),
         )
+        _sparse_support.pop(name, None)
+    _known_collections.add(name)
     return name
 
 
+def _has_sparse(info) -> bool:
+    return SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+
+
+def _cached_sparse_support(collection: str) -> bool | None:
+    entry = _sparse_support.get(collection)
+    if entry is None or time.monotonic() - entry[0] >= SPARSE_SUPPORT_TTL_SECONDS:
+        return None
+    return entry[1]
+
+
+def _remember_sparse_support(collection: str, info) -> bool:
+    supported = _has_sparse(info)
+    _sparse_support[collection] = (time.monotonic(), supported)
+    return supported
+
+
+def has_sparse_vectors(collection: str) -> bool:
+    """Whether the collection has the BM25 sparse vector (cached per process for ``SPARSE_SUPPORT_TTL_SECONDS``)."""
+    cached = _cached_sparse_support(collection)
+    if cached is not None:
+        return cached
+    return _remember_sparse_support(collection, get_qdrant().get_collection(collection))
+
+
+async def async_has_sparse_vectors(collection: str) -> bool:
+    cached = _cached_sparse_support(collection)
+    if cached is not None:
+        return cached
+    return _remember_sparse_support(collection, await get_async_qdrant().get_collection(collection))
+
+
+def point_vector(dense: list[float], sparse: tuple[list[int], list[float]] | None):
+    """Dense-only vector, or the default dense vector plus the named BM25 sparse vector."""
+    if sparse is None:
+        return dense
+    indices, values = sparse
+    return {"": dense, SPARSE_VECTOR_NAME: SparseVector(indices=indices, values=values)}
+
+
 def upsert_chunks(collection: str, points: list[PointStruct]):
     get_qdrant().upsert(collection_name=collection, points=points)
 
 
-def search_collection(collection: str, vector: list[float], limit: int = 5):
+def delete_points(collection: str, point_ids: list[str]):
+    if point_ids:
+        get_qdrant().delete(collection_name=collection, points_selector=PointIdsList(points=point_ids))
+
+
+def delete_document_points(collection: str, doc_id: int):
+    """Delete every point whose payload ``doc_id`` matches, whatever its ID."""
+    get_qdrant().delete(
+        collection_name=collection,
+        points_selector=FilterSelector(filter=Filter(must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))])),
+    )
+
+
+def set_points_payload(collection: str, updates: list[tuple[str, dict]], key: str | None = None):
+    """Apply per-point payload patches in a single batched request."""
+    if not updates:
+        return
+    get_qdrant().batch_update_points(
+        collection_name=collection,
+        update_operations=[
+            SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[point_id], key=key))
+            for point_id, payload in updates
+        ],
+    )
+
+
+def set_document_payload(collection: str, doc_id: int, payload: dict, key: str | None = None):
+    """Merge ``payload`` into every point of a document (into the nested ``key`` object when given)."""
+    get_qdrant().set_payload(
+        collection_name=collection,
+        payload=payload,
+        points=Filter(must=[FieldCondition(key="doc_id", match=MatchValue(value=doc_id))]),
+        key=key,
+    )
+
+
+def search_collection(
+    collection: str, vector: list[float], limit: int = 5, with_payload=True, search_params: SearchParams | None = None
+):
     client = get_qdrant()
+    params = search_params if search_params is not None else _search_params()
     # qdrant-client compatibility across versions:
     # - older: client.search(...)
     # - newer: client.query_points(...)
     if hasattr(client, "search"):
-        return client.search(collection_name=collection, query_vector=vector, limit=limit)
+        return client.search(
+            collection_name=collection,
+            query_vector=vector,
+            limit=limit,
+            with_payload=with_payload,
+            search_params=params,
+        )
     response = client.query_points(
         collection_name=collection,
         query=vector,
         limit=limit,
-        with_payload=True,
+        with_payload=with_payload,
+        search_params=params,
+    )
+    return getattr(response, "points", response)
+
+
+async def async_search_collection(
+    collection: str, vector: list[float], limit: int = 5, with_payload=True, search_params: SearchParams | None = None
+):
+    client = get_async_qdrant()
+    params = search_params if search_params is not None else _search_params()
+    if hasattr(client, "search"):
+        return await client.search(
+            collection_name=collection,
+            query_vector=vector,
+            limit=limit,
+            with_payload=with_payload,
+            search_params=params,
+        )
+    response = await client.query_points(
+        collection_name=collection,
+        query=vector,
+        limit=limit,
+        with_payload=with_payload,
+        search_params=params,
     )
     return getattr(response, "points", response)
+
+
+def _top_ids(hits, exclude: str | None, limit: int) -> set[str]:
+    return set([str(p.id) for p in hits if str(p.id) != exclude][:limit])
+
+
+def compare_quantized_search(
+    collection: str,
+    queries: list[list[float]],
+    limit: int = 10,
+    exclude_ids: list[str | None] | None = None,
+) -> dict:
+    """Recall@limit and mean latency of the quantized search against the float baseline.
+
+    ``exclude_ids`` names the point each query vector was taken from; it is
+    dropped from both result lists so a stored vector does not count finding itself.
+    """
+    baseline_params = SearchParams(quantization=QuantizationSearchParams(ignore=True))
+    quantized_params = _search_params() or SearchParams(
+        quantization=QuantizationSearchParams(
+            rescore=settings.qdrant_quantization_rescore,
+            oversampling=settings.qdrant_quantization_oversampling,
+        )
+    )
+    exclude_ids = exclude_ids or [None] * len(queries)
+    recalls: list[float] = []
+    baseline_ms = 0.0
+    quantized_ms = 0.0
+    for vector, own_id in zip(queries, exclude_ids):
+        width = limit + (own_id is not None)
+        t0 = time.perf_counter()
+        expected = search_collection(collection, vector, width, with_payload=False, search_params=baseline_params)
+        t1 = time.perf_counter()
+        got = search_collection(collection, vector, width, with_payload=False, search_params=quantized_params)
+        t2 = time.perf_counter()
+        baseline_ms += (t1 - t0) * 1000
+        quantized_ms += (t2 - t1) * 1000
+        expected_ids = _top_ids(expected, own_id, limit)
+        got_ids = _top_ids(got, own_id, limit)
+        if expected_ids:
+            recalls.append(len(expected_ids & got_ids) / len(expected_ids))
+    n = max(1, len(queries))
+    return {
+        "queries": len(queries),
+        "limit": limit,
+        "recall": sum(recalls) / max(1, len(recalls)),
+        "baseline_ms": baseline_ms / n,
+        "quantized_ms": quantized_ms / n,
+    }
+
+
+def _hybrid_query_requests(
+    dense: list[float],
+    sparse: tuple[list[int], list[float]],
+    dense_limit: int,
+    sparse_limit: int,
+    limit: int,
+    with_payload=True,
+) -> list[QueryRequest]:
+    """The RRF-fused query followed by each of its prefetches on its own, for per-leg scores."""
+    prefetch = [Prefetch(query=dense, limit=dense_limit, params=_search_params())]
+    if sparse[0] and sparse_limit > 0:
+        prefetch.append(
+            Prefetch(
+                query=SparseVector(indices=sparse[0], values=sparse[1]),
+                using=SPARSE_VECTOR_NAME,
+                limit=sparse_limit,
+            )
+        )
+    fused = QueryRequest(prefetch=prefetch, query=FusionQuery(fusion=Fusion.RRF), limit=limit, with_payload=with_payload)
+    legs = [QueryRequest(query=p.query, using=p.using, limit=p.limit, params=p.params, with_payload=False) for p in prefetch]
+    return [fused, *legs]
+
+
+def _hybrid_results(responses) -> tuple[list, list, list]:
+    fused, dense, *sparse = (r.points for r in responses)
+    return fused, dense, sparse[0] if sparse else []
+
+
+async def async_hybrid_query_collection(
+    collection: str, dense: list[float], sparse, dense_limit: int, sparse_limit: int, limit: int, with_payload=True
+) -> tuple[list, list, list]:
+    """Dense + sparse prefetch fused with RRF inside Qdrant, in one batch request.
+
+    Returns the fused points plus the dense and sparse leg points, whose
+    scores the fused points do not carry.
+    """
+    requests = _hybrid_query_requests(dense, sparse, dense_limit, sparse_limit, limit, with_payload)
+    return _hybrid_results(await get_async_qdrant().query_batch_points(collection_name=collection, requests=requests))
+
+
+async def async_retrieve_points(collection: str, ids: list[str], with_payload=True):
+    """Fetch points by id in a single request."""
+    if not ids:
+        return []
+    return await get_async_qdrant().retrieve(
+        collection_name=collection,
+        ids=ids,
+        with_payload=with_payload,
+        with_vectors=False,
+    )
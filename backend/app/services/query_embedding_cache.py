@@ -0,0 +1,58 @@
+"""Redis-backed second-level cache for query embeddings.
+
+Vectors are stored as compact little-endian float32 blobs keyed by model,
+embedding version and a hash of the normalized query, so every API worker
+shares hits and they survive restarts and deploys. After a failed Redis call
+the cache is skipped for a retry window, so queries do not wait out socket
+timeouts while Redis is down.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+
+import numpy as np
+
+from app.core.config import settings
+from app.ingestion.embedding import embedding_model_id
+from app.services.qdrant_client import DEFAULT_EMBEDDING_VERSION
+from app.services.redis_client import RedisBreaker, get_redis
+
+KEY_PREFIX = "ragnetic:qemb"
+logger = logging.getLogger(__name__)
+_breaker = RedisBreaker("the query embedding cache")
+
+
+def _key(query: str, model_id: str) -> str:
+    digest = hashlib.sha256(query.encode("utf-8")).hexdigest()
+    return f"{KEY_PREFIX}:{model_id}:{DEFAULT_EMBEDDING_VERSION}:{digest}"
+
+
+def get(query: str) -> tuple[float, ...] | None:
+    """Cached vector of the model ``embed_texts`` is expected to use."""
+    if not settings.query_embedding_redis_cache or _breaker.open:
+        return None
+    try:
+        raw = get_redis().get(_key(query, embedding_model_id()))
+    except Exception:
+        logger.debug("Query embedding cache read failed", exc_info=True)
+        _breaker.trip()
+        return None
+    if not raw:
+        return None
+    return tuple(np.frombuffer(raw, dtype="<f4").tolist())
+
+
+def put(query: str, vector: tuple[float, ...] | list[float], model_id: str) -> None:
+    """Store ``vector`` under the id of the model that actually produced it."""
+    if not settings.query_embedding_redis_cache or _breaker.open:
+        return
+    try:
+        get_redis().set(
+            _key(query, model_id),
+            np.asarray(vector, dtype="<f4").tobytes(),
+            ex=settings.query_embedding_cache_ttl_seconds,
+        )
+    except Exception:
+        logger.debug("Query embedding cache write failed", exc_info=True)
+        _breaker.trip()
@@ -1,13 +1,47 @@
-"""In-memory request rate limiting."""
+"""Request rate limiting: a Redis sliding window shared by all API processes, with an in-memory fallback.
+
+``RATE_LIMIT_BACKEND=redis`` (default) counts requests in one sorted set per
+key, updated by a server-side Lua script so each check is a single atomic
+round trip timed by the Redis clock. When Redis is unreachable the process
+falls back to its own in-memory limiter for ``RATE_LIMIT_REDIS_RETRY_SECONDS``
+before trying Redis again. ``RATE_LIMIT_BACKEND=memory`` always uses the
+in-memory limiter (limits are then per process).
+"""
 from __future__ import annotations
 
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+import logging
+import math
 import threading
 import time
-from collections import defaultdict, deque
-from dataclasses import dataclass
+import uuid
 
 from fastapi import HTTPException, status
 
+from app.core.config import settings
+from app.services.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+KEY_PREFIX = "ragnetic:ratelimit:"
+
+# KEYS[1] = window key; ARGV = window ms, limit, unique member.
+# Returns {allowed, retry_after_ms}.
+SLIDING_WINDOW_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+  local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+  return {0, tonumber(oldest[2]) + window - now}
+end
+redis.call('ZADD', KEYS[1], now, ARGV[3])
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, 0}
+"""
+
 
 @dataclass(frozen=True)
 class RateLimitRule:
@@ -16,25 +50,115 @@ class RateLimitRule:
 
 
 class RateLimiter:
-    def __init__(self):
-        self._events: dict[str, deque[float]] = defaultdict(deque)
+    """In-process sliding window log.
+
+    Keys are kept in least-recently-hit order; keys whose window has fully
+    elapsed are evicted from the front on every hit, and at most ``max_keys``
+    are tracked, so memory stays bounded by the active keys.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._events: OrderedDict[str, tuple[int, deque[float]]] = OrderedDict()
         self._lock = threading.Lock()
 
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def _evict_idle(self, now: float) -> None:
+        while self._events:
+            key, (window_seconds, events) = next(iter(self._events.items()))
+            if events and events[-1] > now - window_seconds and len(self._events) <= self.max_keys:
+                break
+            del self._events[key]
+
     def hit(self, key: str, limit: int, window_seconds: int) -> tuple[bool, int]:
         now = time.monotonic()
         cutoff = now - window_seconds
         with self._lock:
-            events = self._events[key]
+            entry = self._events.get(key)
+            if entry is None:
+                entry = self._events[key] = (window_seconds, deque())
+            else:
+                self._events.move_to_end(key)
+            events = entry[1]
             while events and events[0] <= cutoff:
                 events.popleft()
             if len(events) >= limit:
                 retry_after = max(1, int(events[0] + window_seconds - now))
-                return False, retry_after
-            events.append(now)
+                allowed = False
+            else:
+                events.append(now)
+                retry_after = 0
+                allowed = True
+            self._evict_idle(now)
+            return allowed, retry_after
+
+    async def async_hit(self, key: str, limit: int, window_seconds: int) -> tuple[bool, int]:
+        return self.hit(key, limit, window_seconds)
+
+
+class RedisRateLimiter:
+    """Sliding window log in Redis, checked and updated by one Lua script call."""
+
+    def __init__(self, fallback: RateLimiter, retry_seconds: float = 30.0):
+        self.fallback = fallback
+        self.retry_seconds = retry_seconds
+        self._script = None
+        self._async_script = None
+        self._down_until = 0.0
+
+    @staticmethod
+    def _result(raw) -> tuple[bool, int]:
+        allowed, retry_ms = int(raw[0]), int(raw[1])
+        if allowed:
             return True, 0
+        return False, max(1, math.ceil(retry_ms / 1000))
 
+    def _args(self, limit: int, window_seconds: int) -> list:
+        return [int(window_seconds * 1000), limit, uuid.uuid4().hex]
 
-limiter = RateLimiter()
+    def _redis_down(self) -> bool:
+        return time.monotonic() < self._down_until
+
+    def _mark_down(self) -> None:
+        logger.warning("Rate limiting via Redis failed; using in-process limits for %.0fs", self.retry_seconds)
+        self._down_until = time.monotonic() + self.retry_seconds
+
+    def hit(self, key: str, limit: int, window_seconds: int) -> tuple[bool, int]:
+        if not self._redis_down():
+            try:
+                if self._script is None:
+                    self._script = get_redis().register_script(SLIDING_WINDOW_LUA)
+                raw = self._script(keys=[KEY_PREFIX + key], args=self._args(limit, window_seconds))
+                return self._result(raw)
+            except Exception:
+                self._mark_down()
+        return self.fallback.hit(key, limit, window_seconds)
+
+    async def async_hit(self, key: str, limit: int, window_seconds: int) -> tuple[bool, int]:
+        if not self._redis_down():
+            try:
+                if self._async_script is None:
+                    self._async_script = get_async_redis().register_script(SLIDING_WINDOW_LUA)
+                raw = await self._async_script(keys=[KEY_PREFIX + key], args=self._args(limit, window_seconds))
+                return self._result(raw)
+            except Exception:
+                self._mark_down()
+        return self.fallback.hit(key, limit, window_seconds)
+
+
+def create_limiter(backend: str) -> RateLimiter | RedisRateLimiter:
+    memory = RateLimiter(max_keys=settings.rate_limit_max_keys)
+    backend = (backend or "redis").strip().lower()
+    if backend == "memory":
+        return memory
+    if backend == "redis":
+        return RedisRateLimiter(memory, retry_seconds=settings.rate_limit_redis_retry_seconds)
+    raise ValueError(f"Unknown rate limit backend: {backend!r}")
+
+
+limiter = create_limiter(settings.rate_limit_backend)
 
 
 DEFAULT_RULES: dict[str, RateLimitRule] = {
@@ -46,12 +170,26 @@ DEFAULT_RULES: dict[str, RateLimitRule] = {
 }
 
 
+def _raise_limited(retry_after: int) -> None:
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Rate limit exceeded. Please try again shortly.",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
 def enforce_rate_limit(scope: str, key: str, rule: RateLimitRule | None = None) -> None:
     active_rule = rule or DEFAULT_RULES[scope]
     allowed, retry_after = limiter.hit(key=f"{scope}:{key}", limit=active_rule.limit, window_seconds=active_rule.window_seconds)
     if not allowed:
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Rate limit exceeded. Please try again shortly.",
-            headers={"Retry-After": str(retry_after)},
-        )
+        _raise_limited(retry_after)
+
+
+async def async_enforce_rate_limit(scope: str, key: str, rule: RateLimitRule | None = None) -> None:
+    """:func:`enforce_rate_limit` without blocking the event loop on Redis."""
+    active_rule = rule or DEFAULT_RULES[scope]
+    allowed, retry_after = await limiter.async_hit(
+        key=f"{scope}:{key}", limit=active_rule.limit, window_seconds=active_rule.window_seconds
+    )
+    if not allowed:
+        _raise_limited(retry_after)
@@ -0,0 +1,55 @@
+"""Shared Redis connections for caches and counters."""
+import logging
+import time
+
+import redis
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+_client: redis.Redis | None = None
+_async_client: aioredis.Redis | None = None
+
+
+def get_redis() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.redis_socket_timeout_seconds,
+            socket_connect_timeout=settings.redis_socket_timeout_seconds,
+        )
+    return _client
+
+
+def get_async_redis() -> aioredis.Redis:
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.redis_socket_timeout_seconds,
+            socket_connect_timeout=settings.redis_socket_timeout_seconds,
+        )
+    return _async_client
+
+
+class RedisBreaker:
+    """Skips Redis for ``retry_seconds`` after a failed call.
+
+    Callers that can do without Redis check :attr:`open` first, so while it is
+    unreachable each request fails fast instead of waiting out the socket timeout.
+    """
+
+    def __init__(self, name: str, retry_seconds: float = 30.0):
+        self.name = name
+        self.retry_seconds = retry_seconds
+        self._down_until = 0.0
+
+    @property
+    def open(self) -> bool:
+        return time.monotonic() < self._down_until
+
+    def trip(self) -> None:
+        logger.warning("Redis unavailable for %s; skipping it for %.0fs", self.name, self.retry_seconds)
+        self._down_until = time.monotonic() + self.retry_seconds
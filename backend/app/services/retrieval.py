@@ -1,77 +1,55 @@
 """Hybrid retrieval and optional reranking for RAG queries."""
 from __future__ import annotations
 
+import asyncio
 from functools import lru_cache
-import math
-import re
-from dataclasses import dataclass
+import logging
+import time
+from dataclasses import dataclass, field
 from typing import Any
 
 from app.core.config import settings
 from app.ingestion.embedding import embed_texts
-from app.services.qdrant_client import ensure_collection, get_qdrant, search_collection
+from app.models.base import SessionLocal
+from app.services import query_embedding_cache, sparse_index
+from app.services.bm25 import TermMatrix, query_sparse_vector, tokenize
+from app.services.retrieval_cache import async_index_version, cache_key, result_cache
+from app.services.qdrant_client import (
+    async_ensure_collection,
+    async_has_sparse_vectors,
+    async_hybrid_query_collection,
+    async_retrieve_points,
+    async_search_collection,
+    get_async_qdrant,
+)
 
-TOKEN_RE = re.compile(r"[A-Za-z0-9_]+")
 RRF_K = 60.0
 _cross_encoder = None
+logger = logging.getLogger(__name__)
 
 
 @dataclass
 class Candidate:
-    """Unified retrieval candidate."""
+    """Unified retrieval candidate; text and metadata are filled in only for survivors."""
 
     point_id: str
-    text: str
-    metadata: dict[str, Any]
-    doc_id: int | None
+    text: str = ""
+    metadata: dict[str, Any] = field(default_factory=dict)
+    doc_id: int | None = None
     dense_score: float = 0.0
     sparse_score: float = 0.0
     final_score: float = 0.0
 
 
-def _tokenize(text: str) -> list[str]:
-    return [t.lower() for t in TOKEN_RE.findall(text)]
-
-
 def _bm25_scores(query: str, docs: list[str]) -> list[float]:
-    """Simple BM25 implementation over candidate documents."""
+    """BM25 over candidate documents, scored in one batched pass."""
     if not docs:
         return []
-    tokenized_docs = [_tokenize(d) for d in docs]
-    q_terms = _tokenize(query)
+    q_terms = tokenize(query)
     if not q_terms:
         return [0.0 for _ in docs]
-
-    n_docs = len(tokenized_docs)
-    avg_len = sum(len(d) for d in tokenized_docs) / max(1, n_docs)
-    k1 = 1.2
-    b = 0.75
-
-    df: dict[str, int] = {}
-    tf_per_doc: list[dict[str, int]] = []
-    for tokens in tokenized_docs:
-        tf: dict[str, int] = {}
-        for term in tokens:
-            tf[term] = tf.get(term, 0) + 1
-        tf_per_doc.append(tf)
-        for term in set(tokens):
-            df[term] = df.get(term, 0) + 1
-
-    scores: list[float] = []
-    for tokens, tf in zip(tokenized_docs, tf_per_doc):
-        doc_len = max(1, len(tokens))
-        score = 0.0
-        for term in q_terms:
-            if term not in tf:
-                continue
-            term_df = df.get(term, 0)
-            # BM25 idf variant with +1 for numerical stability.
-            idf = math.log(1 + (n_docs - term_df + 0.5) / (term_df + 0.5))
-            freq = tf[term]
-            denom = freq + k1 * (1 - b + b * (doc_len / max(1e-9, avg_len)))
-            score += idf * ((freq * (k1 + 1)) / max(1e-9, denom))
-        scores.append(score)
-    return scores
+    matrix = TermMatrix([tokenize(d) for d in docs], vocabulary=q_terms)
+    return matrix.score(q_terms).tolist()
 
 
 def _rrf_fuse(dense_rank: dict[str, int], sparse_rank: dict[str, int]) -> dict[str, float]:
@@ -107,87 +85,182 @@ def _optional_cross_encoder_score(query: str, docs: list[str]) -> list[float] |
         return None
 
 
-@lru_cache(maxsize=2048)
-def _query_embedding(query: str) -> tuple[float, ...]:
-    return tuple(embed_texts([query])[0])
+def _normalize_query(query: str) -> str:
+    return " ".join(query.split())
 
 
-def _dense_search(kb_id: int, query: str, limit: int) -> list[Candidate]:
-    coll = ensure_collection(kb_id)
-    vector = list(_query_embedding(query.strip()))
-    hits = search_collection(collection=coll, vector=vector, limit=limit)
+@lru_cache(maxsize=2048)
+def _query_embedding(query: str) -> tuple[float, ...]:
+    # L1: this process' LRU; L2: Redis, shared across workers and restarts.
+    cached = query_embedding_cache.get(query)
+    if cached is not None:
+        return cached
+    # A short worker timeout keeps a stalled embedding worker from eating the dense leg's deadline.
+    timeout = min(settings.embedding_service_query_timeout_seconds, settings.retrieval_dense_timeout_seconds / 2)
+    vectors, model_id = embed_texts([query], timeout=timeout)
+    vector = tuple(vectors[0])
+    query_embedding_cache.put(query, vector, model_id)
+    return vector
+
+
+def _apply_payloads(candidates: list[Candidate], points) -> list[Candidate]:
+    payloads = {str(p.id): (p.payload or {}) for p in points}
     out: list[Candidate] = []
-    for h in hits:
-        payload = h.payload or {}
-        out.append(
-            Candidate(
-                point_id=str(h.id),
-                text=(payload.get("text") or ""),
-                metadata=(payload.get("metadata") or {}),
-                doc_id=payload.get("doc_id"),
-                dense_score=float(h.score or 0.0),
-            )
-        )
+    for c in candidates:
+        payload = payloads.get(c.point_id)
+        if payload is None:
+            # Deleted between candidate scan and hydration.
+            continue
+        c.text = payload.get("text") or ""
+        c.metadata = payload.get("metadata") or {}
+        c.doc_id = payload.get("doc_id", c.doc_id)
+        out.append(c)
     return out
 
 
-def _scroll_candidates(kb_id: int, max_points: int = 800) -> list[Candidate]:
-    """Read a bounded corpus snapshot for sparse retrieval."""
-    coll = ensure_collection(kb_id)
-    client = get_qdrant()
+async def _async_hydrate(kb_id: int, candidates: list[Candidate]) -> list[Candidate]:
+    """Fetch text and metadata for the final candidates in one batched retrieve."""
+    if not candidates:
+        return []
+    coll = await async_ensure_collection(kb_id)
+    return _apply_payloads(candidates, await async_retrieve_points(coll, [c.point_id for c in candidates]))
+
+
+def _hydration_width(top_k: int, pre_rerank: list[Candidate]) -> int:
+    # The cross-encoder reads every pre-rerank text; otherwise only top_k are returned.
+    return len(pre_rerank) if settings.retrieval_enable_cross_encoder else top_k
+
+
+def _dense_candidates(hits) -> list[Candidate]:
+    return [Candidate(point_id=str(h.id), dense_score=float(h.score or 0.0)) for h in hits]
+
+
+async def _async_dense_search(kb_id: int, query: str, limit: int) -> list[Candidate]:
+    coll = await async_ensure_collection(kb_id)
+    # Model inference is CPU-bound; keep it off the event loop.
+    vector = list(await asyncio.to_thread(_query_embedding, _normalize_query(query)))
+    hits = await async_search_collection(collection=coll, vector=vector, limit=limit, with_payload=False)
+    return _dense_candidates(hits)
+
+
+def _scrolled_candidates(points) -> list[Candidate]:
+    return [
+        Candidate(point_id=str(p.id), text=(p.payload or {}).get("text"))
+        for p in points
+        if (p.payload or {}).get("text")
+    ]
+
+
+async def _async_scroll_candidates(kb_id: int, max_points: int = 800) -> list[Candidate]:
+    """Read a bounded corpus snapshot for sparse retrieval of unindexed KBs."""
+    coll = await async_ensure_collection(kb_id)
+    client = get_async_qdrant()
     offset = None
     gathered: list[Candidate] = []
     page_limit = 128
     while len(gathered) < max_points:
-        points, offset = client.scroll(
+        points, offset = await client.scroll(
             collection_name=coll,
             offset=offset,
             limit=min(page_limit, max_points - len(gathered)),
-            with_payload=True,
+            with_payload=["text"],
             with_vectors=False,
         )
         if not points:
             break
-        for p in points:
-            payload = p.payload or {}
-            text = payload.get("text") or ""
-            if not text:
-                continue
-            gathered.append(
-                Candidate(
-                    point_id=str(p.id),
-                    text=text,
-                    metadata=(payload.get("metadata") or {}),
-                    doc_id=payload.get("doc_id"),
-                )
-            )
+        gathered.extend(_scrolled_candidates(points))
         if offset is None:
             break
     return gathered
 
 
-def hybrid_retrieve(
-    kb_id: int,
-    query: str,
-    top_k: int | None = None,
-    dense_limit: int | None = None,
-    sparse_pool: int | None = None,
-    rerank_top_n: int | None = None,
-) -> list[dict[str, Any]]:
-    """Hybrid retrieve with dense + BM25 sparse + RRF and optional reranking."""
-    top_k = top_k or settings.retrieval_top_k
-    dense_limit = dense_limit or settings.retrieval_dense_limit
-    sparse_pool = sparse_pool if sparse_pool is not None else settings.retrieval_sparse_pool
-    rerank_top_n = rerank_top_n or settings.retrieval_rerank_top_n
+def _score_scrolled(query: str, corpus: list[Candidate]) -> list[Candidate]:
+    for c, score in zip(corpus, _bm25_scores(query, [c.text for c in corpus])):
+        c.sparse_score = score
+    return corpus
 
-    dense_hits = _dense_search(kb_id, query, dense_limit)
-    sparse_corpus = _scroll_candidates(kb_id, max_points=sparse_pool) if sparse_pool and sparse_pool > 0 else []
 
-    # Sparse ranking over bounded corpus snapshot.
-    sparse_scores = _bm25_scores(query, [c.text for c in sparse_corpus])
-    for c, score in zip(sparse_corpus, sparse_scores):
-        c.sparse_score = score
+def _sparse_index_hits(kb_id: int, query: str, limit: int) -> list[sparse_index.SparseHit] | None:
+    db = SessionLocal()
+    try:
+        hits = sparse_index.search(db, kb_id, query, limit=limit)
+        db.commit()
+    finally:
+        db.close()
+    if hits is None:
+        sparse_index.request_backfill(kb_id)
+    return hits
+
+
+def _sparse_hit_candidates(hits: list[sparse_index.SparseHit]) -> list[Candidate]:
+    return [Candidate(point_id=h.point_id, doc_id=h.document_id, sparse_score=h.score) for h in hits]
 
+
+async def _async_sparse_search(kb_id: int, query: str, limit: int) -> list[Candidate]:
+    """BM25 over the KB inverted index; scrolls a bounded snapshot if the KB is unindexed."""
+    hits = await asyncio.to_thread(_sparse_index_hits, kb_id, query, limit)
+    if hits is None:
+        corpus = await _async_scroll_candidates(kb_id, max_points=limit)
+        return await asyncio.to_thread(_score_scrolled, query, corpus)
+    return _sparse_hit_candidates(hits)
+
+
+def _server_fused_candidates(fused, dense, sparse) -> list[Candidate]:
+    """Fused hits carrying the score each leg gave them (0 when a leg did not return the point)."""
+    dense_scores = {str(p.id): float(p.score or 0.0) for p in dense}
+    sparse_scores = {str(p.id): float(p.score or 0.0) for p in sparse}
+    return [
+        Candidate(
+            point_id=str(h.id),
+            dense_score=dense_scores.get(str(h.id), 0.0),
+            sparse_score=sparse_scores.get(str(h.id), 0.0),
+            final_score=float(h.score or 0.0),
+        )
+        for h in fused
+    ]
+
+
+async def _async_server_hybrid_search(
+    kb_id: int, query: str, dense_limit: int, sparse_pool: int, limit: int
+) -> list[Candidate] | None:
+    """Prefetch + RRF fusion inside Qdrant; None means use the Python fusion path."""
+    try:
+        coll = await async_ensure_collection(kb_id)
+        if not await async_has_sparse_vectors(coll):
+            return None
+        vector = list(await asyncio.to_thread(_query_embedding, _normalize_query(query)))
+        fused, dense, sparse = await async_hybrid_query_collection(
+            coll, vector, query_sparse_vector(tokenize(query)), dense_limit, sparse_pool, limit, with_payload=False
+        )
+    except Exception:
+        logger.warning("Server-side hybrid query failed for kb_id=%s; using client-side fusion", kb_id, exc_info=True)
+        return None
+    return _server_fused_candidates(fused, dense, sparse)
+
+
+async def _async_leg_result(task: asyncio.Task | None, leg: str, deadline: float) -> list[Candidate] | None:
+    """Wait for a retrieval leg until its deadline; None means the leg was dropped."""
+    if task is None:
+        return []
+    try:
+        return await asyncio.wait_for(task, timeout=max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        logger.warning("Dropping %s retrieval leg after timeout", leg)
+        return None
+
+
+def _surviving_legs(
+    dense_hits: list[Candidate] | None,
+    sparse_corpus: list[Candidate] | None,
+) -> tuple[list[Candidate], list[Candidate], bool]:
+    """Results of both legs plus whether one was dropped (degraded results must not be cached)."""
+    if dense_hits is None and sparse_corpus is None:
+        raise TimeoutError("Dense and sparse retrieval both timed out")
+    return dense_hits or [], sparse_corpus or [], dense_hits is None or sparse_corpus is None
+
+
+def _fuse(dense_hits: list[Candidate], sparse_corpus: list[Candidate], limit: int) -> list[Candidate]:
+    """RRF-fuse both legs and return the best ``limit`` candidates for reranking."""
     dense_rank = {c.point_id: i + 1 for i, c in enumerate(sorted(dense_hits, key=lambda x: x.dense_score, reverse=True))}
     sparse_rank = {
         c.point_id: i + 1
@@ -210,16 +283,16 @@ def hybrid_retrieve(
     for c in merged:
         c.final_score = fused.get(c.point_id, 0.0)
     merged.sort(key=lambda x: x.final_score, reverse=True)
+    return merged[:limit]
 
-    pre_rerank = merged[: max(top_k, rerank_top_n)]
-    ce_scores = _optional_cross_encoder_score(query, [c.text for c in pre_rerank])
+
+def _finalize(pre_rerank: list[Candidate], ce_scores: list[float] | None, top_k: int) -> list[dict[str, Any]]:
     if ce_scores:
         for c, s in zip(pre_rerank, ce_scores):
             # Cross-encoder becomes primary; RRF remains tie-breaker.
             c.final_score = (2.0 * s) + c.final_score
         pre_rerank.sort(key=lambda x: x.final_score, reverse=True)
 
-    out = pre_rerank[:top_k]
     return [
         {
             "snippet": c.text,
@@ -229,5 +302,101 @@ def hybrid_retrieve(
             "dense_score": c.dense_score,
             "sparse_score": c.sparse_score,
         }
-        for c in out
+        for c in pre_rerank[:top_k]
     ]
+
+
+def _resolve_limits(
+    top_k: int | None,
+    dense_limit: int | None,
+    sparse_pool: int | None,
+    rerank_top_n: int | None,
+) -> tuple[int, int, int, int]:
+    return (
+        top_k or settings.retrieval_top_k,
+        dense_limit or settings.retrieval_dense_limit,
+        sparse_pool if sparse_pool is not None else settings.retrieval_sparse_pool,
+        rerank_top_n or settings.retrieval_rerank_top_n,
+    )
+
+
+async def async_hybrid_retrieve(
+    kb_id: int,
+    query: str,
+    top_k: int | None = None,
+    dense_limit: int | None = None,
+    sparse_pool: int | None = None,
+    rerank_top_n: int | None = None,
+) -> list[dict[str, Any]]:
+    """Hybrid retrieve with dense + BM25 sparse + RRF and optional reranking.
+
+    Runs on the async Qdrant client; query embedding, index lookups and the
+    cross-encoder are moved off the event loop.
+    """
+    top_k, dense_limit, sparse_pool, rerank_top_n = _resolve_limits(top_k, dense_limit, sparse_pool, rerank_top_n)
+    key = cache_key(kb_id, await async_index_version(kb_id), query, top_k, dense_limit, sparse_pool, rerank_top_n)
+    if key is not None:
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached
+
+    pre_rerank = None
+    degraded = False
+    if settings.retrieval_server_side_hybrid:
+        pre_rerank = await _async_server_hybrid_search(kb_id, query, dense_limit, sparse_pool, max(top_k, rerank_top_n))
+    if pre_rerank is None:
+        # Both legs run concurrently; fusion waits for both, dropping a leg that misses its deadline.
+        started = time.monotonic()
+        dense_task = asyncio.create_task(_async_dense_search(kb_id, query, dense_limit))
+        sparse_task = (
+            asyncio.create_task(_async_sparse_search(kb_id, query, sparse_pool))
+            if sparse_pool and sparse_pool > 0
+            else None
+        )
+        try:
+            dense_hits, sparse_corpus, degraded = _surviving_legs(
+                await _async_leg_result(dense_task, "dense", started + settings.retrieval_dense_timeout_seconds),
+                await _async_leg_result(sparse_task, "sparse", started + settings.retrieval_sparse_timeout_seconds),
+            )
+        finally:
+            for task in (dense_task, sparse_task):
+                if task is not None and not task.done():
+                    task.cancel()
+        pre_rerank = _fuse(dense_hits, sparse_corpus, limit=max(top_k, rerank_top_n))
+
+    pre_rerank = await _async_hydrate(kb_id, pre_rerank[: _hydration_width(top_k, pre_rerank)])
+    ce_scores = await asyncio.to_thread(_optional_cross_encoder_score, query, [c.text for c in pre_rerank])
+    results = _finalize(pre_rerank, ce_scores, top_k)
+    if key is not None and not degraded:
+        result_cache.put(key, results)
+    return results
+
+
+def _merge_federated(per_kb: dict[int, list[dict[str, Any]]], top_k: int) -> list[dict[str, Any]]:
+    """Global RRF over per-KB rankings; each result is tagged with its KB."""
+    merged: list[dict[str, Any]] = []
+    for kb_id, results in per_kb.items():
+        for rank, r in enumerate(results, start=1):
+            merged.append({**r, "kb_id": kb_id, "federated_score": 1.0 / (RRF_K + rank)})
+    merged.sort(key=lambda r: (r["federated_score"], r.get("score", 0.0)), reverse=True)
+    return merged[:top_k]
+
+
+async def federated_retrieve(kb_ids: list[int], query: str, top_k: int | None = None) -> list[dict[str, Any]]:
+    """Search several KBs in parallel; latency is bounded by the slowest collection."""
+    top_k = top_k or settings.retrieval_top_k
+    outcomes = await asyncio.gather(
+        *(async_hybrid_retrieve(kb_id=kb_id, query=query, top_k=top_k) for kb_id in kb_ids),
+        return_exceptions=True,
+    )
+    per_kb: dict[int, list[dict[str, Any]]] = {}
+    failures: list[BaseException] = []
+    for kb_id, outcome in zip(kb_ids, outcomes):
+        if isinstance(outcome, BaseException):
+            logger.warning("Federated retrieval failed for kb_id=%s: %s", kb_id, outcome)
+            failures.append(outcome)
+            continue
+        per_kb[kb_id] = outcome
+    if failures and not per_kb:
+        raise failures[0]
+    return _merge_federated(per_kb, top_k)
@@ -0,0 +1,105 @@
+"""Bounded in-process cache of hybrid retrieval results.
+
+Entries are keyed on the query parameters plus the KB index version kept in
+Redis. Ingestion bumps the version after writing to a collection, so entries
+cached against an older version are simply never looked up again and age out
+through LRU eviction or TTL. While Redis is unreachable the cache is
+bypassed, and after a failed lookup Redis is skipped for a retry window
+instead of costing every search a socket timeout.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+import logging
+import threading
+import time
+from typing import Any, Hashable
+
+from app.core.config import settings
+from app.services.redis_client import RedisBreaker, get_async_redis, get_redis
+
+INDEX_VERSION_KEY = "ragnetic:kb:{kb_id}:index_version"
+logger = logging.getLogger(__name__)
+_breaker = RedisBreaker("the retrieval result cache")
+
+
+class RetrievalCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, tuple[float, list[dict[str, Any]]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> list[dict[str, Any]] | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [dict(r) for r in entry[1]]
+
+    def put(self, key: Hashable, results: list[dict[str, Any]]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, [dict(r) for r in results])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+result_cache = RetrievalCache(
+    max_entries=settings.retrieval_cache_max_entries,
+    ttl_seconds=settings.retrieval_cache_ttl_seconds,
+)
+
+
+async def async_index_version(kb_id: int) -> int | None:
+    """Current KB index version, or None when Redis is unreachable (cache is bypassed)."""
+    if _breaker.open:
+        return None
+    try:
+        raw = await get_async_redis().get(INDEX_VERSION_KEY.format(kb_id=kb_id))
+    except Exception:
+        _breaker.trip()
+        return None
+    return int(raw or 0)
+
+
+def bump_index_version(kb_id: int) -> None:
+    """Invalidate cached results of a KB. Failures are logged; entry TTL bounds staleness."""
+    try:
+        get_redis().incr(INDEX_VERSION_KEY.format(kb_id=kb_id))
+    except Exception:
+        logger.exception("Failed to bump index version for kb_id=%s", kb_id)
+
+
+def cache_key(kb_id: int, version: int | None, query: str, *limits: int) -> tuple | None:
+    if version is None or settings.retrieval_cache_max_entries <= 0:
+        return None
+    return (kb_id, version, " ".join(query.split()), *limits)
@@ -0,0 +1,374 @@
+"""Persistent BM25 inverted index per knowledge base.
+
+Postings, chunk lengths and document frequencies live in PostgreSQL and are
+updated incrementally at ingestion time, so a sparse query only touches the
+postings of its own terms instead of scanning the whole collection.
+
+KBs that already held documents when the index was introduced are only
+partially covered by it; search reports them as unindexed (so retrieval keeps
+using the scroll scorer) and a one-off ``rebuild_sparse_index`` backfill is
+queued the first time they are queried.
+"""
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass
+import logging
+from typing import Iterable
+
+import numpy as np
+from sqlalchemy import bindparam, delete, exists, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.celery_app import celery_app
+from app.models.document import Document, DocumentStatus
+from app.models.sparse_index import (
+    SparseIndexDocument,
+    SparseIndexEmptyDocument,
+    SparseIndexPosting,
+    SparseIndexStats,
+    SparseIndexTerm,
+)
+from app.services.bm25 import idf, term_scores, tokenize
+from app.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Longer tokens are almost always hashes/base64 noise; they still count towards length.
+MAX_TERM_LENGTH = 64
+# One backfill per KB at a time across processes; matches the Celery task time limit.
+BACKFILL_LOCK_KEY = "ragnetic:kb:{kb_id}:sparse_backfill"
+BACKFILL_LOCK_SECONDS = 3600
+
+
+@dataclass
+class SparseHit:
+    point_id: str
+    document_id: int
+    score: float
+
+
+def _indexable_terms(tokens: list[str]) -> Counter:
+    return Counter(t for t in tokens if len(t) <= MAX_TERM_LENGTH)
+
+
+def _indexed_point_ids(db: Session, kb_id: int, point_ids: list[str]) -> set[str]:
+    if not point_ids:
+        return set()
+    return set(
+        db.execute(
+            select(SparseIndexDocument.point_id).where(
+                SparseIndexDocument.knowledge_base_id == kb_id,
+                SparseIndexDocument.point_id.in_(point_ids),
+            )
+        ).scalars()
+    )
+
+
+def _apply_stats(db: Session, kb_id: int, doc_delta: int, length_delta: int) -> None:
+    stats = pg_insert(SparseIndexStats).values(
+        knowledge_base_id=kb_id,
+        doc_count=doc_delta,
+        total_length=length_delta,
+    )
+    db.execute(
+        stats.on_conflict_do_update(
+            index_elements=[SparseIndexStats.knowledge_base_id],
+            set_={
+                "doc_count": SparseIndexStats.doc_count + stats.excluded.doc_count,
+                "total_length": SparseIndexStats.total_length + stats.excluded.total_length,
+            },
+        )
+    )
+
+
+def index_chunks(db: Session, kb_id: int, entries: Iterable[tuple[str, int, str]]) -> int:
+    """Add (point_id, document_id, text) entries to the KB index. Caller commits.
+
+    Points that are already indexed are skipped, so retried ingestion does not
+    double count them.
+    """
+    entries = [(str(point_id), document_id, text) for point_id, document_id, text in entries]
+    already = _indexed_point_ids(db, kb_id, [point_id for point_id, _, _ in entries])
+    doc_rows: list[dict] = []
+    posting_rows: list[dict] = []
+    df_delta: Counter = Counter()
+    total_length = 0
+    for point_id, document_id, text in entries:
+        if point_id in already:
+            continue
+        already.add(point_id)
+        tokens = tokenize(text)
+        counts = _indexable_terms(tokens)
+        doc_rows.append(
+            {
+                "knowledge_base_id": kb_id,
+                "point_id": str(point_id),
+                "document_id": document_id,
+                "length": len(tokens),
+            }
+        )
+        for term, freq in counts.items():
+            posting_rows.append(
+                {"knowledge_base_id": kb_id, "term": term, "point_id": str(point_id), "term_freq": freq}
+            )
+        df_delta.update(counts.keys())
+        total_length += len(tokens)
+
+    if not doc_rows:
+        return 0
+
+    db.execute(pg_insert(SparseIndexDocument).on_conflict_do_nothing(), doc_rows)
+    if posting_rows:
+        db.execute(pg_insert(SparseIndexPosting), posting_rows)
+
+    # Sorted upserts keep row-lock order stable across concurrent ingestion tasks.
+    term_rows = [{"knowledge_base_id": kb_id, "term": t, "doc_freq": n} for t, n in sorted(df_delta.items())]
+    if term_rows:
+        stmt = pg_insert(SparseIndexTerm)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[SparseIndexTerm.knowledge_base_id, SparseIndexTerm.term],
+                set_={"doc_freq": SparseIndexTerm.doc_freq + stmt.excluded.doc_freq},
+            ),
+            term_rows,
+        )
+
+    _apply_stats(db, kb_id, len(doc_rows), total_length)
+    return len(doc_rows)
+
+
+def remove_points(db: Session, kb_id: int, point_ids: Iterable[str]) -> int:
+    """Remove indexed chunks and their postings from the KB index. Caller commits."""
+    ids = [str(p) for p in point_ids]
+    if not ids:
+        return 0
+    lengths = db.execute(
+        select(SparseIndexDocument.length).where(
+            SparseIndexDocument.knowledge_base_id == kb_id,
+            SparseIndexDocument.point_id.in_(ids),
+        )
+    ).scalars().all()
+    if not lengths:
+        return 0
+    df_delta = Counter(
+        db.execute(
+            select(SparseIndexPosting.term).where(
+                SparseIndexPosting.knowledge_base_id == kb_id,
+                SparseIndexPosting.point_id.in_(ids),
+            )
+        ).scalars()
+    )
+    db.execute(
+        delete(SparseIndexPosting).where(
+            SparseIndexPosting.knowledge_base_id == kb_id,
+            SparseIndexPosting.point_id.in_(ids),
+        )
+    )
+    db.execute(
+        delete(SparseIndexDocument).where(
+            SparseIndexDocument.knowledge_base_id == kb_id,
+            SparseIndexDocument.point_id.in_(ids),
+        )
+    )
+    # Same sorted order as index_chunks so concurrent writers lock term rows consistently.
+    if df_delta:
+        terms = SparseIndexTerm.__table__
+        db.execute(
+            update(terms)
+            .where(terms.c.knowledge_base_id == kb_id, terms.c.term == bindparam("b_term"))
+            .values(doc_freq=terms.c.doc_freq - bindparam("b_n")),
+            [{"b_term": term, "b_n": n} for term, n in sorted(df_delta.items())],
+        )
+        db.execute(
+            delete(SparseIndexTerm).where(SparseIndexTerm.knowledge_base_id == kb_id, SparseIndexTerm.doc_freq <= 0)
+        )
+    _apply_stats(db, kb_id, -len(lengths), -sum(lengths))
+    return len(lengths)
+
+
+def remove_document(db: Session, kb_id: int, document_id: int) -> int:
+    """Remove every indexed chunk of a document. Caller commits."""
+    db.execute(
+        delete(SparseIndexEmptyDocument).where(
+            SparseIndexEmptyDocument.knowledge_base_id == kb_id,
+            SparseIndexEmptyDocument.document_id == document_id,
+        )
+    )
+    point_ids = db.execute(
+        select(SparseIndexDocument.point_id).where(
+            SparseIndexDocument.knowledge_base_id == kb_id,
+            SparseIndexDocument.document_id == document_id,
+        )
+    ).scalars().all()
+    return remove_points(db, kb_id, point_ids)
+
+
+def average_length(db: Session, kb_id: int) -> float | None:
+    stats = db.get(SparseIndexStats, kb_id)
+    if stats is None or stats.doc_count <= 0:
+        return None
+    return stats.total_length / stats.doc_count
+
+
+def mark_empty_document(db: Session, kb_id: int, document_id: int) -> None:
+    """Record an indexed document without chunks so it does not hold back coverage. Caller commits."""
+    db.execute(
+        pg_insert(SparseIndexEmptyDocument)
+        .values(knowledge_base_id=kb_id, document_id=document_id)
+        .on_conflict_do_nothing()
+    )
+
+
+def mark_complete(db: Session, kb_id: int) -> None:
+    """Record that the index covers every document of the KB. Caller commits."""
+    stmt = pg_insert(SparseIndexStats).values(knowledge_base_id=kb_id, doc_count=0, total_length=0, complete=True)
+    db.execute(
+        stmt.on_conflict_do_update(index_elements=[SparseIndexStats.knowledge_base_id], set_={"complete": True})
+    )
+
+
+def is_complete(db: Session, kb_id: int) -> bool:
+    """True when every INDEXED document of the KB has chunks in the index or none at all. Caller commits.
+
+    Once coverage is confirmed it is stored on the stats row, so later calls are
+    a primary-key lookup; ingestion keeps newly indexed documents covered.
+    """
+    stats = db.get(SparseIndexStats, kb_id)
+    if stats is not None and stats.complete:
+        return True
+    unindexed = db.execute(
+        select(Document.id)
+        .where(
+            Document.knowledge_base_id == kb_id,
+            Document.status == DocumentStatus.INDEXED,
+            ~exists().where(
+                SparseIndexDocument.knowledge_base_id == kb_id,
+                SparseIndexDocument.document_id == Document.id,
+            ),
+            ~exists().where(
+                SparseIndexEmptyDocument.knowledge_base_id == kb_id,
+                SparseIndexEmptyDocument.document_id == Document.id,
+            ),
+        )
+        .limit(1)
+    ).first()
+    if unindexed is not None:
+        return False
+    if stats is not None:
+        stats.complete = True
+    return True
+
+
+def request_backfill(kb_id: int) -> bool:
+    """Queue ``rebuild_sparse_index`` for a partially indexed KB unless one is already pending."""
+    try:
+        if not get_redis().set(BACKFILL_LOCK_KEY.format(kb_id=kb_id), 1, nx=True, ex=BACKFILL_LOCK_SECONDS):
+            return False
+        celery_app.send_task("app.tasks.ingestion.rebuild_sparse_index", args=[kb_id])
+    except Exception:
+        logger.warning("Could not queue sparse index backfill for kb_id=%s", kb_id, exc_info=True)
+        return False
+    logger.info("Queued sparse index backfill for kb_id=%s", kb_id)
+    return True
+
+
+def release_backfill(kb_id: int) -> None:
+    try:
+        get_redis().delete(BACKFILL_LOCK_KEY.format(kb_id=kb_id))
+    except Exception:
+        logger.warning("Could not release sparse index backfill lock for kb_id=%s", kb_id, exc_info=True)
+
+
+def reset_kb(db: Session, kb_id: int) -> None:
+    """Drop every index row of a KB. Caller commits."""
+    for model in (SparseIndexPosting, SparseIndexTerm, SparseIndexDocument, SparseIndexStats):
+        db.execute(delete(model).where(model.knowledge_base_id == kb_id))
+
+
+def rank_postings(
+    q_terms: list[str],
+    postings: list[tuple[str, str, int, int, int]],
+    doc_freqs: dict[str, int],
+    n_docs: int,
+    avg_len: float,
+    limit: int,
+) -> list[SparseHit]:
+    """Top BM25 hits from (point_id, term, term_freq, length, document_id) posting rows.
+
+    Mirrors the in-memory scorer: repeated query terms contribute once per occurrence.
+    """
+    if not postings:
+        return []
+    term_weights = Counter(q_terms)
+    term_idf = {t: idf(n_docs, doc_freqs.get(t, 0)) for t in term_weights}
+    point_ids, terms, freqs, lengths, document_ids = zip(*postings)
+
+    slots: dict[str, int] = {}
+    slot_idx = np.fromiter((slots.setdefault(p, len(slots)) for p in point_ids), dtype=np.int64, count=len(point_ids))
+    contrib = term_scores(
+        np.fromiter((term_idf[t] for t in terms), dtype=np.float64, count=len(terms)),
+        np.asarray(freqs, dtype=np.float64),
+        np.maximum(1, np.asarray(lengths, dtype=np.float64)),
+        avg_len,
+    ) * np.fromiter((term_weights[t] for t in terms), dtype=np.float64, count=len(terms))
+    scores = np.bincount(slot_idx, weights=contrib, minlength=len(slots))
+
+    slot_points = list(slots)
+    doc_of = dict(zip(point_ids, document_ids))
+    top = np.argsort(-scores, kind="stable")[:limit]
+    return [
+        SparseHit(point_id=slot_points[slot], document_id=doc_of[slot_points[slot]], score=float(scores[slot]))
+        for slot in top.tolist()
+    ]
+
+
+def search(db: Session, kb_id: int, query: str, limit: int) -> list[SparseHit] | None:
+    """Top BM25 hits for a query, or None when the index does not (yet) cover the KB.
+
+    A covered KB without indexed chunks has no hits. Caller commits: a confirmed
+    coverage check is recorded on the stats row.
+    """
+    if not is_complete(db, kb_id):
+        return None
+    stats = db.get(SparseIndexStats, kb_id)
+    if stats is None or stats.doc_count <= 0:
+        return []
+    q_terms = [t for t in tokenize(query) if len(t) <= MAX_TERM_LENGTH]
+    if not q_terms:
+        return []
+    unique_terms = sorted(set(q_terms))
+
+    doc_freqs = dict(
+        db.execute(
+            select(SparseIndexTerm.term, SparseIndexTerm.doc_freq).where(
+                SparseIndexTerm.knowledge_base_id == kb_id,
+                SparseIndexTerm.term.in_(unique_terms),
+            )
+        ).all()
+    )
+    if not doc_freqs:
+        return []
+
+    postings = db.execute(
+        select(
+            SparseIndexPosting.point_id,
+            SparseIndexPosting.term,
+            SparseIndexPosting.term_freq,
+            SparseIndexDocument.length,
+            SparseIndexDocument.document_id,
+        )
+        .join(
+            SparseIndexDocument,
+            (SparseIndexDocument.knowledge_base_id == SparseIndexPosting.knowledge_base_id)
+            & (SparseIndexDocument.point_id == SparseIndexPosting.point_id),
+        )
+        .where(
+            SparseIndexPosting.knowledge_base_id == kb_id,
+            SparseIndexPosting.term.in_(list(doc_freqs.keys())),
+        )
+    ).all()
+
+    avg_len = stats.total_length / max(1, stats.doc_count)
+    return rank_postings(q_terms, postings, doc_freqs, stats.doc_count, avg_len, limit)
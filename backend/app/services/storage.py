@@ -1,11 +1,14 @@
 """Object storage (MinIO/S3) for uploaded files."""
-import io
+import os
+import tempfile
+from pathlib import Path
 from typing import BinaryIO
 
 from app.core.config import settings
 
 # Optional MinIO; fallback to in-memory / filesystem if not available
 _client = None
+OBJECT_READ_CHUNK_BYTES = 1024 * 1024
 
 
 def _get_client():
@@ -39,29 +42,91 @@ def ensure_bucket():
         pass
 
 
-def upload_file(object_key: str, data: BinaryIO, size: int, content_type: str = "application/octet-stream") -> str:
-    """Upload file to object store. Returns object_key."""
+def upload_file(
+    object_key: str,
+    data: BinaryIO,
+    size: int,
+    content_type: str = "application/octet-stream",
+    part_size: int = 0,
+) -> str:
+    """Upload file to object store. Returns object_key.
+
+    ``data`` is read sequentially; objects larger than ``part_size`` (0 lets
+    MinIO choose) go up as a multipart upload, one part in memory at a time.
+    """
     c = _get_client()
     if c is None:
         raise RuntimeError("MinIO not configured or unavailable")
     ensure_bucket()
-    c.put_object(settings.minio_bucket, object_key, data, size, content_type=content_type)
+    c.put_object(settings.minio_bucket, object_key, data, size, content_type=content_type, part_size=part_size)
     return object_key
 
 
-def download_file(object_key: str) -> bytes:
-    """Download file from object store."""
+class SpooledObject:
+    """A downloaded object, kept in memory or spooled to a named temp file past a threshold.
+
+    Parsers take ``source``: the temp file ``path`` when spooled (they open or
+    memory-map it in place), otherwise the bytes. ``close()`` removes the temp file.
+    """
+
+    def __init__(self, data: bytes | None = None, path: Path | None = None, size: int = 0):
+        self.data = data
+        self.path = path
+        self.size = size
+
+    @property
+    def source(self) -> bytes | Path:
+        return self.path if self.path is not None else self.data
+
+    def close(self) -> None:
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        self.data = None
+
+    def __enter__(self) -> "SpooledObject":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_object(object_key: str, spool_threshold: int | None = None) -> SpooledObject:
+    """Stream an object from the store, spooling it to disk once it exceeds ``spool_threshold`` bytes.
+
+    Defaults to ``object_spool_threshold_bytes``. The caller closes the result.
+    """
     c = _get_client()
     if c is None:
         raise RuntimeError("MinIO not configured or unavailable")
+    threshold = settings.object_spool_threshold_bytes if spool_threshold is None else spool_threshold
+    buf = bytearray()
+    tmp = None
+    size = 0
     resp = c.get_object(settings.minio_bucket, object_key)
     try:
-        return resp.read()
+        for chunk in resp.stream(OBJECT_READ_CHUNK_BYTES):
+            size += len(chunk)
+            if tmp is not None:
+                tmp.write(chunk)
+                continue
+            buf += chunk
+            if len(buf) > threshold:
+                tmp = tempfile.NamedTemporaryFile(prefix="ragnetic-object-", delete=False)
+                tmp.write(buf)
+                buf = bytearray()
+    except BaseException:
+        if tmp is not None:
+            tmp.close()
+            os.unlink(tmp.name)
+        raise
     finally:
         resp.close()
-
-
-def get_stream(object_key: str) -> BinaryIO:
-    """Get a readable stream for the object."""
-    data = download_file(object_key)
-    return io.BytesIO(data)
+        resp.release_conn()
+    if tmp is None:
+        return SpooledObject(data=bytes(buf), size=size)
+    tmp.close()
+    return SpooledObject(path=Path(tmp.name), size=size)
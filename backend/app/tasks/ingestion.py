@@ -1,18 +1,37 @@
 """Document ingestion Celery task: parse, chunk, embed, index."""
 import hashlib
-import uuid
+import itertools
+import logging
+from typing import Callable, Iterable, Iterator
 from app.core.celery_app import celery_app
-from app.ingestion.chunking import chunk_text
-from app.ingestion.embedding import embed_texts
-from app.ingestion.parsers import parse_document
+from app.ingestion.chunking import Chunk, iter_chunks, iter_page_chunks
+from app.ingestion.parsers import parse_document_pages
 from app.models.base import SessionLocal, Base
 from app.models.document import Document, DocumentStatus
 from app.models.user import User  # noqa: F401 - ensure mapper registration for relationships
 from app.core.config import settings
-from app.services.qdrant_client import ensure_collection, upsert_chunks, collection_name
-from app.services.storage import get_stream
+from app.services import chunk_manifest, embedding_cache, sparse_index
+from app.services.bm25 import document_sparse_vector, tokenize
+from app.services.embedding_cache import EmbeddingCacheStats, embed_cached
+from app.services.qdrant_client import (
+    collection_name,
+    compare_quantized_search,
+    delete_document_points,
+    delete_points,
+    ensure_collection,
+    get_qdrant,
+    has_sparse_vectors,
+    point_vector,
+    set_document_payload,
+    set_points_payload,
+    upsert_chunks,
+)
+from app.services.retrieval_cache import bump_index_version
+from app.services.storage import SpooledObject, open_object
 from qdrant_client.models import PointStruct
 
+logger = logging.getLogger(__name__)
+
 
 def _update_doc_status(doc_id: int, status: str, error_message: str | None = None):
     db = SessionLocal()
@@ -27,9 +46,161 @@ def _update_doc_status(doc_id: int, status: str, error_message: str | None = Non
         db.close()
 
 
+def _sparse_vectors(coll: str, texts: list[str], avg_len: float | None) -> list:
+    """BM25 sparse vectors for server-side hybrid search, or Nones when the mode is off."""
+    if not settings.retrieval_server_side_hybrid or not has_sparse_vectors(coll):
+        return [None] * len(texts)
+    tokenized = [tokenize(t) for t in texts]
+    if avg_len is None:
+        avg_len = sum(len(t) for t in tokenized) / max(1, len(tokenized))
+    return [document_sparse_vector(tokens, avg_len) for tokens in tokenized]
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    batch: list = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _index_batch(
+    coll: str,
+    kb_id: int,
+    document_id: int,
+    entries: list[tuple[str, str, Chunk]],
+    avg_len: float | None,
+    cache_stats: EmbeddingCacheStats | None = None,
+) -> None:
+    """Embed, upsert, sparse-index and record one batch of (point_id, content_hash, chunk) entries."""
+    texts = [c.text for _, _, c in entries]
+    vectors = embed_cached(texts, [digest for _, digest, _ in entries], cache_stats)
+    sparse_vectors = _sparse_vectors(coll, texts, avg_len)
+    points = [
+        PointStruct(
+            id=point_id,
+            vector=point_vector(vec, sparse),
+            payload={"text": c.text, "metadata": c.metadata, "doc_id": document_id},
+        )
+        for (point_id, _, c), vec, sparse in zip(entries, vectors, sparse_vectors)
+    ]
+    upsert_chunks(coll, points)
+    db = SessionLocal()
+    try:
+        sparse_index.index_chunks(db, kb_id, [(p.id, document_id, p.payload["text"]) for p in points])
+        chunk_manifest.record(
+            db, document_id, [(point_id, digest, chunk_manifest.position(c)) for point_id, digest, c in entries]
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _stream_index(
+    coll: str,
+    kb_id: int,
+    document_id: int,
+    entries: Iterable[tuple[str, str, Chunk]],
+    avg_len: float | None,
+    batch_size: int,
+    on_batch: Callable[[int, Chunk], None] | None = None,
+    cache_stats: EmbeddingCacheStats | None = None,
+) -> int:
+    """Pull entries batch by batch so at most one batch of chunks, vectors and points is held at a time."""
+    total = 0
+    for batch in _batched(entries, max(1, batch_size)):
+        _index_batch(coll, kb_id, document_id, batch, avg_len, cache_stats)
+        total += len(batch)
+        if on_batch is not None:
+            on_batch(total, batch[-1][2])
+    return total
+
+
+def _changed_chunks(
+    entries: Iterable[tuple[str, str, Chunk]],
+    previous: dict[str, tuple[str, chunk_manifest.Position]],
+    seen: set[str],
+    moved: list[tuple[str, str, chunk_manifest.Position]],
+) -> Iterator[tuple[str, str, Chunk]]:
+    """Pass through entries not in the manifest; record every point seen and unchanged chunks that moved.
+
+    A chunk has moved when its index or its page span changed, e.g. after a
+    page was inserted in front of it.
+    """
+    for point_id, digest, chunk in entries:
+        seen.add(point_id)
+        known = previous.get(point_id)
+        if known is None:
+            yield point_id, digest, chunk
+        elif known[1] != chunk_manifest.position(chunk):
+            moved.append((point_id, digest, chunk_manifest.position(chunk)))
+
+
+def _position_patch(position: chunk_manifest.Position) -> dict:
+    index, page_start, page_end = position
+    if page_start is None:
+        return {"chunk_index": index}
+    return {"chunk_index": index, "page_start": page_start, "page_end": page_end}
+
+
+def _apply_manifest_changes(
+    coll: str,
+    kb_id: int,
+    document_id: int,
+    removed: list[str],
+    moved: list[tuple[str, str, chunk_manifest.Position]],
+) -> None:
+    """Delete points of chunks that disappeared and update the position of chunks that shifted."""
+    delete_points(coll, removed)
+    set_points_payload(coll, [(point_id, _position_patch(pos)) for point_id, _, pos in moved], key="metadata")
+    db = SessionLocal()
+    try:
+        sparse_index.remove_points(db, kb_id, removed)
+        chunk_manifest.remove(db, document_id, removed)
+        chunk_manifest.record(db, document_id, moved)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _purge_unmanifested(coll: str, kb_id: int, document_id: int) -> int:
+    """Delete a document's points when it has no manifest.
+
+    Documents indexed before point IDs were derived from chunk content have
+    random IDs that the manifest cannot reconcile, so they are removed by their
+    ``doc_id`` payload before the document is indexed again. Returns the number
+    of sparse-index entries removed.
+    """
+    delete_document_points(coll, document_id)
+    db = SessionLocal()
+    try:
+        purged = sparse_index.remove_document(db, kb_id, document_id)
+        db.commit()
+    finally:
+        db.close()
+    return purged
+
+
+def _record_empty_document(kb_id: int, document_id: int) -> None:
+    """Count a document without chunks as covered by the sparse index."""
+    db = SessionLocal()
+    try:
+        sparse_index.mark_empty_document(db, kb_id, document_id)
+        db.commit()
+    finally:
+        db.close()
+
+
 @celery_app.task(bind=True)
 def ingest_document(self, document_id: int) -> dict:
-    """Parse, chunk, embed, and index a document."""
+    """Parse, chunk, embed, and index a document.
+
+    Re-running the task (retries or a replaced upload) only embeds chunks that
+    are not in the document's manifest and deletes the ones that disappeared.
+    """
     _update_doc_status(document_id, DocumentStatus.PROCESSING)
     db = SessionLocal()
     doc = None
@@ -39,48 +210,172 @@ def ingest_document(self, document_id: int) -> dict:
             return {"document_id": document_id, "status": "not_found"}
         object_key = doc.object_key
         filename = doc.filename
-        stream = get_stream(object_key)
-        content = stream.read()
+        kb_id = doc.knowledge_base_id or 1
+        previous = chunk_manifest.load(db, document_id)
+        obj = open_object(object_key)
     except Exception as e:
         _update_doc_status(document_id, DocumentStatus.FAILED, str(e))
         return {"document_id": document_id, "status": "failed", "error": str(e)}
     finally:
         db.close()
 
-    self.update_state(state="PROCESSING", meta={"progress": 10})
-    text, parse_meta = parse_document(content, filename)
-    self.update_state(state="PROCESSING", meta={"progress": 30})
+    # Large objects are spooled to a temp file that parsers open in place; it
+    # must outlive the lazy page iterator.
+    with obj:
+        return _ingest_object(self, document_id, kb_id, filename, previous, obj)
 
-    chunks = chunk_text(
-        text,
-        max_chunk_chars=settings.chunk_max_chars,
-        overlap_chars=settings.chunk_overlap_chars,
-        min_chunk_chars=settings.chunk_min_chars,
-        metadata_base={"source": doc.filename, "doc_id": document_id, **parse_meta},
-    )
-    if not chunks:
+
+def _ingest_object(task, document_id: int, kb_id: int, filename: str, previous: dict, obj: SpooledObject) -> dict:
+    task.update_state(state="PROCESSING", meta={"progress": 10})
+    pages, parse_meta = parse_document_pages(obj.source, filename)
+    size_hint = obj.size
+    page_count = parse_meta.get("pages")
+
+    chunk_options = {
+        "max_chunk_chars": settings.chunk_max_chars,
+        "overlap_chars": settings.chunk_overlap_chars,
+        "min_chunk_chars": settings.chunk_min_chars,
+        "metadata_base": {"source": filename, "doc_id": document_id, **parse_meta},
+    }
+    if page_count:
+        # Pages are parsed lazily as the chunker asks for them.
+        chunks = iter_page_chunks(pages, **chunk_options)
+    else:
+        chunks = iter_chunks("\n\n".join(pages), **chunk_options)
+    first = next(chunks, None)
+    coll = ensure_collection(kb_id)
+    purged = 0 if previous else _purge_unmanifested(coll, kb_id, document_id)
+    if first is None and not previous:
+        if purged:
+            bump_index_version(kb_id)
+        _record_empty_document(kb_id, document_id)
         _update_doc_status(document_id, DocumentStatus.INDEXED)
         return {"document_id": document_id, "status": "indexed", "chunks": 0}
 
-    self.update_state(state="PROCESSING", meta={"progress": 50})
-    texts = [c.text for c in chunks]
-    vectors = embed_texts(texts)
-    self.update_state(state="PROCESSING", meta={"progress": 70})
-
     db2 = SessionLocal()
-    doc_ref = db2.query(Document).filter(Document.id == document_id).first()
-    kb_id = doc_ref.knowledge_base_id if doc_ref else 1
-    db2.close()
-    coll = ensure_collection(kb_id)
-    points = [
-        PointStruct(
-            id=str(uuid.uuid4()),
-            vector=vec,
-            payload={"text": c.text, "metadata": c.metadata, "doc_id": document_id},
+    try:
+        avg_len = sparse_index.average_length(db2, kb_id)
+    finally:
+        db2.close()
+
+    def report(done: int, last: Chunk) -> None:
+        # Chunks are produced in document order, so the last page / end offset measures work done.
+        if page_count:
+            fraction = last.metadata["page_end"] / page_count
+        else:
+            fraction = min(1.0, last.end_char / max(1, size_hint))
+        task.update_state(state="PROCESSING", meta={"progress": 10 + int(85 * fraction), "chunks": done})
+
+    seen: set[str] = set()
+    moved: list[tuple[str, str, chunk_manifest.Position]] = []
+    embedded = 0
+    removed: list[str] = []
+    changed = True  # a failure may leave some batches written
+    cache_stats = EmbeddingCacheStats()
+    try:
+        entries = chunk_manifest.assign_ids(kb_id, document_id, itertools.chain([first] if first else [], chunks))
+        embedded = _stream_index(
+            coll,
+            kb_id,
+            document_id,
+            _changed_chunks(entries, previous, seen, moved),
+            avg_len,
+            settings.ingestion_batch_size,
+            on_batch=report,
+            cache_stats=cache_stats,
         )
-        for c, vec in zip(chunks, vectors)
-    ]
-    upsert_chunks(coll, points)
-    self.update_state(state="PROCESSING", meta={"progress": 100})
+        removed = [point_id for point_id in previous if point_id not in seen]
+        _apply_manifest_changes(coll, kb_id, document_id, removed, moved)
+        if seen:
+            # Document-level metadata (e.g. the PDF page count) may differ from the previous version.
+            set_document_payload(
+                coll, document_id, {"chunk_count": len(seen), "source": filename, **parse_meta}, key="metadata"
+            )
+        else:
+            _record_empty_document(kb_id, document_id)
+        changed = bool(embedded or removed or moved or purged)
+    except Exception as e:
+        _update_doc_status(document_id, DocumentStatus.FAILED, str(e))
+        return {"document_id": document_id, "status": "failed", "error": str(e)}
+    finally:
+        if changed:
+            bump_index_version(kb_id)
+    if cache_stats.hits or cache_stats.misses:
+        logger.info(
+            "Embedding cache for document_id=%s: %d hits, %d misses (%.0f%%)",
+            document_id,
+            cache_stats.hits,
+            cache_stats.misses,
+            cache_stats.hit_rate * 100,
+        )
+        embedding_cache.enforce_limit()
+    task.update_state(state="PROCESSING", meta={"progress": 100, "chunks": len(seen)})
     _update_doc_status(document_id, DocumentStatus.INDEXED)
-    return {"document_id": document_id, "status": "indexed", "chunks": len(chunks)}
+    return {
+        "document_id": document_id,
+        "status": "indexed",
+        "chunks": len(seen),
+        "embedded": embedded,
+        "removed": len(removed),
+        "embedding_cache": cache_stats.as_dict(),
+    }
+
+
+@celery_app.task
+def rebuild_sparse_index(kb_id: int) -> dict:
+    """Rebuild the BM25 inverted index of a KB from its Qdrant collection.
+
+    Queued automatically the first time a partially indexed KB is searched.
+    """
+    coll = ensure_collection(kb_id)
+    client = get_qdrant()
+    db = SessionLocal()
+    indexed = 0
+    try:
+        sparse_index.reset_kb(db, kb_id)
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=coll,
+                offset=offset,
+                limit=256,
+                with_payload=["text", "doc_id"],
+                with_vectors=False,
+            )
+            entries = [
+                (str(p.id), (p.payload or {}).get("doc_id") or 0, (p.payload or {}).get("text") or "")
+                for p in points
+                if (p.payload or {}).get("text")
+            ]
+            indexed += sparse_index.index_chunks(db, kb_id, entries)
+            if offset is None or not points:
+                break
+        sparse_index.mark_complete(db, kb_id)
+        db.commit()
+    finally:
+        db.close()
+        sparse_index.release_backfill(kb_id)
+    bump_index_version(kb_id)
+    return {"kb_id": kb_id, "status": "rebuilt", "chunks": indexed}
+
+
+@celery_app.task
+def evaluate_quantization(kb_id: int, sample_size: int = 50, limit: int = 10) -> dict:
+    """Measure recall and latency of quantized search against the float baseline.
+
+    Stored chunk vectors are used as sample queries; each query's own point is
+    left out of both result lists so it cannot count as a hit.
+    """
+    coll = ensure_collection(kb_id)
+    points, _ = get_qdrant().scroll(
+        collection_name=coll,
+        limit=sample_size,
+        with_payload=False,
+        with_vectors=True,
+    )
+    samples = [(str(p.id), p.vector.get("") if isinstance(p.vector, dict) else p.vector) for p in points]
+    samples = [(point_id, vector) for point_id, vector in samples if vector]
+    report = compare_quantized_search(
+        coll, [vector for _, vector in samples], limit=limit, exclude_ids=[point_id for point_id, _ in samples]
+    )
+    return {"kb_id": kb_id, **report}
@@ -0,0 +1,83 @@
+"""chunk_text scaling on large inputs.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.chunking_scaling --sizes 1 4 16 64
+
+Sizes are in MB of synthetic text. Three shapes are timed: regular prose,
+one unbroken log-like paragraph (sentence splitting, no blank lines) and OCR-like
+word soup without punctuation (word-wrap path). A linear chunker keeps
+``ms/MB`` flat as the size grows.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from app.core.config import settings
+from app.ingestion.chunking import chunk_text
+
+WORDS = "policy employee travel expense security training leave payroll manager review report".split()
+
+
+def _prose(n_chars: int, rng: random.Random) -> str:
+    parts: list[str] = []
+    size = 0
+    while size < n_chars:
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))) + "." for _ in range(4)]
+        para = " ".join(sentences)
+        parts.append(para)
+        size += len(para) + 2
+    return "\n\n".join(parts)
+
+
+def _log(n_chars: int, rng: random.Random) -> str:
+    lines: list[str] = []
+    size = 0
+    while size < n_chars:
+        line = f"{rng.randint(0, 99999):05d} INFO {rng.choice(WORDS)} request completed."
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+def _ocr(n_chars: int, rng: random.Random) -> str:
+    words: list[str] = []
+    size = 0
+    while size < n_chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+SHAPES = {"prose": _prose, "log": _log, "ocr": _ocr}
+
+
+def run(sizes_mb: list[float]) -> None:
+    rng = random.Random(7)
+    print(f"{'shape':<8}{'MB':>6}{'chunks':>10}{'seconds':>10}{'ms/MB':>10}")
+    for shape, make in SHAPES.items():
+        for mb in sizes_mb:
+            text = make(int(mb * 1_000_000), rng)
+            start = time.perf_counter()
+            chunks = chunk_text(
+                text,
+                max_chunk_chars=settings.chunk_max_chars,
+                overlap_chars=settings.chunk_overlap_chars,
+                min_chunk_chars=settings.chunk_min_chars,
+            )
+            elapsed = time.perf_counter() - start
+            print(f"{shape:<8}{mb:>6g}{len(chunks):>10}{elapsed:>10.3f}{1000 * elapsed / mb:>10.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1, 4, 16])
+    args = parser.parse_args()
+    run(args.sizes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Embedding backend throughput.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.embedding_throughput --backends stub sentence-transformers onnx --texts 2000
+    EMBEDDING_ONNX_MODEL_DIR=/models/all-MiniLM-L6-v2-onnx python -m benchmarks.embedding_throughput \
+        --backends onnx onnx-int8
+
+``onnx-int8`` loads ``model_quantized.onnx`` from the same directory. Each
+backend is warmed up once, then timed over the same synthetic chunk texts.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+from app.core.config import settings
+from app.ingestion.embedding import OnnxBackend, create_backend
+
+WORDS = (
+    "policy employee travel expense security training leave benefit payroll manager review "
+    "quarter report customer contract invoice approval deadline project budget access account"
+).split()
+
+
+def synthetic_texts(n: int, words_per_text: int = 90, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(words_per_text)) + "." for _ in range(n)]
+
+
+def load(name: str):
+    if name == "onnx-int8":
+        return OnnxBackend(settings.embedding_onnx_model_dir or "", quantized=True)
+    return create_backend(name)
+
+
+def run(names: list[str], n_texts: int, batch_size: int) -> None:
+    texts = synthetic_texts(n_texts)
+    print(f"{'backend':<24}{'model_id':<36}{'texts/s':>10}{'ms/batch':>10}")
+    for name in names:
+        try:
+            backend = load(name)
+        except Exception as e:
+            print(f"{name:<24}unavailable: {e}")
+            continue
+        backend.encode(texts[:batch_size])
+        start = time.perf_counter()
+        batches = 0
+        for i in range(0, len(texts), batch_size):
+            backend.encode(texts[i : i + batch_size])
+            batches += 1
+        elapsed = time.perf_counter() - start
+        print(f"{name:<24}{backend.model_id:<36}{len(texts) / elapsed:>10.1f}{1000 * elapsed / batches:>10.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["stub", "sentence-transformers", "onnx", "onnx-int8"])
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+    run(args.backends, args.texts, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
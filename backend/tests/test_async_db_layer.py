@@ -0,0 +1,7 @@
+from app.models.base import async_database_url
+
+
+def test_async_database_url_switches_postgres_to_asyncpg():
+    assert async_database_url("postgresql://u:p@db:5432/ragnetic") == "postgresql+asyncpg://u:p@db:5432/ragnetic"
+    assert async_database_url("postgresql+psycopg2://u:p@db/ragnetic") == "postgresql+asyncpg://u:p@db/ragnetic"
+    assert async_database_url("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
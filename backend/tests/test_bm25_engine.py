@@ -0,0 +1,78 @@
+import math
+import random
+
+from app.services.bm25 import TermMatrix, document_sparse_vector, query_sparse_vector, term_id, tokenize
+from app.services.retrieval import _bm25_scores
+
+
+def _reference_bm25(query, docs):
+    """Scalar per-document loop the vectorized engine must reproduce exactly."""
+    tokenized_docs = [tokenize(d) for d in docs]
+    q_terms = tokenize(query)
+    n_docs = len(tokenized_docs)
+    avg_len = sum(len(d) for d in tokenized_docs) / max(1, n_docs)
+    k1, b = 1.2, 0.75
+    df = {}
+    tf_per_doc = []
+    for tokens in tokenized_docs:
+        tf = {}
+        for term in tokens:
+            tf[term] = tf.get(term, 0) + 1
+        tf_per_doc.append(tf)
+        for term in set(tokens):
+            df[term] = df.get(term, 0) + 1
+    scores = []
+    for tokens, tf in zip(tokenized_docs, tf_per_doc):
+        doc_len = max(1, len(tokens))
+        score = 0.0
+        for term in q_terms:
+            if term not in tf:
+                continue
+            term_df = df.get(term, 0)
+            idf = math.log(1 + (n_docs - term_df + 0.5) / (term_df + 0.5))
+            freq = tf[term]
+            denom = freq + k1 * (1 - b + b * (doc_len / max(1e-9, avg_len)))
+            score += idf * ((freq * (k1 + 1)) / max(1e-9, denom))
+        scores.append(score)
+    return scores
+
+
+def test_vectorized_scores_are_identical_to_scalar_loop():
+    rng = random.Random(7)
+    vocab = [f"w{i}" for i in range(40)]
+    docs = [" ".join(rng.choice(vocab) for _ in range(rng.randint(0, 60))) for _ in range(200)]
+    for _ in range(20):
+        query = " ".join(rng.choice(vocab) for _ in range(rng.randint(1, 6)))
+        assert _bm25_scores(query, docs) == _reference_bm25(query, docs)
+
+
+def test_bm25_edge_cases():
+    assert _bm25_scores("anything", []) == []
+    assert _bm25_scores("!!!", ["a b", "c"]) == [0.0, 0.0]
+    assert _bm25_scores("zzz", ["a b", "c"]) == [0.0, 0.0]
+
+
+def test_term_matrix_scores_multiple_queries():
+    matrix = TermMatrix([tokenize("red apple"), tokenize("green apple apple"), tokenize("red car")])
+    assert matrix.doc_freq[matrix.vocab["apple"]] == 2
+    red = matrix.score(["red"])
+    assert red[0] > 0 and red[2] > 0 and red[1] == 0
+    assert matrix.score(["apple"])[1] > matrix.score(["apple"])[0]
+
+
+def test_sparse_vectors_reproduce_bm25_with_store_side_idf():
+    docs = ["red apple pie", "green apple apple", "red car"]
+    tokenized = [tokenize(d) for d in docs]
+    avg_len = sum(len(t) for t in tokenized) / len(tokenized)
+    q_terms = tokenize("apple red apple")
+    q_idx, q_val = query_sparse_vector(q_terms)
+    matrix = TermMatrix(tokenized)
+    expected = matrix.score(q_terms)
+    for i, tokens in enumerate(tokenized):
+        d_idx, d_val = document_sparse_vector(tokens, avg_len)
+        doc = dict(zip(d_idx, d_val))
+        got = 0.0
+        for tid, qv in zip(q_idx, q_val):
+            term = next(t for t in set(q_terms) if term_id(t) == tid)
+            got += qv * doc.get(tid, 0.0) * matrix.idf[matrix.vocab[term]]
+        assert math.isclose(got, expected[i], rel_tol=1e-12, abs_tol=1e-12)
@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 from fastapi import HTTPException
 
@@ -5,7 +7,7 @@ from app.api import routes
 
 
 def test_retrieve_for_chat_returns_sources(monkeypatch):
-    def _fake_hybrid_retrieve(kb_id: int, query: str, top_k: int):
+    async def _fake_hybrid_retrieve(kb_id: int, query: str, top_k: int):
         assert kb_id == 7
         assert query == "pto policy"
         assert top_k == 3
@@ -17,8 +19,8 @@ def test_retrieve_for_chat_returns_sources(monkeypatch):
             }
         ]
 
-    monkeypatch.setattr(routes, "hybrid_retrieve", _fake_hybrid_retrieve)
-    out = routes._retrieve_for_chat(kb_id=7, query="pto policy", limit=3)
+    monkeypatch.setattr(routes, "async_hybrid_retrieve", _fake_hybrid_retrieve)
+    out = asyncio.run(routes._retrieve_for_chat(kb_id=7, query="pto policy", limit=3))
     assert out == [
         {
             "snippet": "PTO policy text",
@@ -29,12 +31,12 @@ def test_retrieve_for_chat_returns_sources(monkeypatch):
 
 
 def test_retrieve_for_chat_raises_http_503_when_backend_fails(monkeypatch):
-    def _boom(*args, **kwargs):
+    async def _boom(*args, **kwargs):
         raise RuntimeError("qdrant unavailable")
 
-    monkeypatch.setattr(routes, "hybrid_retrieve", _boom)
+    monkeypatch.setattr(routes, "async_hybrid_retrieve", _boom)
 
     with pytest.raises(HTTPException) as exc:
-        routes._retrieve_for_chat(kb_id=1, query="hello")
+        asyncio.run(routes._retrieve_for_chat(kb_id=1, query="hello"))
     assert exc.value.status_code == 503
     assert "Retrieval backend unavailable" in str(exc.value.detail)
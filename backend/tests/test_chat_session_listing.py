@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.api import routes
+from app.models.base import Base
+from app.models.chat import ChatMessage, ChatSession
+from app.models.document import KnowledgeBase  # noqa: F401 - table registration
+from app.models.user import User
+
+
+@pytest.fixture
+def chat_db(monkeypatch):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(routes, "SessionLocal", Session)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    db = Session()
+    user = User(id=1, email="a@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    base = datetime(2026, 1, 1)
+    for i in range(7):
+        db.add(
+            ChatSession(
+                id=f"s{i}", user_id=1, knowledge_base_id=1, created_at=base, updated_at=base + timedelta(minutes=i % 4)
+            )
+        )
+        for j in range(i):
+            db.add(ChatMessage(session_id=f"s{i}", role="user", content=f"message {j} " + "x" * (50 * j)))
+    db.commit()
+    db.close()
+    statements.clear()
+    return SimpleNamespace(id=1), statements
+
+
+def test_list_chat_sessions_single_query_with_keyset_pages(chat_db):
+    user, statements = chat_db
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        page, cursor = routes.list_chat_sessions(user=user, limit=3, cursor=cursor)
+        pages += 1
+        seen.extend(page)
+        if cursor is None:
+            break
+    assert pages == 3
+    assert len(statements) == 3
+    assert len({s["session_id"] for s in seen}) == 7
+    keys = [(s["updated_at"], s["created_at"], s["session_id"]) for s in seen]
+    assert keys == sorted(keys, reverse=True)
+
+    by_id = {s["session_id"]: s for s in seen}
+    assert by_id["s0"]["message_count"] == 0
+    assert by_id["s0"]["last_message_preview"] == ""
+    assert by_id["s2"]["message_count"] == 2
+    assert by_id["s2"]["last_message_preview"] == "message 1 " + "x" * 50
+    assert by_id["s6"]["last_message_preview"] == ("message 5 " + "x" * 250)[:140] + "..."
+
+
+def test_list_chat_sessions_rejects_bad_cursor(chat_db):
+    user, _ = chat_db
+    with pytest.raises(HTTPException) as exc:
+        routes.list_chat_sessions(user=user, cursor="not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+def test_session_listing_is_served_by_the_recency_index(chat_db):
+    user, _ = chat_db
+    engine = routes.SessionLocal.kw["bind"]
+    executed = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cur, sql, params, *rest: executed.append((sql, params)))
+    _, cursor = routes.list_chat_sessions(user=user, limit=3)
+    routes.list_chat_sessions(user=user, limit=3, cursor=cursor)
+    sql, params = executed[-1]
+    with engine.connect() as conn:
+        plan = " ".join(str(row[-1]) for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params))
+    assert "ix_chat_sessions_user_recency" in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.ingestion import embedding
+
+
+@pytest.fixture
+def fresh_backend(monkeypatch):
+    monkeypatch.setattr(embedding, "_backend", None)
+    yield
+    embedding._backend = None
+
+
+def test_stub_backend_is_deterministic():
+    backend = embedding.StubBackend()
+    a, b = backend.encode(["hello", "hello"])
+    assert a == b and len(a) == embedding.STUB_DIM
+    assert backend.model_id == embedding.STUB_MODEL_ID
+
+
+def test_create_backend_validates_name_and_onnx_dir(monkeypatch):
+    monkeypatch.setattr(embedding.settings, "embedding_onnx_model_dir", None)
+    with pytest.raises(ValueError):
+        embedding.create_backend("onnx")
+    with pytest.raises(ValueError):
+        embedding.create_backend("tensorflow")
+
+
+def test_model_id_follows_backend(monkeypatch, fresh_backend):
+    monkeypatch.setattr(embedding.settings, "embedding_service_enabled", False)
+    monkeypatch.setattr(embedding.settings, "embedding_backend", "stub")
+    assert embedding.embedding_model_id() == embedding.STUB_MODEL_ID
+    assert embedding.get_embedding_dim() == embedding.STUB_DIM
+
+
+def test_explicit_backend_that_fails_to_load_raises(monkeypatch, fresh_backend):
+    monkeypatch.setattr(embedding.settings, "embedding_service_enabled", False)
+    monkeypatch.setattr(embedding.settings, "embedding_backend", "onnx")
+    monkeypatch.setattr(embedding.settings, "embedding_onnx_model_dir", None)
+    with pytest.raises(ValueError):
+        embedding.embedding_model_id()
+    assert embedding._backend is None
+
+
+def test_embedding_backend_requires_encode():
+    with pytest.raises(TypeError):
+        embedding.EmbeddingBackend()
+
+
+ONNX_DIR = os.environ.get("EMBEDDING_ONNX_MODEL_DIR")
+
+
+@pytest.mark.parametrize("quantized, min_cosine", [(False, 0.999), (True, 0.98)])
+def test_onnx_matches_sentence_transformers(quantized, min_cosine):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("tokenizers")
+    pytest.importorskip("sentence_transformers")
+    if not ONNX_DIR:
+        pytest.skip("EMBEDDING_ONNX_MODEL_DIR not set")
+    model_file = "model_quantized.onnx" if quantized else "model.onnx"
+    if not os.path.exists(os.path.join(ONNX_DIR, model_file)):
+        pytest.skip(f"{model_file} not found in {ONNX_DIR}")
+    try:
+        reference = embedding.SentenceTransformerBackend()
+    except Exception as e:
+        pytest.skip(f"reference model unavailable: {e}")
+
+    texts = [
+        "Employees accrue paid time off monthly.",
+        "Travel expenses are reimbursed within 30 days.",
+        "Security training is mandatory.",
+        "",
+    ]
+    expected = np.asarray(reference.encode(texts))
+    got = np.asarray(embedding.OnnxBackend(ONNX_DIR, quantized=quantized).encode(texts))
+    cosine = (expected * got).sum(axis=1) / (np.linalg.norm(expected, axis=1) * np.linalg.norm(got, axis=1))
+    assert cosine.min() >= min_cosine
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from app.services import embedding_cache
+
+
+class _FakeSession:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def store(monkeypatch):
+    data: dict[tuple[str, str], bytes] = {}
+    embedded: list[list[str]] = []
+    models = {"expected": "m1", "answering": "m1"}
+
+    def fake_get_many(db, model_id, version, hashes):
+        return {h: np.frombuffer(data[model_id, h], dtype="<f4").tolist() for h in hashes if (model_id, h) in data}
+
+    def fake_put_many(db, model_id, version, vectors):
+        for h, vec in vectors.items():
+            data[model_id, h] = np.asarray(vec, dtype="<f4").tobytes()
+
+    def fake_embed(texts):
+        embedded.append(list(texts))
+        scale = 1.0 if models["answering"] == "m1" else -1.0
+        return [[scale * len(t), 0.5] for t in texts], models["answering"]
+
+    monkeypatch.setattr(embedding_cache.settings, "embedding_cache_enabled", True)
+    monkeypatch.setattr(embedding_cache, "SessionLocal", _FakeSession)
+    monkeypatch.setattr(embedding_cache, "get_many", fake_get_many)
+    monkeypatch.setattr(embedding_cache, "put_many", fake_put_many)
+    monkeypatch.setattr(embedding_cache, "embed_texts", fake_embed)
+    monkeypatch.setattr(embedding_cache, "embedding_model_id", lambda: models["expected"])
+    return data, embedded, models
+
+
+def test_embed_cached_only_embeds_misses_once(store):
+    data, embedded, _ = store
+    stats = embedding_cache.EmbeddingCacheStats()
+    first = embedding_cache.embed_cached(["disclaimer", "body", "disclaimer"], stats=stats)
+    assert embedded == [["disclaimer", "body"]]
+    assert first[0] == first[2] == [10.0, 0.5]
+    assert (stats.hits, stats.misses) == (0, 3)
+
+    second = embedding_cache.embed_cached(["disclaimer", "other"], stats=stats)
+    assert embedded[-1] == ["other"]
+    assert second[0] == [10.0, 0.5]
+    assert (stats.hits, stats.misses) == (1, 4)
+    assert stats.as_dict()["hit_rate"] == pytest.approx(0.2)
+
+
+def test_embed_cached_falls_back_when_store_fails(store, monkeypatch):
+    _, embedded, _ = store
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(embedding_cache, "get_many", broken)
+    monkeypatch.setattr(embedding_cache, "put_many", broken)
+    assert embedding_cache.embed_cached(["a", "bb"]) == [[1.0, 0.5], [2.0, 0.5]]
+    assert embedded == [["a", "bb"]]
+
+
+def test_fresh_vectors_are_stored_under_the_model_that_produced_them(store):
+    data, embedded, models = store
+    embedding_cache.embed_cached(["disclaimer"])
+    # The worker is expected to answer but a different model does: nothing from m1 may be mixed in.
+    models["answering"] = "m2"
+    out = embedding_cache.embed_cached(["disclaimer", "body"])
+    assert out == [[-10.0, 0.5], [-4.0, 0.5]]
+    assert embedded[-1] == ["disclaimer", "body"]
+    assert {model for model, _ in data} == {"m1", "m2"}
+    assert len([k for k in data if k[0] == "m2"]) == 2
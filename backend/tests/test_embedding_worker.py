@@ -0,0 +1,133 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+from app.services import embedding_worker
+
+
+@pytest.fixture(autouse=True)
+def _reset_client_state(monkeypatch):
+    monkeypatch.setattr(embedding_worker, "_info", None)
+    monkeypatch.setattr(embedding_worker, "_info_checked_at", None)
+    monkeypatch.setattr(embedding_worker, "_breaker_open_until", 0.0)
+    monkeypatch.setattr(embedding_worker, "_announced_model_id", None)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.lists: dict[str, list] = {}
+        self.values: dict[str, bytes] = {}
+        self.gets = 0
+
+    def get(self, key):
+        self.gets += 1
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value.encode() if isinstance(value, str) else value
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value.encode() if isinstance(value, str) else value)
+
+    def blpop(self, keys, timeout=0):
+        for key in keys:
+            items = self.lists.get(key)
+            if items:
+                return key.encode(), items.pop(0)
+        return None
+
+
+def _request(rid, texts, deadline=None):
+    return json.dumps({"id": rid, "texts": texts, "deadline": deadline or time.time() + 30})
+
+
+def test_collect_batch_groups_requests_up_to_max_texts():
+    r = _FakeRedis()
+    for i in range(4):
+        r.rpush(embedding_worker.REQUEST_KEY, _request(f"r{i}", ["a", "b"]))
+    batch = embedding_worker.collect_batch(r, max_texts=5, max_latency=0.05)
+    assert [req["id"] for req in batch] == ["r0", "r1", "r2"]
+    assert len(r.lists[embedding_worker.REQUEST_KEY]) == 1
+    assert embedding_worker.collect_batch(_FakeRedis(), 5, 0.05, idle_timeout=0) == []
+
+
+def test_process_batch_splits_one_model_call_per_request():
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    requests = [
+        json.loads(_request("r1", ["x", "yy"])),
+        json.loads(_request("expired", ["zzz"], deadline=time.time() - 1)),
+        json.loads(_request("r2", ["wwww"])),
+    ]
+    replies = dict(embedding_worker.process_batch(requests, embed, "m"))
+    assert calls == [["x", "yy", "wwww"]]
+    assert set(replies) == {"ragnetic:embed:reply:r1", "ragnetic:embed:reply:r2"}
+    model_id, _, blob = replies["ragnetic:embed:reply:r1"].partition(b"\0")
+    assert model_id == b"m"
+    r1 = np.frombuffer(blob, dtype="<f4").reshape(2, -1)
+    assert r1.tolist() == [[1.0, 1.0], [2.0, 1.0]]
+
+
+def test_remote_embed_round_trip_and_fallback(monkeypatch):
+    r = _FakeRedis()
+    r.set(embedding_worker.INFO_KEY, json.dumps({"model_id": "m", "dim": 2}))
+    monkeypatch.setattr(embedding_worker, "_get_client", lambda: r)
+    # No worker answered: caller falls back.
+    assert embedding_worker.remote_embed(["a"], timeout=0.01) is None
+    monkeypatch.setattr(embedding_worker, "_breaker_open_until", 0.0)
+
+    original_blpop = r.blpop
+
+    def serving_blpop(keys, timeout=0):
+        if keys[0].startswith(embedding_worker.REPLY_PREFIX):
+            for key, payload in embedding_worker.process_batch(
+                embedding_worker.collect_batch(r, 10, 0, idle_timeout=0), lambda ts: [[0.5, 0.25] for _ in ts], "m"
+            ):
+                r.rpush(key, payload)
+        return original_blpop(keys, timeout)
+
+    r.lists.clear()
+    monkeypatch.setattr(r, "blpop", serving_blpop)
+    assert embedding_worker.remote_embed(["a", "b"], timeout=1) == ([[0.5, 0.25], [0.5, 0.25]], "m")
+
+
+def test_remote_embed_skips_worker_without_heartbeat_and_caches_the_miss(monkeypatch):
+    r = _FakeRedis()
+    monkeypatch.setattr(embedding_worker, "_get_client", lambda: r)
+    for _ in range(5):
+        assert embedding_worker.remote_embed(["a"], timeout=5) is None
+    assert r.gets == 1
+    assert r.lists == {}
+
+
+def test_breaker_opens_after_an_unanswered_request(monkeypatch):
+    r = _FakeRedis()
+    r.set(embedding_worker.INFO_KEY, json.dumps({"model_id": "m", "dim": 2}))
+    monkeypatch.setattr(embedding_worker, "_get_client", lambda: r)
+    assert embedding_worker.remote_embed(["a"], timeout=0.01) is None
+    assert len(r.lists[embedding_worker.REQUEST_KEY]) == 1
+    # While the breaker is open nothing else is queued for the stalled worker.
+    assert embedding_worker.remote_embed(["b"], timeout=0.01) is None
+    assert len(r.lists[embedding_worker.REQUEST_KEY]) == 1
+
+
+def test_local_fallback_only_when_it_runs_the_workers_model(monkeypatch):
+    from app.ingestion import embedding
+
+    r = _FakeRedis()
+    r.set(embedding_worker.INFO_KEY, json.dumps({"model_id": "worker-model", "dim": 2}))
+    monkeypatch.setattr(embedding_worker, "_get_client", lambda: r)
+    monkeypatch.setattr(embedding.settings, "embedding_service_enabled", True)
+    monkeypatch.setattr(embedding, "_backend", embedding.StubBackend())
+    with pytest.raises(embedding.EmbeddingServiceUnavailable):
+        embedding.embed_texts(["a"], timeout=0.01)
+
+    monkeypatch.setattr(embedding.StubBackend, "model_id", "worker-model")
+    vectors, model_id = embedding.embed_texts(["a"], timeout=0.01)
+    assert model_id == "worker-model" and len(vectors[0]) == embedding.STUB_DIM
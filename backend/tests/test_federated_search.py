@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.document import KnowledgeBaseRole
+from app.services import access, retrieval
+from app.services.principal_cache import Principal
+
+
+def test_require_principal_access_many_dedups_in_request_order():
+    principal = Principal(7, "a@example.com", ((1, KnowledgeBaseRole.VIEWER), (2, KnowledgeBaseRole.OWNER)))
+    assert access.require_principal_access_many(principal, [2, 1, 2]) == [2, 1]
+
+
+def test_require_principal_access_many_lists_denied_kbs():
+    principal = Principal(7, "a@example.com", ((1, KnowledgeBaseRole.VIEWER), (2, KnowledgeBaseRole.EDITOR)))
+    with pytest.raises(HTTPException) as exc:
+        access.require_principal_access_many(principal, [1, 2, 3], min_role=KnowledgeBaseRole.EDITOR)
+    assert exc.value.status_code == 403
+    assert "1, 3" in exc.value.detail
+
+
+def test_federated_retrieve_merges_by_rank_and_tags_kb(monkeypatch):
+    async def fake_retrieve(kb_id, query, top_k):
+        await asyncio.sleep(0)
+        scores = {1: [9.0, 8.0], 2: [0.5]}[kb_id]
+        return [{"snippet": f"kb{kb_id}-{i}", "score": s} for i, s in enumerate(scores)]
+
+    monkeypatch.setattr(retrieval, "async_hybrid_retrieve", fake_retrieve)
+    results = asyncio.run(retrieval.federated_retrieve([1, 2], "q", top_k=3))
+    # Raw scores are not comparable across KBs; ranks are.
+    assert [r["snippet"] for r in results] == ["kb1-0", "kb2-0", "kb1-1"]
+    assert [r["kb_id"] for r in results] == [1, 2, 1]
+    assert results[0]["federated_score"] == pytest.approx(1.0 / (retrieval.RRF_K + 1))
+
+
+def test_federated_retrieve_tolerates_partial_failure(monkeypatch):
+    async def fake_retrieve(kb_id, query, top_k):
+        if kb_id == 2:
+            raise RuntimeError("collection down")
+        return [{"snippet": "ok", "score": 1.0}]
+
+    monkeypatch.setattr(retrieval, "async_hybrid_retrieve", fake_retrieve)
+    results = asyncio.run(retrieval.federated_retrieve([1, 2], "q", top_k=5))
+    assert [r["kb_id"] for r in results] == [1]
+
+    async def all_down(kb_id, query, top_k):
+        raise RuntimeError("collection down")
+
+    monkeypatch.setattr(retrieval, "async_hybrid_retrieve", all_down)
+    with pytest.raises(RuntimeError):
+        asyncio.run(retrieval.federated_retrieve([1, 2], "q", top_k=5))
+
+
+def test_search_rejects_too_many_federated_kbs(monkeypatch):
+    from app.api import routes
+
+    monkeypatch.setattr(routes.settings, "retrieval_max_federated_kbs", 2)
+    user = Principal(id=1, email="a@example.com", memberships=((1, "owner"), (2, "owner"), (3, "owner")))
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(routes.search_documents(user=user, query="q", kb_ids=[1, 2, 3]))
+    assert exc.value.status_code == 400
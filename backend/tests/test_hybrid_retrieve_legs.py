@@ -0,0 +1,191 @@
+import asyncio
+
+import pytest
+
+from app.services import retrieval
+from app.services.retrieval import Candidate
+
+
+def _cand(pid, dense=0.0, sparse=0.0):
+    return Candidate(point_id=pid, dense_score=dense, sparse_score=sparse)
+
+
+@pytest.fixture(autouse=True)
+def _fake_hydration(monkeypatch):
+    async def _hydrate(kb_id, candidates):
+        for c in candidates:
+            c.text = f"text {c.point_id}"
+        return candidates
+
+    async def _no_index_version(kb_id):
+        return None
+
+    monkeypatch.setattr(retrieval, "_async_hydrate", _hydrate)
+    monkeypatch.setattr(retrieval, "async_index_version", _no_index_version)
+
+
+def _retrieve(**kwargs):
+    return asyncio.run(retrieval.async_hybrid_retrieve(kb_id=1, query="q", **kwargs))
+
+
+def _returning(candidates):
+    async def _leg(kb_id, query, limit):
+        return candidates
+
+    return _leg
+
+
+def test_legs_run_concurrently(monkeypatch):
+    barrier = None
+
+    async def _dense(kb_id, query, limit):
+        await asyncio.wait_for(barrier.wait(), timeout=2)
+        return [_cand("a", dense=0.9)]
+
+    async def _sparse(kb_id, query, limit):
+        await asyncio.wait_for(barrier.wait(), timeout=2)
+        return [_cand("b", sparse=3.0)]
+
+    async def run():
+        nonlocal barrier
+        barrier = asyncio.Barrier(2)
+        return await retrieval.async_hybrid_retrieve(kb_id=1, query="q", top_k=5, sparse_pool=10)
+
+    monkeypatch.setattr(retrieval, "_async_dense_search", _dense)
+    monkeypatch.setattr(retrieval, "_async_sparse_search", _sparse)
+    out = asyncio.run(run())
+    assert {r["snippet"] for r in out} == {"text a", "text b"}
+
+
+def test_slow_leg_is_dropped(monkeypatch):
+    monkeypatch.setattr(retrieval.settings, "retrieval_sparse_timeout_seconds", 0.05)
+
+    async def _slow_sparse(kb_id, query, limit):
+        await asyncio.sleep(0.5)
+        return [_cand("b", sparse=2.0)]
+
+    monkeypatch.setattr(retrieval, "_async_dense_search", _returning([_cand("a", dense=0.9)]))
+    monkeypatch.setattr(retrieval, "_async_sparse_search", _slow_sparse)
+    out = _retrieve(top_k=5, sparse_pool=10)
+    assert [r["snippet"] for r in out] == ["text a"]
+
+
+def test_both_legs_timing_out_raises(monkeypatch):
+    monkeypatch.setattr(retrieval.settings, "retrieval_dense_timeout_seconds", 0.01)
+    monkeypatch.setattr(retrieval.settings, "retrieval_sparse_timeout_seconds", 0.01)
+
+    async def _slow(kb_id, query, limit):
+        await asyncio.sleep(0.2)
+        return []
+
+    monkeypatch.setattr(retrieval, "_async_dense_search", _slow)
+    monkeypatch.setattr(retrieval, "_async_sparse_search", _slow)
+    with pytest.raises(TimeoutError):
+        _retrieve(top_k=5, sparse_pool=10)
+
+
+def test_server_side_hybrid_skips_client_legs(monkeypatch):
+    async def _server(kb_id, query, dense_limit, sparse_pool, limit):
+        return [_cand("s")]
+
+    async def _unexpected(*args, **kwargs):
+        raise AssertionError("client-side leg should not run")
+
+    monkeypatch.setattr(retrieval.settings, "retrieval_server_side_hybrid", True)
+    monkeypatch.setattr(retrieval, "_async_server_hybrid_search", _server)
+    monkeypatch.setattr(retrieval, "_async_dense_search", _unexpected)
+    monkeypatch.setattr(retrieval, "_async_sparse_search", _unexpected)
+    out = _retrieve(top_k=5, sparse_pool=10)
+    assert [r["snippet"] for r in out] == ["text s"]
+
+
+def test_server_side_hybrid_falls_back_when_unsupported(monkeypatch):
+    async def _unsupported(*args):
+        return None
+
+    monkeypatch.setattr(retrieval.settings, "retrieval_server_side_hybrid", True)
+    monkeypatch.setattr(retrieval, "_async_server_hybrid_search", _unsupported)
+    monkeypatch.setattr(retrieval, "_async_dense_search", _returning([_cand("a", dense=0.5)]))
+    monkeypatch.setattr(retrieval, "_async_sparse_search", _returning([]))
+    out = _retrieve(top_k=5, sparse_pool=10)
+    assert [r["snippet"] for r in out] == ["text a"]
+
+
+def test_only_final_candidates_are_hydrated(monkeypatch):
+    hydrated = []
+
+    async def _hydrate(kb_id, candidates):
+        hydrated.append([c.point_id for c in candidates])
+        return candidates
+
+    monkeypatch.setattr(retrieval, "_async_hydrate", _hydrate)
+    monkeypatch.setattr(
+        retrieval, "_async_dense_search", _returning([_cand(f"d{i}", dense=1 - i / 10) for i in range(8)])
+    )
+    monkeypatch.setattr(retrieval, "_async_sparse_search", _returning([]))
+    _retrieve(top_k=3, rerank_top_n=8, sparse_pool=10)
+    assert hydrated == [["d0", "d1", "d2"]]
+
+
+def test_apply_payloads_fills_text_and_drops_missing_points():
+    class _Point:
+        def __init__(self, pid, payload):
+            self.id = pid
+            self.payload = payload
+
+    cands = [Candidate(point_id="a", doc_id=3), Candidate(point_id="gone")]
+    out = retrieval._apply_payloads(cands, [_Point("a", {"text": "A", "metadata": {"page": 1}, "doc_id": 3})])
+    assert [(c.point_id, c.text, c.metadata, c.doc_id) for c in out] == [("a", "A", {"page": 1}, 3)]
+
+
+def test_server_side_hybrid_reports_per_leg_scores(monkeypatch):
+    from types import SimpleNamespace
+
+    from app.services import qdrant_client
+
+    def point(pid, score):
+        return SimpleNamespace(id=pid, score=score)
+
+    async def fake_query(coll, vector, sparse, dense_limit, sparse_limit, limit, with_payload=True):
+        return [point("a", 0.5), point("b", 0.33)], [point("a", 0.91)], [point("a", 4.2), point("b", 3.1)]
+
+    async def fake_ensure(kb_id):
+        return "coll"
+
+    async def fake_sparse_support(coll):
+        return True
+
+    monkeypatch.setattr(retrieval.settings, "retrieval_server_side_hybrid", True)
+    monkeypatch.setattr(retrieval, "async_ensure_collection", fake_ensure)
+    monkeypatch.setattr(retrieval, "async_has_sparse_vectors", fake_sparse_support)
+    monkeypatch.setattr(retrieval, "async_hybrid_query_collection", fake_query)
+    monkeypatch.setattr(retrieval, "_query_embedding", lambda query: (0.1, 0.2))
+    assert qdrant_client.SPARSE_SUPPORT_TTL_SECONDS > 0
+    out = asyncio.run(retrieval.async_hybrid_retrieve(kb_id=1, query="pto policy", top_k=5, sparse_pool=10))
+    assert [(r["dense_score"], r["sparse_score"]) for r in out] == [(0.91, 4.2), (0.0, 3.1)]
+    assert out[0]["score"] == 0.5
+
+
+def test_sparse_support_is_rechecked_after_its_ttl(monkeypatch):
+    from types import SimpleNamespace
+
+    from app.services import qdrant_client
+
+    now = [100.0]
+    sparse = {"value": {}}
+    lookups = []
+
+    def get_collection(name):
+        lookups.append(name)
+        return SimpleNamespace(config=SimpleNamespace(params=SimpleNamespace(sparse_vectors=sparse["value"])))
+
+    monkeypatch.setattr(qdrant_client.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(qdrant_client, "_sparse_support", {})
+    monkeypatch.setattr(qdrant_client, "get_qdrant", lambda: SimpleNamespace(get_collection=get_collection))
+    assert qdrant_client.has_sparse_vectors("c") is False
+    # The collection is recreated with sparse vectors; the cached answer holds until the TTL passes.
+    sparse["value"] = {qdrant_client.SPARSE_VECTOR_NAME: object()}
+    assert qdrant_client.has_sparse_vectors("c") is False
+    now[0] += qdrant_client.SPARSE_SUPPORT_TTL_SECONDS
+    assert qdrant_client.has_sparse_vectors("c") is True
+    assert lookups == ["c", "c"]
@@ -0,0 +1,182 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.ingestion.chunking import Chunk, chunk_text, iter_chunks
+from app.services import chunk_manifest
+from app.tasks import ingestion
+
+
+def test_iter_chunks_matches_chunk_text():
+    text = "\n\n".join(f"Paragraph {i} has a sentence. And another one here." for i in range(40))
+    streamed = list(iter_chunks(text, max_chunk_chars=120, overlap_chars=20, min_chunk_chars=40))
+    listed = chunk_text(text, max_chunk_chars=120, overlap_chars=20, min_chunk_chars=40)
+    assert [(c.text, c.start_char, c.end_char) for c in streamed] == [
+        (c.text, c.start_char, c.end_char) for c in listed
+    ]
+    assert all("chunk_count" not in c.metadata for c in streamed)
+    assert [c.metadata["chunk_index"] for c in streamed] == list(range(len(listed)))
+
+
+def test_stream_index_pulls_bounded_batches(monkeypatch):
+    text = "\n\n".join(f"Paragraph {i} has a sentence. And another one here." for i in range(40))
+    pulled = []
+
+    def tracked():
+        for chunk in iter_chunks(text, max_chunk_chars=60, overlap_chars=0, min_chunk_chars=10):
+            pulled.append(chunk)
+            yield chunk
+
+    batches = []
+
+    def fake_index_batch(coll, kb_id, document_id, chunks, avg_len, cache_stats=None):
+        # Backpressure: the chunker never runs more than one batch ahead of indexing.
+        assert len(pulled) - sum(len(b) for b in batches) == len(chunks)
+        batches.append(chunks)
+
+    progress = []
+    monkeypatch.setattr(ingestion, "_index_batch", fake_index_batch)
+    total = ingestion._stream_index(
+        "coll", 1, 9, chunk_manifest.assign_ids(1, 9, tracked()), None, batch_size=8, on_batch=lambda done, last: progress.append(done)
+    )
+    assert total == len(pulled) == 40
+    assert [len(b) for b in batches] == [8, 8, 8, 8, 8]
+    assert progress == [8, 16, 24, 32, 40]
+
+
+def _chunks(texts):
+    return [Chunk(text=t, metadata={"chunk_index": i}, start_char=0, end_char=len(t)) for i, t in enumerate(texts)]
+
+
+def test_chunk_ids_are_deterministic_and_separate_repeats():
+    first = list(chunk_manifest.assign_ids(1, 9, _chunks(["intro", "body", "intro"])))
+    again = list(chunk_manifest.assign_ids(1, 9, _chunks(["intro", "body", "intro"])))
+    assert [e[0] for e in first] == [e[0] for e in again]
+    assert len({e[0] for e in first}) == 3
+    assert first[0][1] == first[2][1]
+    other_doc = list(chunk_manifest.assign_ids(1, 10, _chunks(["intro"])))
+    assert other_doc[0][0] != first[0][0]
+
+
+def test_changed_chunks_only_yields_new_content():
+    old = list(chunk_manifest.assign_ids(1, 9, _chunks(["keep a", "drop b", "keep c"])))
+    previous = {pid: (digest, chunk_manifest.position(c)) for pid, digest, c in old}
+    seen, moved = set(), []
+    new = list(chunk_manifest.assign_ids(1, 9, _chunks(["keep a", "keep c", "new d"])))
+    fresh = list(ingestion._changed_chunks(new, previous, seen, moved))
+    assert [c.text for _, _, c in fresh] == ["new d"]
+    assert moved == [(old[2][0], old[2][1], (1, None, None))]
+    assert [pid for pid in previous if pid not in seen] == [old[1][0]]
+
+
+@pytest.fixture
+def ingest_env(monkeypatch):
+    """Runs ``_ingest_object`` against an in-memory manifest, recording index side effects."""
+    env = SimpleNamespace(manifest={}, events=[], patches=[], doc_payloads=[], pages=[], parse_meta={})
+
+    class _DB:
+        def commit(self):
+            pass
+
+        def close(self):
+            pass
+
+    def record(db, document_id, entries):
+        for point_id, digest, pos in entries:
+            env.manifest[point_id] = (digest, pos)
+
+    def remove(db, document_id, point_ids):
+        for point_id in point_ids:
+            env.manifest.pop(point_id, None)
+
+    def index_batch(coll, kb_id, document_id, entries, avg_len, cache_stats=None):
+        env.events.append(("index", [c.text for _, _, c in entries]))
+        record(None, document_id, [(p, d, chunk_manifest.position(c)) for p, d, c in entries])
+
+    monkeypatch.setattr(ingestion, "parse_document_pages", lambda source, filename: (iter(env.pages), env.parse_meta))
+    monkeypatch.setattr(ingestion, "ensure_collection", lambda kb_id: "coll")
+    monkeypatch.setattr(ingestion, "SessionLocal", _DB)
+    monkeypatch.setattr(ingestion.sparse_index, "average_length", lambda db, kb_id: None)
+    monkeypatch.setattr(ingestion.sparse_index, "remove_points", lambda db, kb_id, ids: len(ids))
+    monkeypatch.setattr(
+        ingestion.sparse_index, "remove_document", lambda db, kb_id, doc_id: env.events.append(("purge_sparse", doc_id)) or 3
+    )
+    monkeypatch.setattr(
+        ingestion.sparse_index, "mark_empty_document", lambda db, kb_id, doc_id: env.events.append(("empty", doc_id))
+    )
+    monkeypatch.setattr(ingestion, "delete_document_points", lambda coll, doc_id: env.events.append(("purge", doc_id)))
+    monkeypatch.setattr(ingestion.chunk_manifest, "record", record)
+    monkeypatch.setattr(ingestion.chunk_manifest, "remove", remove)
+    monkeypatch.setattr(ingestion, "_index_batch", index_batch)
+    monkeypatch.setattr(ingestion, "delete_points", lambda coll, ids: env.events.append(("delete", list(ids))))
+    monkeypatch.setattr(
+        ingestion, "set_points_payload", lambda coll, updates, key=None: env.patches.extend(updates)
+    )
+    monkeypatch.setattr(
+        ingestion, "set_document_payload", lambda coll, doc_id, payload, key=None: env.doc_payloads.append(payload)
+    )
+    monkeypatch.setattr(ingestion, "bump_index_version", lambda kb_id: env.events.append(("bump", kb_id)))
+    monkeypatch.setattr(ingestion, "_update_doc_status", lambda doc_id, status, error=None: None)
+
+    def run():
+        env.events.clear()
+        env.patches.clear()
+        env.doc_payloads.clear()
+        task = SimpleNamespace(update_state=lambda **kwargs: None)
+        obj = SimpleNamespace(source=b"", size=sum(len(p) for p in env.pages))
+        return ingestion._ingest_object(task, 9, 1, "doc.txt", dict(env.manifest), obj)
+
+    env.run = run
+    return env
+
+
+def test_document_without_manifest_is_purged_before_indexing(ingest_env):
+    ingest_env.pages = ["Legacy content indexed with random point IDs. " * 3]
+    out = ingest_env.run()
+    assert out["status"] == "indexed"
+    kinds = [e[0] for e in ingest_env.events]
+    assert kinds[:3] == ["purge", "purge_sparse", "index"]
+
+    # With a manifest in place, re-ingestion reconciles by point ID instead.
+    ingest_env.run()
+    assert not any(e[0].startswith("purge") for e in ingest_env.events)
+
+
+def test_empty_replacement_of_legacy_document_still_purges(ingest_env):
+    ingest_env.pages = []
+    out = ingest_env.run()
+    assert out["chunks"] == 0
+    assert [e[0] for e in ingest_env.events] == ["purge", "purge_sparse", "bump", "empty"]
+
+
+def test_document_that_loses_all_chunks_is_recorded_as_empty(ingest_env):
+    ingest_env.pages = ["Some content that is long enough to become a chunk of its own. " * 2]
+    ingest_env.run()
+    assert ("empty", 9) not in ingest_env.events
+    ingest_env.pages = []
+    out = ingest_env.run()
+    assert out["chunks"] == 0 and out["removed"] == 1
+    assert ("empty", 9) in ingest_env.events
+
+
+def test_prepending_a_page_updates_page_provenance(ingest_env, monkeypatch):
+    monkeypatch.setattr(ingestion.settings, "chunk_max_chars", 120)
+    monkeypatch.setattr(ingestion.settings, "chunk_overlap_chars", 0)
+    monkeypatch.setattr(ingestion.settings, "chunk_min_chars", 20)
+    body = [f"Page {i} talks about topic {i} in a sentence long enough to stand alone as a chunk." for i in range(3)]
+    ingest_env.pages = body
+    ingest_env.parse_meta = {"pages": 3}
+    ingest_env.run()
+    before = dict(ingest_env.manifest)
+    assert len(before) == 3 and all(pos[1] is not None for _, pos in before.values())
+
+    ingest_env.pages = ["A new cover page that was inserted in front of everything else in the file."] + body
+    ingest_env.parse_meta = {"pages": 4}
+    out = ingest_env.run()
+    assert out["embedded"] == 1
+    patches = dict(ingest_env.patches)
+    assert set(patches) == set(before)
+    for point_id, (_, (index, start, end)) in before.items():
+        assert patches[point_id] == {"chunk_index": index + 1, "page_start": start + 1, "page_end": end + 1}
+        assert ingest_env.manifest[point_id][1] == (index + 1, start + 1, end + 1)
+    assert ingest_env.doc_payloads[-1]["pages"] == 4
@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import pytest
+
+from app.ingestion.parsers import parse_document, parse_document_pages
+from app.services import storage
+
+
+class _FakeResponse:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.closed = False
+
+    def stream(self, amt):
+        for i in range(0, len(self.data), amt):
+            yield self.data[i : i + amt]
+
+    def close(self):
+        self.closed = True
+
+    def release_conn(self):
+        pass
+
+
+class _FakeClient:
+    def __init__(self, data: bytes):
+        self.response = _FakeResponse(data)
+
+    def get_object(self, bucket, key):
+        return self.response
+
+
+@pytest.fixture
+def fake_store(monkeypatch):
+    def install(data: bytes) -> _FakeClient:
+        client = _FakeClient(data)
+        monkeypatch.setattr(storage, "_get_client", lambda: client)
+        monkeypatch.setattr(storage, "OBJECT_READ_CHUNK_BYTES", 64)
+        return client
+
+    return install
+
+
+def test_small_object_stays_in_memory(fake_store):
+    client = fake_store(b"hello world")
+    with storage.open_object("k", spool_threshold=1024) as obj:
+        assert obj.path is None
+        assert obj.source == b"hello world"
+        assert obj.size == 11
+    assert client.response.closed
+
+
+def test_large_object_spools_to_temp_file(fake_store):
+    data = bytes(range(256)) * 10
+    fake_store(data)
+    obj = storage.open_object("k", spool_threshold=300)
+    path = obj.path
+    assert isinstance(obj.source, Path)
+    assert path.read_bytes() == data
+    assert obj.size == len(data)
+    obj.close()
+    assert not path.exists()
+
+
+def test_parsers_read_spooled_files(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes("café\n\nsecond paragraph".encode())
+    assert parse_document(path, "notes.txt") == parse_document(path.read_bytes(), "notes.txt")
+    parts, meta = parse_document_pages(path, "notes.txt")
+    assert list(parts) == ["café\n\nsecond paragraph"]
+    empty = tmp_path / "empty.md"
+    empty.write_bytes(b"")
+    assert parse_document(empty, "empty.md") == ("", {})
+
+
+def test_pdf_opens_from_path(tmp_path):
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    for i in range(3):
+        doc.new_page().insert_text((72, 72), f"Page {i + 1}")
+    data = doc.tobytes()
+    doc.close()
+    path = tmp_path / "object"
+    path.write_bytes(data)
+    from_path, meta = parse_document_pages(path, "manual.pdf")
+    from_bytes, _ = parse_document_pages(data, "manual.pdf")
+    assert meta == {"pages": 3}
+    assert list(from_path) == list(from_bytes)
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import auth
+from app.services.password_hashing import HashingPool, HashingPoolBusy
+
+
+def test_pool_bounds_concurrency_and_rejects_overflow():
+    pool = HashingPool(workers=2, max_queue=1)
+    release = threading.Event()
+    active = []
+    peak = []
+
+    def slow(i):
+        active.append(i)
+        peak.append(len(active))
+        release.wait(5)
+        active.remove(i)
+        return i * 2
+
+    async def scenario():
+        jobs = [asyncio.create_task(pool.run(slow, i)) for i in range(3)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(HashingPoolBusy):
+            await pool.run(slow, 99)
+        stats = pool.stats()
+        release.set()
+        return await asyncio.gather(*jobs), stats
+
+    results, busy_stats = asyncio.run(scenario())
+    assert results == [0, 2, 4]
+    assert max(peak) == 2
+    assert busy_stats["running"] == 2
+    assert busy_stats["queued"] == 1
+    assert busy_stats["rejected"] == 1
+    stats = pool.stats()
+    assert stats["completed"] == 3
+    assert stats["running"] == 0 and stats["queued"] == 0
+
+
+def test_saturated_pool_returns_503_with_retry_after(monkeypatch):
+    class _Busy:
+        async def run(self, fn, *args):
+            raise HashingPoolBusy("full")
+
+    monkeypatch.setattr(auth, "hashing_pool", _Busy())
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(auth._run_hashing(len, "secret"))
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "1"
+
+
+def test_cancelled_caller_keeps_its_slot_until_the_job_finishes():
+    pool = HashingPool(workers=1, max_queue=0)
+    release = threading.Event()
+
+    async def scenario():
+        job = asyncio.create_task(pool.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        job.cancel()
+        await asyncio.sleep(0)
+        with pytest.raises(HashingPoolBusy):
+            await pool.run(len, "x")
+        release.set()
+        await asyncio.sleep(0.05)
+        return await pool.run(len, "x")
+
+    assert asyncio.run(scenario()) == 1
+    stats = pool.stats()
+    assert stats["completed"] == 2 and stats["rejected"] == 1
+    assert stats["running"] == 0 and stats["queued"] == 0
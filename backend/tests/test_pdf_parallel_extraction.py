@@ -0,0 +1,74 @@
+import pytest
+
+from app.core.config import settings
+from app.ingestion import parsers
+
+fitz = pytest.importorskip("fitz")
+
+
+def _make_pdf(n_pages: int) -> bytes:
+    doc = fitz.open()
+    for i in range(n_pages):
+        doc.new_page().insert_text((72, 72), f"Page number {i + 1} body text.")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def parallel_settings(monkeypatch):
+    monkeypatch.setattr(settings, "pdf_parallel_min_pages", 5)
+    monkeypatch.setattr(settings, "pdf_parallel_range_pages", 3)
+    monkeypatch.setattr(settings, "pdf_parallel_workers", 2)
+
+
+def _serial_pages(content: bytes) -> list[str]:
+    doc = fitz.open(stream=content, filetype="pdf")
+    return list(parsers._pdf_pages(doc))
+
+
+def test_parallel_extraction_keeps_page_order(parallel_settings):
+    content = _make_pdf(11)
+    pages, meta = parsers._parse_pdf_pages(content)
+    assert meta == {"pages": 11}
+    assert not isinstance(pages, list)
+    assert list(pages) == _serial_pages(content)
+
+
+def test_parallel_extraction_falls_back_to_serial(parallel_settings, monkeypatch):
+    class DaemonicPool:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def submit(self, *args):
+            raise AssertionError("daemonic processes are not allowed to have children")
+
+    monkeypatch.setattr(parsers, "ProcessPoolExecutor", DaemonicPool)
+    content = _make_pdf(7)
+    pages, _ = parsers._parse_pdf_pages(content)
+    assert list(pages) == _serial_pages(content)
+
+
+def test_small_pdf_stays_serial(parallel_settings, monkeypatch):
+    monkeypatch.setattr(parsers, "_parallel_pdf_pages", lambda *a: pytest.fail("parallel path used"))
+    content = _make_pdf(4)
+    pages, meta = parsers._parse_pdf_pages(content)
+    assert meta == {"pages": 4}
+    assert len(list(pages)) == 4
+
+
+def test_daemonic_process_reads_serially_without_starting_a_pool(parallel_settings, monkeypatch):
+    class _Daemon:
+        daemon = True
+
+    monkeypatch.setattr(parsers.multiprocessing, "current_process", lambda: _Daemon())
+    monkeypatch.setattr(parsers, "_parallel_pdf_pages", lambda *a: pytest.fail("parallel path used"))
+    content = _make_pdf(7)
+    pages, _ = parsers._parse_pdf_pages(content)
+    assert list(pages) == _serial_pages(content)
@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.document import KnowledgeBaseRole
+from app.services import access, principal_cache as pc
+from app.services.principal_cache import Principal, PrincipalCache
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+
+class _Row(tuple):
+    @property
+    def id(self):
+        return self[0]
+
+    @property
+    def email(self):
+        return self[1]
+
+
+class _FakeAsyncSession:
+    def __init__(self, memberships):
+        self.memberships = memberships
+        self.queries = 0
+
+    async def execute(self, stmt):
+        self.queries += 1
+        if self.queries % 2:
+            return _Result([_Row((7, "a@example.com"))])
+        return _Result(self.memberships)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError("redis down")
+
+    def get(self, key):
+        self._check()
+        return self.values.get(key)
+
+    def incr(self, key):
+        self._check()
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+
+class _FakeAsyncRedis:
+    def __init__(self, sync):
+        self.sync = sync
+
+    async def get(self, key):
+        return self.sync.get(key)
+
+    async def incr(self, key):
+        return self.sync.incr(key)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = _FakeRedis()
+    monkeypatch.setattr(pc, "get_redis", lambda: fake)
+    monkeypatch.setattr(pc, "get_async_redis", lambda: _FakeAsyncRedis(fake))
+    monkeypatch.setattr(pc, "_breaker", pc.RedisBreaker("test"))
+    return fake
+
+
+@pytest.fixture
+def cache(monkeypatch, redis):
+    fresh = PrincipalCache(max_entries=10, ttl_seconds=60)
+    monkeypatch.setattr(pc, "principal_cache", fresh)
+    return fresh
+
+
+def test_principal_is_loaded_once_then_served_from_cache(cache):
+    db = _FakeAsyncSession([(3, KnowledgeBaseRole.OWNER), (5, KnowledgeBaseRole.VIEWER)])
+    first = asyncio.run(pc.async_load_principal(db, "a@example.com"))
+    second = asyncio.run(pc.async_load_principal(db, "a@example.com"))
+    assert first == second == Principal(7, "a@example.com", ((3, "owner"), (5, "viewer")))
+    assert db.queries == 2
+    assert cache.stats()["hits"] == 1
+
+
+def test_invalidation_in_another_process_is_seen_on_next_hit(cache, redis):
+    db = _FakeAsyncSession([(3, KnowledgeBaseRole.OWNER)])
+    asyncio.run(pc.async_load_principal(db, "a@example.com"))
+    assert asyncio.run(pc.async_load_principal(db, "a@example.com")) is not None
+    assert db.queries == 2
+    # Another API process commits a removal: only the shared version counter moves here.
+    db.memberships = []
+    redis.incr(pc.VERSION_KEY.format(user_id=7))
+    assert asyncio.run(pc.async_load_principal(db, "a@example.com")).memberships == ()
+    assert db.queries == 4
+    assert asyncio.run(pc.async_load_principal(db, "a@example.com")).memberships == ()
+    assert db.queries == 4
+
+
+def test_cached_principal_is_served_while_redis_is_down(cache, redis):
+    db = _FakeAsyncSession([(3, KnowledgeBaseRole.OWNER)])
+    asyncio.run(pc.async_load_principal(db, "a@example.com"))
+    redis.down = True
+    pc.invalidate_user(99)
+    assert asyncio.run(pc.async_load_principal(db, "a@example.com")) is not None
+    assert db.queries == 2
+
+
+def test_invalidation_drops_entry_and_blocks_racing_put(cache):
+    principal = Principal(7, "a@example.com", ((3, KnowledgeBaseRole.OWNER),))
+    cache.put("a@example.com", principal, cache.generation)
+    stale_generation = cache.generation
+    cache.invalidate_user(7)
+    assert cache.get("a@example.com") is None
+    cache.put("a@example.com", principal, stale_generation)
+    assert cache.get("a@example.com") is None
+    cache.put("a@example.com", principal, cache.generation, version=4)
+    assert cache.get("a@example.com") == (principal, 4)
+
+
+def test_expired_entries_are_reloaded(monkeypatch, cache):
+    now = [100.0]
+    monkeypatch.setattr(pc.time, "monotonic", lambda: now[0])
+    cache.put("a@example.com", Principal(7, "a@example.com"), cache.generation)
+    assert cache.get("a@example.com") is not None
+    now[0] += 61
+    assert cache.get("a@example.com") is None
+
+
+def test_principal_access_checks():
+    principal = Principal(7, "a@example.com", ((3, KnowledgeBaseRole.VIEWER), (5, KnowledgeBaseRole.EDITOR)))
+    assert access.principal_default_kb_id(principal) == 3
+    assert access.principal_default_kb_id(principal, KnowledgeBaseRole.EDITOR) == 5
+    assert access.principal_default_kb_id(principal, KnowledgeBaseRole.OWNER) is None
+    assert access.require_principal_access(principal, 5, KnowledgeBaseRole.EDITOR) == KnowledgeBaseRole.EDITOR
+    with pytest.raises(HTTPException) as exc:
+        access.require_principal_access(principal, 3, KnowledgeBaseRole.EDITOR)
+    assert exc.value.status_code == 403
+    assert access.require_principal_access_many(principal, [5, 3, 5]) == [5, 3]
+    with pytest.raises(HTTPException):
+        access.require_principal_access_many(principal, [3, 9])
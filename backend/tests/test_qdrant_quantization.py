@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import pytest
+from qdrant_client.models import BinaryQuantization, ScalarQuantization
+
+from app.services import qdrant_client
+
+
+@pytest.fixture
+def quant_settings(monkeypatch):
+    def apply(mode="none", overrides=None):
+        monkeypatch.setattr(qdrant_client.settings, "qdrant_quantization", mode)
+        monkeypatch.setattr(qdrant_client.settings, "qdrant_quantization_kb_overrides", overrides or {})
+
+    return apply
+
+
+def test_quantization_mode_uses_kb_override(quant_settings):
+    quant_settings("scalar", {7: "binary"})
+    assert qdrant_client.quantization_mode(1) == "scalar"
+    assert qdrant_client.quantization_mode(7) == "binary"
+    quant_settings("int4")
+    with pytest.raises(ValueError):
+        qdrant_client.quantization_mode(1)
+
+
+def test_quantized_collections_keep_originals_on_disk():
+    assert qdrant_client._quantization_config("none") is None
+    assert isinstance(qdrant_client._quantization_config("scalar"), ScalarQuantization)
+    assert isinstance(qdrant_client._quantization_config("binary"), BinaryQuantization)
+    assert not qdrant_client._vectors_config("none").on_disk
+    assert qdrant_client._vectors_config("binary").on_disk
+
+
+def test_search_params_only_when_quantization_enabled(quant_settings, monkeypatch):
+    quant_settings("none")
+    assert qdrant_client._search_params() is None
+    quant_settings("none", {3: "scalar"})
+    monkeypatch.setattr(qdrant_client.settings, "qdrant_quantization_oversampling", 3.0)
+    params = qdrant_client._search_params()
+    assert params.quantization.rescore is True
+    assert params.quantization.oversampling == 3.0
+
+
+def test_compare_quantized_search_reports_recall(quant_settings, monkeypatch):
+    quant_settings("binary")
+
+    def fake_search(collection, vector, limit, with_payload=True, search_params=None):
+        ids = ["a", "b"] if search_params.quantization.ignore else ["a", "c"]
+        return [SimpleNamespace(id=i) for i in ids]
+
+    monkeypatch.setattr(qdrant_client, "search_collection", fake_search)
+    report = qdrant_client.compare_quantized_search("coll", [[0.1, 0.2], [0.3, 0.4]], limit=2)
+    assert report["queries"] == 2
+    assert report["recall"] == pytest.approx(0.5)
+    assert report["baseline_ms"] >= 0 and report["quantized_ms"] >= 0
+
+
+def test_compare_quantized_search_excludes_the_query_point(quant_settings, monkeypatch):
+    quant_settings("scalar")
+    widths = []
+
+    def fake_search(collection, vector, limit, with_payload=True, search_params=None):
+        widths.append(limit)
+        ids = ["self", "a", "b"] if search_params.quantization.ignore else ["self", "a", "c"]
+        return [SimpleNamespace(id=i) for i in ids[:limit]]
+
+    monkeypatch.setattr(qdrant_client, "search_collection", fake_search)
+    report = qdrant_client.compare_quantized_search("coll", [[0.1, 0.2]], limit=2, exclude_ids=["self"])
+    assert widths == [3, 3]
+    assert report["recall"] == pytest.approx(0.5)
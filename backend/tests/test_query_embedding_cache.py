@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from app.services import query_embedding_cache
+
+
+@pytest.fixture(autouse=True)
+def _closed_breaker(monkeypatch):
+    monkeypatch.setattr(query_embedding_cache, "_breaker", query_embedding_cache.RedisBreaker("test"))
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+
+
+def test_query_vectors_round_trip_as_float32(monkeypatch):
+    fake = _FakeRedis()
+    monkeypatch.setattr(query_embedding_cache, "get_redis", lambda: fake)
+    monkeypatch.setattr(query_embedding_cache, "embedding_model_id", lambda: "m1")
+    vector = [0.1, -0.25, 0.5, 1.0]
+    query_embedding_cache.put("what is pto", vector, "m1")
+
+    (raw,) = fake.store.values()
+    assert len(raw) == 4 * len(vector)
+    out = query_embedding_cache.get("what is pto")
+    assert np.allclose(out, vector, atol=1e-7)
+    assert query_embedding_cache.get("other query") is None
+    # Vectors are keyed on the model that produced them, not the one expected at lookup time.
+    query_embedding_cache.put("from fallback", vector, "m2")
+    assert query_embedding_cache.get("from fallback") is None
+
+
+def test_query_cache_degrades_when_redis_is_down(monkeypatch):
+    calls = []
+
+    class _Down:
+        def get(self, key):
+            calls.append("get")
+            raise ConnectionError("down")
+
+        def set(self, *args, **kwargs):
+            calls.append("set")
+            raise ConnectionError("down")
+
+    monkeypatch.setattr(query_embedding_cache, "get_redis", lambda: _Down())
+    query_embedding_cache.put("q", [1.0], "m1")
+    assert query_embedding_cache.get("q") is None
+    query_embedding_cache.put("q", [1.0], "m1")
+    # The first failure opens the breaker; later calls skip Redis instead of timing out.
+    assert calls == ["set"]
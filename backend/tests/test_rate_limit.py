@@ -1,4 +1,7 @@
-from app.services.rate_limit import RateLimiter
+import asyncio
+
+from app.services import rate_limit
+from app.services.rate_limit import RateLimiter, RedisRateLimiter
 
 
 def test_rate_limiter_blocks_after_limit():
@@ -10,3 +13,75 @@ def test_rate_limiter_blocks_after_limit():
     assert ok2 is True
     assert ok3 is False
     assert retry >= 1
+
+
+def test_rate_limiter_evicts_idle_and_excess_keys(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    limiter = RateLimiter(max_keys=3)
+    for i in range(3):
+        limiter.hit(f"user:{i}", limit=5, window_seconds=10)
+    assert len(limiter) == 3
+    limiter.hit("user:3", limit=5, window_seconds=10)
+    assert len(limiter) == 3
+
+    now[0] += 11
+    limiter.hit("user:4", limit=5, window_seconds=10)
+    assert len(limiter) == 1
+
+
+class _FakeScript:
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = []
+
+    def __call__(self, keys, args):
+        self.calls.append((keys, args))
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class _FakeRedis:
+    def __init__(self, script):
+        self.script = script
+
+    def register_script(self, source):
+        assert "ZREMRANGEBYSCORE" in source
+        return self.script
+
+
+def test_redis_limiter_uses_one_script_call_per_hit(monkeypatch):
+    script = _FakeScript([[1, 0], [0, 1500]])
+    monkeypatch.setattr(rate_limit, "get_redis", lambda: _FakeRedis(script))
+    limiter = RedisRateLimiter(RateLimiter())
+
+    assert limiter.hit("search:user:1", limit=2, window_seconds=60) == (True, 0)
+    assert limiter.hit("search:user:1", limit=2, window_seconds=60) == (False, 2)
+    keys, args = script.calls[0]
+    assert keys == ["ragnetic:ratelimit:search:user:1"]
+    assert args[:2] == [60_000, 2]
+    assert script.calls[0][1][2] != script.calls[1][1][2]
+
+
+def test_redis_limiter_falls_back_while_redis_is_down(monkeypatch):
+    script = _FakeScript([ConnectionError("down")])
+    monkeypatch.setattr(rate_limit, "get_redis", lambda: _FakeRedis(script))
+    limiter = RedisRateLimiter(RateLimiter(), retry_seconds=30)
+
+    assert limiter.hit("k", limit=1, window_seconds=60) == (True, 0)
+    allowed, retry = limiter.hit("k", limit=1, window_seconds=60)
+    assert allowed is False and retry >= 1
+    assert len(script.calls) == 1
+
+
+def test_async_redis_limiter(monkeypatch):
+    class _AsyncScript(_FakeScript):
+        async def __call__(self, keys, args):
+            return super().__call__(keys, args)
+
+    script = _AsyncScript([[0, 250]])
+    monkeypatch.setattr(rate_limit, "get_async_redis", lambda: _FakeRedis(script))
+    limiter = RedisRateLimiter(RateLimiter())
+    assert asyncio.run(limiter.async_hit("k", limit=1, window_seconds=1)) == (False, 1)
@@ -0,0 +1,114 @@
+import asyncio
+
+from app.services import retrieval, retrieval_cache
+from app.services.retrieval import Candidate
+from app.services.retrieval_cache import RetrievalCache, cache_key
+
+
+def test_cache_evicts_least_recently_used_and_counts():
+    cache = RetrievalCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", [{"snippet": "A"}])
+    cache.put("b", [{"snippet": "B"}])
+    assert cache.get("a") == [{"snippet": "A"}]
+    cache.put("c", [{"snippet": "C"}])
+    assert cache.get("b") is None
+    assert cache.get("c") == [{"snippet": "C"}]
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+
+
+def test_cache_entries_expire():
+    cache = RetrievalCache(max_entries=4, ttl_seconds=0)
+    cache.put("a", [{"snippet": "A"}])
+    assert cache.get("a") is None
+
+
+def test_cache_key_changes_with_index_version_and_skips_without_version():
+    assert cache_key(1, None, "q", 5) is None
+    assert cache_key(1, 1, "what  is pto", 5) == cache_key(1, 1, "what is pto", 5)
+    assert cache_key(1, 1, "q", 5) != cache_key(1, 2, "q", 5)
+
+
+async def _unchanged(kb_id, candidates):
+    return candidates
+
+
+def _retrieve(**kwargs):
+    return asyncio.run(retrieval.async_hybrid_retrieve(kb_id=9, query="pto", top_k=5, **kwargs))
+
+
+def test_hybrid_retrieve_serves_repeat_queries_from_cache(monkeypatch):
+    calls = []
+
+    async def _dense(kb_id, query, limit):
+        calls.append(query)
+        return [Candidate(point_id="a", text="A", doc_id=1, dense_score=0.9)]
+
+    async def _sparse(kb_id, query, limit):
+        return []
+
+    async def _index_version(kb_id):
+        return version["v"]
+
+    cache = RetrievalCache(max_entries=8, ttl_seconds=60)
+    version = {"v": 3}
+    monkeypatch.setattr(retrieval, "result_cache", cache)
+    monkeypatch.setattr(retrieval, "async_index_version", _index_version)
+    monkeypatch.setattr(retrieval, "_async_dense_search", _dense)
+    monkeypatch.setattr(retrieval, "_async_sparse_search", _sparse)
+    monkeypatch.setattr(retrieval, "_async_hydrate", _unchanged)
+
+    first = _retrieve()
+    second = _retrieve()
+    assert first == second
+    assert len(calls) == 1
+
+    version["v"] = 4
+    _retrieve()
+    assert len(calls) == 2
+
+
+def test_results_with_a_dropped_leg_are_not_cached(monkeypatch):
+    calls = []
+
+    async def _slow_dense(kb_id, query, limit):
+        calls.append(query)
+        await asyncio.sleep(0.2)
+        return [Candidate(point_id="a", text="A", doc_id=1, dense_score=0.9)]
+
+    async def _sparse(kb_id, query, limit):
+        return [Candidate(point_id="b", text="B", sparse_score=1.0)]
+
+    async def _index_version(kb_id):
+        return 1
+
+    cache = RetrievalCache(max_entries=8, ttl_seconds=60)
+    monkeypatch.setattr(retrieval.settings, "retrieval_dense_timeout_seconds", 0.02)
+    monkeypatch.setattr(retrieval, "result_cache", cache)
+    monkeypatch.setattr(retrieval, "async_index_version", _index_version)
+    monkeypatch.setattr(retrieval, "_async_dense_search", _slow_dense)
+    monkeypatch.setattr(retrieval, "_async_sparse_search", _sparse)
+    monkeypatch.setattr(retrieval, "_async_hydrate", _unchanged)
+
+    _retrieve(sparse_pool=10)
+    _retrieve(sparse_pool=10)
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_index_version_skips_redis_after_a_failure(monkeypatch):
+    calls = []
+
+    class _Down:
+        async def get(self, key):
+            calls.append(key)
+            raise ConnectionError("down")
+
+    monkeypatch.setattr(retrieval_cache, "_breaker", retrieval_cache.RedisBreaker("test"))
+    monkeypatch.setattr(retrieval_cache, "get_async_redis", lambda: _Down())
+    assert asyncio.run(retrieval_cache.async_index_version(1)) is None
+    assert asyncio.run(retrieval_cache.async_index_version(1)) is None
+    assert len(calls) == 1
@@ -0,0 +1,104 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.base import Base
+from app.models.document import Document, DocumentStatus, KnowledgeBase
+from app.models.sparse_index import SparseIndexDocument, SparseIndexEmptyDocument, SparseIndexStats
+from app.models.user import User  # noqa: F401 - mapper registration
+from app.services import sparse_index
+from app.services.bm25 import tokenize
+from app.services.retrieval import _bm25_scores
+from app.services.sparse_index import rank_postings
+
+
+def _postings(docs):
+    rows = []
+    for i, text in enumerate(docs):
+        tokens = tokenize(text)
+        for term in set(tokens):
+            rows.append((f"p{i}", term, tokens.count(term), len(tokens), 100 + i))
+    return rows
+
+
+def test_rank_postings_matches_in_memory_bm25():
+    docs = [
+        "PTO policy: employees accrue paid time off monthly.",
+        "Travel policy and expense reimbursement.",
+        "Security training is mandatory for all employees employees.",
+        "Cafeteria menu for the week.",
+    ]
+    query = "employees policy policy"
+    rows = _postings(docs)
+    q_terms = tokenize(query)
+    df = {}
+    for _, term, *_ in rows:
+        df[term] = df.get(term, 0) + 1
+    avg_len = sum(len(tokenize(d)) for d in docs) / len(docs)
+
+    hits = rank_postings(q_terms, [r for r in rows if r[1] in q_terms], df, len(docs), avg_len, limit=10)
+    expected = _bm25_scores(query, docs)
+    assert [h.point_id for h in hits] == [f"p{i}" for i in sorted(range(3), key=lambda i: -expected[i])]
+    for h in hits:
+        i = int(h.point_id[1:])
+        assert h.document_id == 100 + i
+        assert h.score == pytest.approx(expected[i])
+
+
+def test_rank_postings_respects_limit():
+    rows = _postings(["alpha beta", "alpha", "alpha alpha gamma"])
+    hits = rank_postings(["alpha"], [r for r in rows if r[1] == "alpha"], {"alpha": 3}, 3, 5 / 3, limit=2)
+    assert len(hits) == 2
+    assert hits[0].score >= hits[1].score
+
+
+@pytest.fixture
+def index_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(KnowledgeBase(id=1, name="kb"))
+    db.add(Document(id=1, knowledge_base_id=1, filename="old.txt", object_key="k1", status=DocumentStatus.INDEXED))
+    db.add(Document(id=2, knowledge_base_id=1, filename="new.txt", object_key="k2", status=DocumentStatus.INDEXED))
+    db.add(Document(id=3, knowledge_base_id=1, filename="busy.txt", object_key="k3", status=DocumentStatus.PROCESSING))
+    db.add(SparseIndexStats(knowledge_base_id=1, doc_count=1, total_length=4))
+    db.add(SparseIndexDocument(knowledge_base_id=1, point_id="p2", document_id=2, length=4))
+    db.commit()
+    yield db
+    db.close()
+
+
+def test_search_falls_back_until_older_documents_are_indexed(index_db):
+    # Document 1 predates the index: the stats row exists but does not cover it.
+    assert sparse_index.is_complete(index_db, 1) is False
+    assert sparse_index.search(index_db, 1, "policy", limit=5) is None
+    assert index_db.get(SparseIndexStats, 1).complete is False
+
+    index_db.add(SparseIndexDocument(knowledge_base_id=1, point_id="p1", document_id=1, length=3))
+    index_db.flush()
+    assert sparse_index.is_complete(index_db, 1) is True
+    assert index_db.get(SparseIndexStats, 1).complete is True
+
+
+def test_documents_without_chunks_count_as_covered(index_db):
+    index_db.add(SparseIndexEmptyDocument(knowledge_base_id=1, document_id=1))
+    index_db.flush()
+    assert sparse_index.is_complete(index_db, 1) is True
+
+
+def test_covered_kb_without_chunks_has_no_hits_instead_of_falling_back(index_db):
+    index_db.query(SparseIndexDocument).delete()
+    stats = index_db.get(SparseIndexStats, 1)
+    stats.doc_count, stats.total_length, stats.complete = 0, 0, True
+    index_db.flush()
+    assert sparse_index.search(index_db, 1, "policy", limit=5) == []
+
+
+def test_sparse_index_hits_requests_backfill_for_partial_kb(monkeypatch, index_db):
+    from app.services import retrieval
+
+    requested = []
+    monkeypatch.setattr(retrieval, "SessionLocal", lambda: index_db)
+    monkeypatch.setattr(sparse_index, "request_backfill", requested.append)
+    assert retrieval._sparse_index_hits(1, "policy", 5) is None
+    assert requested == [1]
@@ -0,0 +1,109 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.api import routes
+from app.core.config import settings
+
+
+class _ChunkCountingFile(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.reads.append(len(chunk))
+        return chunk
+
+
+def test_hash_upload_reads_in_chunks_and_rewinds(monkeypatch):
+    monkeypatch.setattr(routes, "UPLOAD_READ_CHUNK_BYTES", 1000)
+    data = bytes(range(256)) * 20
+    raw = _ChunkCountingFile(data)
+    upload = UploadFile(file=raw, filename="doc.txt")
+
+    digest, size = asyncio.run(routes._hash_upload(upload))
+
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert size == len(data)
+    assert max(raw.reads) == 1000
+    assert raw.tell() == 0
+
+
+def test_hash_upload_rejects_oversized_files(monkeypatch):
+    monkeypatch.setattr(routes, "UPLOAD_READ_CHUNK_BYTES", 100)
+    monkeypatch.setattr(settings, "max_upload_bytes", 250)
+    upload = UploadFile(file=io.BytesIO(b"x" * 1000), filename="big.pdf")
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(routes._hash_upload(upload))
+    assert exc.value.status_code == 413
+
+
+@pytest.fixture
+def limited_app(monkeypatch):
+    from fastapi import FastAPI, File
+    from fastapi.testclient import TestClient
+
+    from app.api import upload_limit
+
+    monkeypatch.setattr(settings, "max_upload_bytes", 1000)
+    monkeypatch.setattr(upload_limit, "MULTIPART_OVERHEAD_BYTES", 200)
+    handled = []
+    app = FastAPI()
+    app.add_middleware(upload_limit.UploadSizeLimitMiddleware, paths=("/upload/",))
+
+    @app.post("/upload/")
+    async def upload(file: UploadFile = File(...)):
+        handled.append(file.filename)
+        return {"ok": True}
+
+    return TestClient(app), handled
+
+
+def test_declared_oversized_body_is_refused_before_reading(limited_app):
+    client, handled = limited_app
+    response = client.post("/upload/", files={"file": ("big.pdf", b"x" * 5000)})
+    assert response.status_code == 413
+    assert handled == []
+    assert client.post("/upload/", files={"file": ("small.pdf", b"x" * 500)}).status_code == 200
+
+
+def test_streamed_body_stops_at_the_limit(monkeypatch):
+    from app.api import upload_limit
+
+    monkeypatch.setattr(settings, "max_upload_bytes", 1000)
+    monkeypatch.setattr(upload_limit, "MULTIPART_OVERHEAD_BYTES", 200)
+    pulled = []
+
+    async def receive():
+        pulled.append(300)
+        return {"type": "http.request", "body": b"x" * 300, "more_body": True}
+
+    async def app(scope, receive, send):
+        while (await receive())["more_body"]:
+            pass
+
+    middleware = upload_limit.UploadSizeLimitMiddleware(app, paths=("/upload/",))
+    scope = {"type": "http", "path": "/upload/", "headers": [(b"transfer-encoding", b"chunked")]}
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(middleware(scope, receive, None))
+    assert exc.value.status_code == 413
+    assert sum(pulled) == 1500
+
+
+def test_streamed_oversized_upload_gets_413_not_500(limited_app):
+    client, handled = limited_app
+    body = b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.pdf\"\r\n\r\n" + b"x" * 5000 + b"\r\n--b--\r\n"
+
+    def chunks():
+        for i in range(0, len(body), 256):
+            yield body[i : i + 256]
+
+    response = client.post("/upload/", content=chunks(), headers={"content-type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 413
+    assert handled == []